@@ -0,0 +1,30 @@
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "0003_enhanced_source_created_index"
+down_revision = "0002_add_enhanced_table"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Serves "WHERE source_message_id = ? ORDER BY created_at DESC LIMIT ?" without a sort; INCLUDE (id)
+    # lets list_enhanced_for_message(include_content=False) run as an index-only scan.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_echo_messages_enhanced_source_created",
+            "echo_messages_enhanced",
+            ["source_message_id", sa.text("created_at DESC")],
+            postgresql_include=["id"],
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_echo_messages_enhanced_source_created",
+            table_name="echo_messages_enhanced",
+            postgresql_concurrently=True,
+        )
@@ -0,0 +1,33 @@
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "0004_enhanced_batch_id"
+down_revision = "0003_enhanced_source_created_index"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Rows stored from an LLM Batch API job record the batch id; the unique index lets repeated
+    # enhance_messages_batch_collect calls insert with ON CONFLICT DO NOTHING instead of duplicating.
+    op.add_column("echo_messages_enhanced", sa.Column("batch_id", sa.String(length=255), nullable=True))
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ux_echo_messages_enhanced_batch_source",
+            "echo_messages_enhanced",
+            ["batch_id", "source_message_id"],
+            unique=True,
+            postgresql_where=sa.text("batch_id IS NOT NULL"),
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ux_echo_messages_enhanced_batch_source",
+            table_name="echo_messages_enhanced",
+            postgresql_concurrently=True,
+        )
+    op.drop_column("echo_messages_enhanced", "batch_id")
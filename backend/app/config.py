@@ -1,10 +1,14 @@
-from functools import lru_cache
-from typing import Any, List, Optional
+import re
+from functools import cached_property, lru_cache
+from typing import Any, Optional, Tuple
 
 from pydantic import Field, field_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
+_CORS_SPLIT = re.compile(r"\s*,\s*")
+
+
 class Settings(BaseSettings):
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8", extra="ignore")
 
@@ -14,30 +18,36 @@ class Settings(BaseSettings):
     api_port: int = Field(8000, alias="API_PORT")
 
     database_url: Optional[str] = Field(None, alias="DATABASE_URL")
+    db_pool_size: int = Field(20, alias="DB_POOL_SIZE")
+    db_max_overflow: int = Field(10, alias="DB_MAX_OVERFLOW")
 
     cors_origins_raw: str = Field("*", alias="CORS_ORIGINS")
 
-    @property
-    def cors_origins(self) -> List[str]:
-        raw = self.cors_origins_raw
+    mcp_fanout_limit: int = Field(8, alias="MCP_FANOUT_LIMIT")
+    mcp_warmup: bool = Field(True, alias="MCP_WARMUP")
+    rag_search_batch_window_ms: float = Field(5.0, alias="RAG_SEARCH_BATCH_WINDOW_MS")
+    rag_search_batch_size: int = Field(16, alias="RAG_SEARCH_BATCH_SIZE")
+    rag_sources_cache_ttl: float = Field(5.0, alias="RAG_SOURCES_CACHE_TTL")
+
+    @cached_property
+    def cors_origins(self) -> Tuple[str, ...]:
+        """Parsed CORS origins, computed once per Settings instance."""
+
+        raw = self.cors_origins_raw.strip()
         if not raw:
-            return ["*"]
-        if isinstance(raw, str):
-            if raw.startswith("[") and raw.endswith("]"):
-                # Attempt JSON parsing for backwards compatibility
-                try:
-                    import json
-
-                    data = json.loads(raw)
-                    if isinstance(data, list):
-                        return [str(item) for item in data if str(item).strip()]
-                except json.JSONDecodeError:
-                    pass
-            parts = [part.strip() for part in raw.split(",") if part.strip()]
-            return parts or ["*"]
-        if isinstance(raw, list):
-            return [str(item).strip() for item in raw if str(item).strip()]
-        return ["*"]
+            return ("*",)
+        if raw[0] == "[" and raw[-1] == "]":
+            # Attempt JSON parsing for backwards compatibility
+            try:
+                import json
+
+                data = json.loads(raw)
+                if isinstance(data, list):
+                    return tuple(str(item).strip() for item in data if str(item).strip())
+            except json.JSONDecodeError:
+                pass
+        parts = tuple(part for part in _CORS_SPLIT.split(raw) if part)
+        return parts or ("*",)
 
 
 @lru_cache
@@ -1,33 +1,54 @@
-from contextlib import contextmanager
-from typing import Iterator
+import re
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import AsyncIterator
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 
 from .config import get_settings
 
 
+def _async_url(url: str) -> str:
+    """Translate postgres URLs (e.g., postgresql+psycopg2://) to the asyncpg driver."""
+
+    match = re.match(r"^(?P<scheme>[a-zA-Z0-9+]+)://", url)
+    if match:
+        scheme = match.group("scheme")
+        if scheme.split("+", 1)[0] in {"postgres", "postgresql"}:
+            return url.replace(f"{scheme}://", "postgresql+asyncpg://", 1)
+    return url
+
+
 settings = get_settings()
 
-if settings.database_url:
-    engine = create_engine(settings.database_url, pool_pre_ping=True, future=True)
-    SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
-else:
-    engine = None
-    SessionLocal = None
 
+@lru_cache(maxsize=1)
+def get_engine() -> AsyncEngine:
+    """Build the engine on first use, so importing this module never loads a database driver."""
 
-@contextmanager
-def session_scope() -> Iterator[SessionLocal]:
-    if SessionLocal is None:
+    if not settings.database_url:
         raise RuntimeError("DATABASE_URL is not configured; database access is unavailable")
-
-    session = SessionLocal()
-    try:
-        yield session
-        session.commit()
-    except Exception:
-        session.rollback()
-        raise
-    finally:
-        session.close()
+    url = _async_url(settings.database_url)
+    # Queue-pool sizing only applies to Postgres; SQLite dialects use pools that reject these arguments.
+    pool_options = (
+        {"pool_size": settings.db_pool_size, "max_overflow": settings.db_max_overflow}
+        if url.startswith("postgresql+asyncpg://")
+        else {}
+    )
+    return create_async_engine(url, pool_pre_ping=True, pool_recycle=3600, **pool_options)
+
+
+@lru_cache(maxsize=1)
+def _session_factory() -> async_sessionmaker[AsyncSession]:
+    return async_sessionmaker(bind=get_engine(), autoflush=False, expire_on_commit=False)
+
+
+@asynccontextmanager
+async def session_scope() -> AsyncIterator[AsyncSession]:
+    async with _session_factory()() as session:
+        try:
+            yield session
+            await session.commit()
+        except Exception:
+            await session.rollback()
+            raise
@@ -1,23 +1,39 @@
-from typing import Any, Dict, List, Optional
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Annotated, Any, AsyncIterator, Awaitable, BinaryIO, Dict, Iterable, List, Optional
 
 from fastapi import FastAPI, HTTPException, File, UploadFile, Form, Query
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from pydantic import HttpUrl
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, Field, field_validator
+from starlette.concurrency import run_in_threadpool
 from tempfile import NamedTemporaryFile
 import os
+import re
+import shutil
 
 
 from .config import get_settings
 from .services.mcp_client import (
     enhance_text as enhance_with_mcp,
+    rag_batch as mcp_rag_batch,
     rag_import as mcp_rag_import,
     rag_search as mcp_rag_search,
     rag_sources as mcp_rag_sources,
-    rag_upsert_text as mcp_rag_upsert,
+    warm_up_llm as mcp_warm_up_llm,
 )
 
 
+# Uploads are copied to disk in fixed-size chunks so peak memory stays bounded.
+_UPLOAD_CHUNK_SIZE = 1 << 20
+# Finds the first non-whitespace character without copying the text the way .strip() does.
+_NON_BLANK = re.compile(r"\S")
+# Cheap shape check for import URLs; the MCP server does the real fetch and fails loudly on bad hosts.
+_HTTP_URL = re.compile(r"^https?://[^\s/?#]+\S*$", re.IGNORECASE)
+
+UrlStr = Annotated[str, Field(json_schema_extra={"format": "uri"})]
+
+
 class EchoIn(BaseModel):
     message: str
 
@@ -42,11 +58,19 @@ class EnhanceOut(BaseModel):
 
 
 class RagImportPayload(BaseModel):
-    urls: Optional[List[HttpUrl]] = None
+    urls: Optional[List[UrlStr]] = None
     texts: Optional[List[str]] = None
     store: Optional[str] = None
     source_prefix: Optional[str] = None
 
+    @field_validator("urls")
+    @classmethod
+    def _check_urls(cls, urls: Optional[List[str]]) -> Optional[List[str]]:
+        for url in urls or ():
+            if _HTTP_URL.match(url) is None:
+                raise ValueError(f"Invalid http(s) URL: {url!r}")
+        return urls
+
 
 class RagImportResult(BaseModel):
     id: str
@@ -56,6 +80,7 @@ class RagImportResult(BaseModel):
 
 class RagImportResponse(BaseModel):
     items: List[RagImportResult]
+    errors: List[str] = []
 
 
 class RagSearchResponseItem(BaseModel):
@@ -70,9 +95,86 @@ class RagSearchResponse(BaseModel):
     results: List[RagSearchResponseItem]
 
 
+def _spool_upload(source: BinaryIO, suffix: str) -> Optional[str]:
+    """Copy an upload to a named temp file; returns its path, or None when the upload is empty."""
+
+    with NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
+        shutil.copyfileobj(source, tmp, _UPLOAD_CHUNK_SIZE)
+        size = tmp.tell()
+        tmp_path = tmp.name
+    if not size:
+        _remove_quietly(tmp_path)
+        return None
+    return tmp_path
+
+
+def _remove_quietly(path: str) -> None:
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+async def _gather_bounded(coros: Iterable[Awaitable[Any]], limit: int) -> List[Any]:
+    """Run MCP calls concurrently, at most ``limit`` at a time, returning exceptions in place."""
+
+    semaphore = asyncio.Semaphore(max(1, limit))
+
+    async def _bounded(coro: Awaitable[Any]) -> Any:
+        async with semaphore:
+            return await coro
+
+    return await asyncio.gather(*(_bounded(coro) for coro in coros), return_exceptions=True)
+
+
+def _collect_import_results(outcomes: Iterable[Any]) -> ORJSONResponse:
+    items: List[Dict[str, Any]] = []
+    failures: List[Exception] = []
+    for outcome in outcomes:
+        if outcome is None:
+            continue
+        if isinstance(outcome, BaseException):
+            if not isinstance(outcome, Exception):
+                raise outcome
+            failures.append(outcome)
+            continue
+        items.append({"id": str(outcome["id"]), "source": outcome.get("source"), "store": outcome.get("store")})
+
+    # Preserve the single-item failure semantics: if nothing succeeded, surface the first error.
+    if failures and not items:
+        raise failures[0]
+    errors = [str(exc.detail) if isinstance(exc, HTTPException) else str(exc) for exc in failures]
+    return ORJSONResponse({"items": items, "errors": errors})
+
+
+async def _warm_up_mcp() -> None:
+    """Import the MCP server, build its RAG stores and pre-connect the LLM provider before the first request."""
+
+    for step in (mcp_rag_sources, mcp_warm_up_llm):
+        try:
+            await step()
+        except Exception:  # pragma: no cover - warm-up is best-effort
+            pass
+
+
+@asynccontextmanager
+async def _lifespan(app: FastAPI) -> AsyncIterator[None]:
+    warmup = asyncio.create_task(_warm_up_mcp()) if get_settings().mcp_warmup else None
+    try:
+        yield
+    finally:
+        if warmup is not None and not warmup.done():
+            warmup.cancel()
+
+
 def create_app() -> FastAPI:
     settings = get_settings()
-    app = FastAPI(title="MCP Relay", version="0.1.0")
+    app = FastAPI(
+        title="MCP Relay",
+        version="0.1.0",
+        default_response_class=ORJSONResponse,
+        lifespan=_lifespan,
+    )
 
     # CORS
     origins = settings.cors_origins
@@ -89,12 +191,14 @@ def create_app() -> FastAPI:
     def healthz() -> Dict[str, str]:
         return {"status": "ok"}
 
+    # Outbound payloads are built from trusted values, so handlers return ORJSONResponse
+    # directly and skip response-model validation; response_model stays for the OpenAPI schema.
     @app.post("/api/echo", response_model=EchoOut)
-    def echo(payload: EchoIn) -> EchoOut:
-        return EchoOut(message=payload.message, length=len(payload.message))
+    def echo(payload: EchoIn) -> ORJSONResponse:
+        return ORJSONResponse({"message": payload.message, "length": len(payload.message)})
 
     @app.post("/api/enhance", response_model=EnhanceOut)
-    async def enhance(payload: EnhanceIn) -> EnhanceOut:
+    async def enhance(payload: EnhanceIn) -> ORJSONResponse:
         try:
             result = await enhance_with_mcp(
                 text=payload.text,
@@ -105,87 +209,101 @@ def create_app() -> FastAPI:
             raise
         except Exception as exc:  # pragma: no cover - defensive
             raise HTTPException(status_code=500, detail=str(exc)) from exc
-        return EnhanceOut(**result)
+        return ORJSONResponse(
+            {
+                "original": result["original"],
+                "enhanced": result["enhanced"],
+                "message_id": result.get("message_id"),
+                "enhanced_id": result.get("enhanced_id"),
+                "processing": result["processing"],
+            }
+        )
 
     @app.get("/api/rag/stores", response_model=List[str])
     async def rag_list_stores() -> List[str]:
         return await mcp_rag_sources()
 
     @app.post("/api/rag/import", response_model=RagImportResponse)
-    async def rag_import(payload: RagImportPayload) -> RagImportResponse:
-        items: List[RagImportResult] = []
-
+    async def rag_import(payload: RagImportPayload) -> ORJSONResponse:
         urls = payload.urls or []
         source_prefix = payload.source_prefix or ""
 
-        for url in urls:
-            data = await mcp_rag_import(
-                location=str(url),
-                store=payload.store,
-                source=source_prefix or str(url),
-            )
-            items.append(RagImportResult(**data))
+        # Identical URLs/texts are imported once; every duplicate reuses that result.
+        ops: List[Dict[str, Any]] = []
+        op_index: Dict[Any, int] = {}
+        slots: List[int] = []
+
+        for location in urls:
+            key = ("url", location)
+            if key not in op_index:
+                op_index[key] = len(ops)
+                ops.append(
+                    {
+                        "tool": "rag_import",
+                        "args": {"location": location, "store": payload.store, "source": source_prefix or location},
+                    }
+                )
+            slots.append(op_index[key])
 
         texts = payload.texts or []
         for idx, text in enumerate(texts, start=1):
-            if not text.strip():
+            if _NON_BLANK.search(text) is None:
                 continue
-            source = source_prefix or f"text-{idx}"
-            data = await mcp_rag_upsert(content=text, store=payload.store, source=source)
-            items.append(RagImportResult(**data))
+            key = ("text", text)
+            if key not in op_index:
+                op_index[key] = len(ops)
+                source = source_prefix or f"text-{idx}"
+                ops.append({"tool": "rag_upsert", "args": {"content": text, "store": payload.store, "source": source}})
+            slots.append(op_index[key])
 
-        return RagImportResponse(items=items)
+        # One batch_execute round-trip; the MCP server caps concurrency at mcp_fanout_limit.
+        outcomes = await mcp_rag_batch(ops, max_concurrent=settings.mcp_fanout_limit) if ops else []
+        return _collect_import_results(outcomes[slot] for slot in slots)
 
     @app.post("/api/rag/upload", response_model=RagImportResponse)
     async def rag_upload(
         files: List[UploadFile] = File(...),
         store: Optional[str] = Form(None),
         source_prefix: Optional[str] = Form(None),
-    ) -> RagImportResponse:
-        items: List[RagImportResult] = []
-        for index, uploaded in enumerate(files, start=1):
-            data = await uploaded.read()
-            if not data:
-                continue
+    ) -> ORJSONResponse:
+        async def _import_one(uploaded: UploadFile, index: int) -> Optional[Dict[str, Any]]:
             suffix = os.path.splitext(uploaded.filename or "upload.txt")[1]
-            with NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-                tmp.write(data)
-                tmp_path = tmp.name
+            tmp_path = await run_in_threadpool(_spool_upload, uploaded.file, suffix)
+            if tmp_path is None:
+                return None
             try:
                 source = source_prefix or uploaded.filename or f"file-{index}"
-                result = await mcp_rag_import(location=tmp_path, store=store, source=source)
-                items.append(RagImportResult(**result))
+                return await mcp_rag_import(location=tmp_path, store=store, source=source)
             finally:
-                try:
-                    os.unlink(tmp_path)
-                except OSError:
-                    pass
-        return RagImportResponse(items=items)
+                await run_in_threadpool(_remove_quietly, tmp_path)
+
+        outcomes = await _gather_bounded(
+            (_import_one(uploaded, index) for index, uploaded in enumerate(files, start=1)),
+            settings.mcp_fanout_limit,
+        )
+        return _collect_import_results(outcomes)
 
     @app.get("/api/rag/search", response_model=RagSearchResponse)
     async def rag_search(
         query: str = Query(..., min_length=1),
         limit: int = Query(3, ge=1, le=20),
         store: Optional[str] = Query(None),
-    ) -> RagSearchResponse:
+    ) -> ORJSONResponse:
         store_filters = None
         if store:
             store_filters = [part.strip() for part in store.split(",") if part.strip()]
         raw_results = await mcp_rag_search(query=query, limit=limit, stores=store_filters)
-        items: List[RagSearchResponseItem] = []
-        for entry in raw_results:
-            content = entry.get("content", "")
-            snippet = content[:400]
-            items.append(
-                RagSearchResponseItem(
-                    id=str(entry.get("id")),
-                    source=entry.get("source"),
-                    store=entry.get("store"),
-                    score=float(entry.get("score", 0.0)),
-                    snippet=snippet,
-                )
-            )
-        return RagSearchResponse(results=items)
+        items = [
+            {
+                "id": str(entry.get("id")),
+                "source": entry.get("source"),
+                "store": entry.get("store"),
+                "score": float(entry.get("score", 0.0)),
+                "snippet": entry.get("content", "")[:400],
+            }
+            for entry in raw_results
+        ]
+        return ORJSONResponse({"results": items})
 
     return app
 
@@ -1,35 +1,43 @@
-import json
-import sys
-from pathlib import Path
-from typing import Any, Dict, List, Optional, Sequence
-
+import asyncio
+import time
+import weakref
+from functools import lru_cache
+from types import ModuleType
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+import orjson
 from fastapi import HTTPException
 
+from ..config import get_settings
+
 
-REPO_ROOT = Path(__file__).resolve().parents[3]
-MCP_ROOT = REPO_ROOT / "mcp-server"
-if MCP_ROOT.exists() and str(MCP_ROOT) not in sys.path:
-    sys.path.insert(0, str(MCP_ROOT))
+@lru_cache(maxsize=1)
+def _mcp() -> ModuleType:
+    """Import the MCP server tools on first use rather than at backend import time."""
 
-try:
-    from mcp_server import server as mcp_server
-except ModuleNotFoundError as exc:  # pragma: no cover - defensive
-    raise RuntimeError(
-        "MCP server package is not available. Ensure dependencies are installed via make setup."
-    ) from exc
+    try:
+        from mcp_server import server as mcp_server
+    except ModuleNotFoundError as exc:  # pragma: no cover - defensive
+        raise RuntimeError(
+            "MCP server package is not available. Install it with `pip install -e mcp-server` (make setup)."
+        ) from exc
+    return mcp_server
 
 
 async def enhance_text(
     *, text: str, instructions: Optional[str] = None, model: Optional[str] = None
 ) -> Dict[str, Any]:
-    """Proxy to the MCP server's enhance_text_and_store tool and parse its JSON output."""
+    """Proxy to the MCP server's enhance_text_and_store tool and parse its JSON output.
 
-    raw = await mcp_server.enhance_text_and_store(text=text, instructions=instructions, model=model)
-    data = json.loads(raw)
+    Every call stores a new message; repeated prompts can reuse the LLM reply through the
+    MCP server's ``LLM_CACHE_BACKEND`` cache, which still runs the inserts.
+    """
+
+    raw = await _mcp().enhance_text_and_store(text=text, instructions=instructions, model=model)
+    data = orjson.loads(raw)
 
     if "error" in data:
         raise HTTPException(status_code=502, detail=data["error"])
-
     return data
 
 
@@ -39,18 +47,40 @@ def _ensure_ok(payload: Any) -> Any:
     return payload
 
 
+# (fetched_at, store names) from the last successful rag_sources call.
+_sources_cache: Optional[Tuple[float, List[str]]] = None
+
+
+def invalidate_sources_cache() -> None:
+    global _sources_cache
+    _sources_cache = None
+
+
+async def warm_up_llm() -> None:
+    await _mcp().warm_up_llm()
+
+
 async def rag_sources() -> List[str]:
-    raw = await mcp_server.rag_sources()
-    data = json.loads(raw)
+    global _sources_cache
+    ttl = get_settings().rag_sources_cache_ttl
+    if _sources_cache is not None and time.monotonic() - _sources_cache[0] < ttl:
+        return list(_sources_cache[1])
+
+    raw = await _mcp().rag_sources()
+    data = orjson.loads(raw)
     _ensure_ok(data)
     if not isinstance(data, list):
         raise HTTPException(status_code=502, detail="Unexpected response from rag_sources")
-    return [str(item) for item in data]
+    names = [str(item) for item in data]
+    if ttl > 0:
+        _sources_cache = (time.monotonic(), names)
+    return list(names)
 
 
 async def rag_import(location: str, *, store: Optional[str] = None, source: Optional[str] = None) -> Dict[str, Any]:
-    raw = await mcp_server.rag_import(location=location, store=store, source=source)
-    data = json.loads(raw)
+    raw = await _mcp().rag_import(location=location, store=store, source=source)
+    invalidate_sources_cache()
+    data = orjson.loads(raw)
     _ensure_ok(data)
     if not isinstance(data, dict):
         raise HTTPException(status_code=502, detail="Unexpected response from rag_import")
@@ -58,20 +88,118 @@ async def rag_import(location: str, *, store: Optional[str] = None, source: Opti
 
 
 async def rag_upsert_text(content: str, *, store: Optional[str] = None, source: Optional[str] = None) -> Dict[str, Any]:
-    raw = await mcp_server.rag_upsert(content=content, store=store, source=source)
-    data = json.loads(raw)
+    raw = await _mcp().rag_upsert(content=content, store=store, source=source)
+    invalidate_sources_cache()
+    data = orjson.loads(raw)
     _ensure_ok(data)
     if not isinstance(data, dict):
         raise HTTPException(status_code=502, detail="Unexpected response from rag_upsert")
     return data
 
 
+async def rag_batch(ops: Sequence[Dict[str, Any]], *, max_concurrent: int = 8) -> List[Any]:
+    """Run several RAG tool calls through one batch_execute round-trip.
+
+    Returns one entry per op, in order: the tool's parsed result, or an ``HTTPException`` for
+    ops that failed so callers can report partial success.
+    """
+
+    raw = await _mcp().batch_execute(ops=list(ops), max_concurrent=max_concurrent)
+    invalidate_sources_cache()
+    data = _ensure_ok(orjson.loads(raw))
+    if not isinstance(data, list) or len(data) != len(ops):
+        raise HTTPException(status_code=502, detail="Unexpected response from batch_execute")
+    return [
+        HTTPException(status_code=502, detail=str(entry["error"]))
+        if isinstance(entry, dict) and "error" in entry
+        else entry
+        for entry in data
+    ]
+
+
+class _RagSearchBatcher:
+    """Coalesce rag_search calls arriving within a short window into one rag_search_batch call."""
+
+    def __init__(self) -> None:
+        self._pending: List[Tuple[Dict[str, Any], "asyncio.Future[List[Dict[str, Any]]]"]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._dispatches: Set["asyncio.Task[None]"] = set()
+
+    async def submit(self, query: Dict[str, Any], *, window: float, max_batch: int) -> List[Dict[str, Any]]:
+        loop = asyncio.get_running_loop()
+        future: "asyncio.Future[List[Dict[str, Any]]]" = loop.create_future()
+        self._pending.append((query, future))
+        if len(self._pending) >= max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(window, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._dispatch(batch))
+            self._dispatches.add(task)
+            task.add_done_callback(self._dispatches.discard)
+
+    @staticmethod
+    async def _dispatch(batch: List[Tuple[Dict[str, Any], "asyncio.Future[List[Dict[str, Any]]]"]]) -> None:
+        try:
+            raw = await _mcp().rag_search_batch(queries=[query for query, _ in batch])
+            data = _ensure_ok(orjson.loads(raw))
+            if not isinstance(data, list) or len(data) != len(batch):
+                raise HTTPException(status_code=502, detail="Unexpected response from rag_search_batch")
+        except Exception as exc:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+
+        for (_, future), entry in zip(batch, data):
+            if future.done():
+                continue
+            if isinstance(entry, dict) and "error" in entry:
+                future.set_exception(HTTPException(status_code=502, detail=str(entry["error"])))
+            elif not isinstance(entry, list):
+                future.set_exception(HTTPException(status_code=502, detail="Unexpected response from rag_search"))
+            else:
+                future.set_result(entry)
+
+
+_rag_search_batchers: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _RagSearchBatcher]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _rag_search_batcher() -> _RagSearchBatcher:
+    """The batcher for the running loop: its timer and futures belong to that loop and cannot be shared."""
+
+    loop = asyncio.get_running_loop()
+    batcher = _rag_search_batchers.get(loop)
+    if batcher is None:
+        batcher = _rag_search_batchers[loop] = _RagSearchBatcher()
+    return batcher
+
+
 async def rag_search(
     *, query: str, limit: int = 3, stores: Optional[Sequence[str]] = None
 ) -> List[Dict[str, Any]]:
+    """Search the RAG stores, batching with concurrent searches when RAG_SEARCH_BATCH_WINDOW_MS > 0."""
+
     store_param = ",".join(stores) if stores else None
-    raw = await mcp_server.rag_search(query=query, limit=limit, store=store_param)
-    data = json.loads(raw)
+    settings = get_settings()
+    if settings.rag_search_batch_window_ms > 0 and settings.rag_search_batch_size > 1:
+        return await _rag_search_batcher().submit(
+            {"query": query, "limit": limit, "store": store_param},
+            window=settings.rag_search_batch_window_ms / 1000,
+            max_batch=settings.rag_search_batch_size,
+        )
+
+    raw = await _mcp().rag_search(query=query, limit=limit, store=store_param)
+    data = orjson.loads(raw)
     _ensure_ok(data)
     if not isinstance(data, list):
         raise HTTPException(status_code=502, detail="Unexpected response from rag_search")
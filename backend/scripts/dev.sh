@@ -2,4 +2,4 @@
 set -e
 
 alembic upgrade head
-exec uvicorn app.main:app --host ${API_HOST:-0.0.0.0} --port ${API_PORT:-8000} --reload
+exec uvicorn app.main:app --host ${API_HOST:-0.0.0.0} --port ${API_PORT:-8000} --loop uvloop --http httptools --reload
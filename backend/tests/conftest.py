@@ -19,6 +19,7 @@ def _ensure_test_env(monkeypatch):
     monkeypatch.setenv("APP_ENV", "test")
     monkeypatch.setenv("DATABASE_URL", os.getenv("DATABASE_URL", "sqlite:///:memory:"))
     monkeypatch.setenv("CORS_ORIGINS", "http://localhost, http://testserver")
+    monkeypatch.setenv("MCP_WARMUP", "false")
 
     get_settings.cache_clear()
     yield
@@ -1,3 +1,4 @@
+import orjson
 import pytest
 from fastapi import HTTPException
 from fastapi.testclient import TestClient
@@ -46,7 +47,18 @@ def test_app_has_cors_middleware(monkeypatch):
         (middleware.kwargs.get("allow_origins") for middleware in app.user_middleware if middleware.cls.__name__ == "CORSMiddleware"),
         None,
     )
-    assert origins == ["https://example.com", "https://another.com"]
+    assert tuple(origins) == ("https://example.com", "https://another.com")
+
+
+def test_empty_cors_list_adds_no_middleware(monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", "sqlite:///:memory:")
+    monkeypatch.setenv("CORS_ORIGINS", "[]")
+
+    from app.config import get_settings
+
+    get_settings.cache_clear()
+    app = create_app()
+    assert not any(middleware.cls.__name__ == "CORSMiddleware" for middleware in app.user_middleware)
 
 
 def test_enhance_endpoint_success(monkeypatch, client: TestClient):
@@ -82,3 +94,186 @@ def test_enhance_endpoint_error(monkeypatch, client: TestClient):
     response = client.post("/api/enhance", json={"text": "hello"})
     assert response.status_code == 502
     assert response.json()["detail"] == "llm down"
+
+
+def test_identical_enhance_requests_each_store_a_message(monkeypatch, client: TestClient):
+    from app.services import mcp_client
+
+    stored = []
+
+    async def fake_enhance_text_and_store(*, text, instructions=None, model=None):
+        stored.append(text)
+        return orjson.dumps(
+            {
+                "message_id": len(stored),
+                "enhanced_id": 10 + len(stored),
+                "original": text,
+                "enhanced": "HELLO",
+                "processing": {},
+            }
+        ).decode()
+
+    monkeypatch.setattr(mcp_client._mcp(), "enhance_text_and_store", fake_enhance_text_and_store)
+
+    first = client.post("/api/enhance", json={"text": "hello"})
+    second = client.post("/api/enhance", json={"text": "hello"})
+
+    assert stored == ["hello", "hello"]
+    assert first.json()["message_id"] == 1
+    assert second.json()["message_id"] == 2
+
+
+def _fake_batch(handlers, seen_ops=None):
+    async def fake_batch(ops, *, max_concurrent=8):
+        if seen_ops is not None:
+            seen_ops.extend(ops)
+        outcomes = []
+        for op in ops:
+            try:
+                outcomes.append(await handlers[op["tool"]](**op["args"]))
+            except HTTPException as exc:
+                outcomes.append(exc)
+        return outcomes
+
+    return fake_batch
+
+
+def test_rag_import_batches_ops_and_reports_partial_failures(monkeypatch, client: TestClient):
+    async def fake_import(location, store=None, source=None):
+        if "broken" in location:
+            raise HTTPException(status_code=502, detail="fetch failed")
+        return {"id": f"doc-{location}", "source": source, "store": store}
+
+    async def fake_upsert(content, store=None, source=None):
+        return {"id": f"text-{content}", "source": source, "store": store}
+
+    ops = []
+    monkeypatch.setattr(
+        "app.main.mcp_rag_batch", _fake_batch({"rag_import": fake_import, "rag_upsert": fake_upsert}, ops)
+    )
+
+    response = client.post(
+        "/api/rag/import",
+        json={"urls": ["https://ok.example.com/", "https://broken.example.com/"], "texts": ["a", " "], "store": "kb"},
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert [item["id"] for item in data["items"]] == ["doc-https://ok.example.com/", "text-a"]
+    assert data["errors"] == ["fetch failed"]
+    assert [op["tool"] for op in ops] == ["rag_import", "rag_import", "rag_upsert"]
+
+
+def test_rag_import_raises_when_every_item_fails(monkeypatch, client: TestClient):
+    async def fake_import(location, store=None, source=None):
+        raise HTTPException(status_code=502, detail="fetch failed")
+
+    monkeypatch.setattr("app.main.mcp_rag_batch", _fake_batch({"rag_import": fake_import}))
+
+    response = client.post("/api/rag/import", json={"urls": ["https://broken.example.com/"]})
+    assert response.status_code == 502
+    assert response.json()["detail"] == "fetch failed"
+
+
+def test_rag_upload_streams_files_and_skips_empty(monkeypatch, client: TestClient):
+    seen = {}
+
+    async def fake_import(location, *, store=None, source=None):
+        with open(location, "rb") as handle:
+            seen[source] = handle.read()
+        return {"id": f"doc-{source}", "source": source, "store": store}
+
+    monkeypatch.setattr("app.main.mcp_rag_import", fake_import)
+
+    response = client.post(
+        "/api/rag/upload",
+        files=[("files", ("notes.txt", b"hello upload", "text/plain")), ("files", ("empty.txt", b"", "text/plain"))],
+    )
+    assert response.status_code == 200
+    assert [item["id"] for item in response.json()["items"]] == ["doc-notes.txt"]
+    assert seen == {"notes.txt": b"hello upload"}
+
+
+def test_rag_upload_of_a_chunked_document_reports_its_first_id(monkeypatch, client: TestClient):
+    from mcp_server import server as mcp_server
+    from mcp_server.rag_store import EmbeddingBackend, InMemoryRAGStore
+
+    class LengthEmbedder(EmbeddingBackend):
+        async def embed(self, text):
+            return [float(len(text)), 1.0]
+
+    store = InMemoryRAGStore(LengthEmbedder(), name="kb")
+    monkeypatch.setattr(mcp_server, "_rag_store", lambda: store)
+    mcp_server._tool_settings.cache_clear()
+    body = b"word " * 2000  # longer than the default RAG_IMPORT_CHUNK_CHARS, so it is stored in chunks
+
+    try:
+        response = client.post("/api/rag/upload", files=[("files", ("long.txt", body, "text/plain"))])
+    finally:
+        mcp_server._tool_settings.cache_clear()
+        mcp_server._forget_retrievals()
+
+    assert response.status_code == 200
+    assert response.json()["errors"] == []
+    [item] = response.json()["items"]
+    assert item["source"] == "long.txt" and item["store"] == "kb"
+    assert len(store._docs) > 1
+
+
+def test_rag_search_returns_snippets(monkeypatch, client: TestClient):
+    async def fake_search(*, query, limit=3, stores=None):
+        assert stores == ["alpha", "beta"]
+        return [{"id": 7, "source": "doc", "store": "alpha", "score": 0.5, "content": "x" * 500}]
+
+    monkeypatch.setattr("app.main.mcp_rag_search", fake_search)
+
+    response = client.get("/api/rag/search", params={"query": "hi", "store": "alpha, beta"})
+    assert response.status_code == 200
+    assert response.json() == {
+        "results": [{"id": "7", "source": "doc", "store": "alpha", "score": 0.5, "snippet": "x" * 400}]
+    }
+
+
+def test_rag_import_deduplicates_repeated_inputs(monkeypatch, client: TestClient):
+    upserts = []
+
+    async def fake_upsert(content, store=None, source=None):
+        upserts.append(content)
+        return {"id": f"id-{len(upserts)}", "source": source, "store": store}
+
+    monkeypatch.setattr("app.main.mcp_rag_batch", _fake_batch({"rag_upsert": fake_upsert}))
+
+    response = client.post("/api/rag/import", json={"texts": ["same", "other", "same"]})
+    assert response.status_code == 200
+    assert sorted(upserts) == ["other", "same"]
+    ids = [item["id"] for item in response.json()["items"]]
+    assert len(ids) == 3
+    assert ids[0] == ids[2] != ids[1]
+
+
+def test_rag_import_rejects_non_http_urls(client: TestClient):
+    response = client.post("/api/rag/import", json={"urls": ["ftp://example.com/file"]})
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["loc"][-1] == "urls"
+
+
+def test_startup_warms_up_mcp(monkeypatch):
+    from app.config import get_settings
+
+    calls = []
+
+    async def fake_sources():
+        calls.append("rag_sources")
+        return ["default"]
+
+    async def fake_warm_up_llm():
+        calls.append("llm")
+
+    monkeypatch.setenv("MCP_WARMUP", "true")
+    monkeypatch.setattr("app.main.mcp_rag_sources", fake_sources)
+    monkeypatch.setattr("app.main.mcp_warm_up_llm", fake_warm_up_llm)
+    get_settings.cache_clear()
+
+    with TestClient(create_app()) as c:
+        assert c.get("/healthz").status_code == 200
+
+    assert calls == ["rag_sources", "llm"]
@@ -0,0 +1,116 @@
+import asyncio
+
+import orjson
+import pytest
+from fastapi import HTTPException
+
+from app.services import mcp_client
+
+
+@pytest.fixture(autouse=True)
+def _clear_caches():
+    mcp_client.invalidate_sources_cache()
+    yield
+    mcp_client.invalidate_sources_cache()
+
+
+def _fake_enhance(calls, payload):
+    async def fake(*, text, instructions=None, model=None):
+        calls.append((text, instructions, model))
+        return orjson.dumps(payload).decode()
+
+    return fake
+
+
+def test_enhance_text_raises_on_tool_error(monkeypatch):
+    calls = []
+    monkeypatch.setattr(mcp_client._mcp(), "enhance_text_and_store", _fake_enhance(calls, {"error": "down"}))
+
+    for _ in range(2):
+        with pytest.raises(HTTPException):
+            asyncio.run(mcp_client.enhance_text(text="hi"))
+
+    assert len(calls) == 2
+
+
+def test_concurrent_rag_searches_are_coalesced(monkeypatch):
+    batches = []
+
+    async def fake_batch(*, queries):
+        batches.append(queries)
+        results = []
+        for item in queries:
+            if item["query"] == "bad":
+                results.append({"error": "store offline"})
+            else:
+                results.append([{"id": item["query"], "store": item["store"]}])
+        return orjson.dumps(results).decode()
+
+    monkeypatch.setattr(mcp_client._mcp(), "rag_search_batch", fake_batch)
+
+    async def run():
+        return await asyncio.gather(
+            mcp_client.rag_search(query="a"),
+            mcp_client.rag_search(query="b", stores=["x", "y"]),
+            mcp_client.rag_search(query="bad"),
+            return_exceptions=True,
+        )
+
+    first, second, third = asyncio.run(run())
+
+    assert len(batches) == 1
+    assert [item["query"] for item in batches[0]] == ["a", "b", "bad"]
+    assert first == [{"id": "a", "store": None}]
+    assert second == [{"id": "b", "store": "x,y"}]
+    assert isinstance(third, HTTPException) and third.detail == "store offline"
+
+
+def test_rag_search_batcher_is_per_event_loop(monkeypatch):
+    async def fake_batch(*, queries):
+        return orjson.dumps([[{"id": item["query"]}] for item in queries]).decode()
+
+    monkeypatch.setattr(mcp_client._mcp(), "rag_search_batch", fake_batch)
+
+    async def run():
+        return mcp_client._rag_search_batcher(), await mcp_client.rag_search(query="a")
+
+    first_batcher, first = asyncio.run(run())
+    second_batcher, second = asyncio.run(run())
+
+    assert first == second == [{"id": "a"}]
+    assert first_batcher is not second_batcher
+
+
+def test_rag_sources_are_cached_until_a_write(monkeypatch):
+    calls = []
+
+    async def fake_sources():
+        calls.append("rag_sources")
+        return orjson.dumps(["alpha", "beta"]).decode()
+
+    async def fake_upsert(*, content, store=None, source=None):
+        return orjson.dumps({"id": "1", "source": source, "store": store}).decode()
+
+    monkeypatch.setattr(mcp_client._mcp(), "rag_sources", fake_sources)
+    monkeypatch.setattr(mcp_client._mcp(), "rag_upsert", fake_upsert)
+
+    assert asyncio.run(mcp_client.rag_sources()) == ["alpha", "beta"]
+    assert asyncio.run(mcp_client.rag_sources()) == ["alpha", "beta"]
+    assert len(calls) == 1
+
+    asyncio.run(mcp_client.rag_upsert_text("text"))
+    asyncio.run(mcp_client.rag_sources())
+    assert len(calls) == 2
+
+
+def test_rag_batch_maps_error_entries_to_exceptions(monkeypatch):
+    async def fake_batch_execute(*, ops, max_concurrent):
+        assert max_concurrent == 3
+        return orjson.dumps([{"id": "1"}, {"error": "boom"}]).decode()
+
+    monkeypatch.setattr(mcp_client._mcp(), "batch_execute", fake_batch_execute)
+
+    ok, failed = asyncio.run(mcp_client.rag_batch([{"tool": "rag_upsert"}, {"tool": "rag_import"}], max_concurrent=3))
+
+    assert ok == {"id": "1"}
+    assert isinstance(failed, HTTPException) and failed.detail == "boom"
@@ -14,10 +14,14 @@ def _with_env(monkeypatch, **env):
 @pytest.mark.parametrize(
     "cors_value, expected",
     [
-        ("*", ["*"]),
-        ("https://a.com, https://b.com", ["https://a.com", "https://b.com"]),
-        ("[\"https://json.com\", \"https://list.com\"]", ["https://json.com", "https://list.com"]),
-        ("", ["*"]),
+        ("*", ("*",)),
+        ("https://a.com, https://b.com", ("https://a.com", "https://b.com")),
+        ("[\"https://json.com\", \"https://list.com\"]", ("https://json.com", "https://list.com")),
+        ("", ("*",)),
+        ("  https://a.com ,, https://b.com  ,", ("https://a.com", "https://b.com")),
+        (" , ", ("*",)),
+        ("[\" https://padded.com \"]", ("https://padded.com",)),
+        ("[]", ()),
     ],
 )
 def test_cors_parsing(monkeypatch, cors_value, expected):
@@ -32,6 +36,7 @@ def test_cors_parsing(monkeypatch, cors_value, expected):
     get_settings.cache_clear()
     settings = get_settings()
     assert settings.cors_origins == expected
+    assert settings.cors_origins is settings.cors_origins
 
 
 def test_database_url_optional(monkeypatch):
@@ -46,6 +51,7 @@ def test_database_url_optional(monkeypatch):
 
 
 def test_session_scope_without_database_fails(monkeypatch):
+    import asyncio
     import importlib
     import sys
 
@@ -56,6 +62,36 @@ def test_session_scope_without_database_fails(monkeypatch):
     sys.modules.pop("app.db", None)
     db_module = importlib.import_module("app.db")
 
-    with pytest.raises(RuntimeError):
-        with db_module.session_scope():
+    async def _open_session():
+        async with db_module.session_scope():
             pass
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(_open_session())
+
+
+def test_db_module_imports_under_default_test_settings():
+    import importlib
+    import sys
+
+    get_settings.cache_clear()
+    sys.modules.pop("app.db", None)
+    db_module = importlib.import_module("app.db")
+
+    assert db_module.settings.database_url == "sqlite:///:memory:"
+
+
+def test_postgres_engine_gets_pool_sizing(monkeypatch):
+    import importlib
+    import sys
+
+    _with_env(monkeypatch, DATABASE_URL="postgresql+psycopg2://u:p@localhost/db", DB_POOL_SIZE="7")
+    get_settings.cache_clear()
+    sys.modules.pop("app.db", None)
+    db_module = importlib.import_module("app.db")
+
+    engine = db_module.get_engine()
+
+    assert engine.url.drivername == "postgresql+asyncpg"
+    assert engine.pool.size() == 7
+    sys.modules.pop("app.db", None)
@@ -47,6 +47,7 @@ export type RagImportItem = {
 
 export type RagImportResponse = {
   items: RagImportItem[]
+  errors?: string[]
 }
 
 export type RagSearchMatch = {
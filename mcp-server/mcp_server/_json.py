@@ -0,0 +1,42 @@
+"""JSON helpers for hot paths (LLM responses, streamed events, embeddings, tool results).
+
+Encoding and parsing on these paths go through here so the codec lives in one
+place and tests can monkeypatch it. They use ``orjson``, which is several times
+faster than the stdlib on large payloads such as row sets and embedding floats.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Callable, Optional, Union
+
+import orjson
+
+
+def loads(data: Union[bytes, bytearray, memoryview, str]) -> Any:
+    """Parse a JSON document."""
+
+    return orjson.loads(data)
+
+
+def dumps(value: Any, *, sort_keys: bool = False) -> bytes:
+    """Serialise ``value`` to compact UTF-8 JSON; NumPy arrays are supported."""
+
+    option = orjson.OPT_SERIALIZE_NUMPY
+    if sort_keys:
+        option |= orjson.OPT_SORT_KEYS
+    return orjson.dumps(value, option=option)
+
+
+def dumps_text(value: Any, *, default: Optional[Callable[[Any], Any]] = None) -> str:
+    """Serialise ``value`` to a JSON ``str`` (e.g. a tool result); non-string dict keys are allowed."""
+
+    return orjson.dumps(value, default=default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY).decode()
+
+
+def response_json(resp: Any) -> Any:
+    """Parse the body of an ``httpx`` response without the stdlib decoder."""
+
+    return loads(resp.content)
+
+
+__all__ = ["dumps", "dumps_text", "loads", "response_json"]
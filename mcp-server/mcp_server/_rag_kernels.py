@@ -0,0 +1,56 @@
+"""Optional native kernels for RAG scoring.
+
+NumPy already hands float32 scoring to BLAS, but it has no BLAS path for int8
+matrices and would otherwise upcast them block by block. When ``simsimd`` is
+installed, :func:`int8_dots_simd` scores int8 rows with integer SIMD dot
+products across all cores. When ``numba`` is installed, :func:`int8_dots` scores
+them directly, in parallel across rows and without the GIL. The ``*_AVAILABLE``
+flags are ``False`` otherwise and callers keep the NumPy path.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+
+try:
+    import simsimd
+except ImportError:  # pragma: no cover - depends on environment
+    SIMSIMD_AVAILABLE = False
+else:
+    SIMSIMD_AVAILABLE = True
+
+try:
+    from numba import njit, prange
+except ImportError:  # pragma: no cover - depends on environment
+    NUMBA_AVAILABLE = False
+else:
+    NUMBA_AVAILABLE = True
+
+    @njit(parallel=True, fastmath=True, cache=True, nogil=True)
+    def int8_dots(matrix, scales, query, out):  # pragma: no cover - compiled
+        """Write ``(matrix[i] . query) * scales[i]`` into ``out[i]`` for every row."""
+
+        for i in prange(matrix.shape[0]):
+            acc = 0.0
+            for d in range(matrix.shape[1]):
+                acc += matrix[i, d] * query[d]
+            out[i] = acc * scales[i]
+
+
+def int8_dots_simd(matrix: np.ndarray, scales: np.ndarray, query: np.ndarray, out: np.ndarray) -> None:
+    """Like :func:`int8_dots`, with the query quantised to int8 as well so both sides stay integer."""
+
+    peak = float(np.abs(query).max()) if query.size else 0.0
+    if peak == 0.0:
+        out[:] = 0.0
+        return
+    query_scale = peak / 127.0
+    query_i8 = np.round(query / query_scale).astype(np.int8)
+    dots = np.asarray(simsimd.cdist(query_i8, matrix, metric="dot", threads=0), dtype=np.float32).reshape(-1)
+    np.multiply(dots, scales, out=out)
+    out *= query_scale
+
+
+__all__ = ["NUMBA_AVAILABLE", "SIMSIMD_AVAILABLE", "int8_dots_simd"]
+if NUMBA_AVAILABLE:
+    __all__.append("int8_dots")
@@ -2,25 +2,47 @@
 
 from __future__ import annotations
 
-from contextlib import contextmanager
+import asyncio
+from contextlib import contextmanager, nullcontext
+from functools import lru_cache
 import re
-from typing import Any, Optional, Sequence
+from threading import BoundedSemaphore, Lock
+from typing import Any, Iterator, Optional, Sequence, Union
 
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.errors import SyntaxError as PsycopgSyntaxError
+from psycopg2.extras import execute_values
+from psycopg2.pool import ThreadedConnectionPool
+
+try:  # asyncpg is the default driver; psycopg2 remains available via DB_DRIVER=psycopg2
+    import asyncpg
+except ImportError:  # pragma: no cover - depends on environment
+    asyncpg = None
+
+DB_DRIVERS = ("asyncpg", "psycopg2")
 
 
 class DatabaseError(RuntimeError):
     """Raised when the database cannot be initialised or accessed."""
 
 
+class QueryNotWrappableError(DatabaseError):
+    """Raised by ``fetch_json`` when the statement is not valid as a subquery (e.g. ``SELECT ... INTO``)."""
+
+
 class Database:
-    """Thin repository-style wrapper around psycopg2 interactions."""
+    """Thin repository-style wrapper around a pooled set of psycopg2 connections."""
 
-    def __init__(self, url: str) -> None:
+    def __init__(self, url: str, *, min_connections: int = 1, max_connections: int = 10) -> None:
         if not url:
             raise DatabaseError("DATABASE_URL must be configured for MCP server")
         self._url = self._normalise_url(url)
+        self._min_connections = max(0, min_connections)
+        self._max_connections = max(1, self._min_connections, max_connections)
+        self._pool: Optional[ThreadedConnectionPool] = None
+        self._pool_lock = Lock()
+        # ThreadedConnectionPool raises instead of waiting when exhausted; callers queue here instead.
+        self._slots = BoundedSemaphore(self._max_connections)
 
     @staticmethod
     def _normalise_url(url: str) -> str:
@@ -34,25 +56,76 @@ class Database:
                 return url.replace(f"{scheme}://", f"{primary}://", 1)
         return url
 
+    def _get_pool(self) -> ThreadedConnectionPool:
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    try:
+                        self._pool = ThreadedConnectionPool(self._min_connections, self._max_connections, self._url)
+                    except psycopg2.Error as exc:
+                        raise DatabaseError(str(exc)) from exc
+        return self._pool
+
     @contextmanager
-    def connection(self):
-        conn = psycopg2.connect(self._url, cursor_factory=RealDictCursor)
-        try:
-            yield conn
-        finally:
-            conn.close()
-
-    def fetch_all(self, sql: str, params: Optional[Sequence[Any]] = None) -> list[dict[str, Any]]:
+    def connection(self) -> Iterator[Any]:
+        pool = self._get_pool()
+        with self._slots:
+            conn = pool.getconn()
+            if conn.closed:
+                # The server dropped this connection while it sat idle; replace it.
+                pool.putconn(conn, close=True)
+                conn = pool.getconn()
+            try:
+                yield conn
+            except Exception:
+                if not conn.closed:
+                    conn.rollback()
+                raise
+            finally:
+                pool.putconn(conn, close=bool(conn.closed))
+
+    def close(self) -> None:
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.closeall()
+                self._pool = None
+
+    def fetch_rows(
+        self, sql: str, params: Optional[Sequence[Any]] = None, *, read_only: bool = False
+    ) -> tuple[list[str], list[tuple]]:
+        """Return ``(column_names, rows)`` with rows as plain tuples, skipping per-row dict allocation."""
+
         with self.connection() as conn:
             with conn.cursor() as cur:
+                if read_only:
+                    cur.execute(_READ_ONLY_SQL)
                 cur.execute(sql, params or ())
-                return cur.fetchall()
+                return _column_names(cur), cur.fetchall()
+
+    def fetch_all(
+        self, sql: str, params: Optional[Sequence[Any]] = None, *, read_only: bool = False
+    ) -> list[dict[str, Any]]:
+        columns, rows = self.fetch_rows(sql, params, read_only=read_only)
+        return [dict(zip(columns, row)) for row in rows]
+
+    def fetch_json(self, sql: str, *, read_only: bool = False) -> str:
+        """Run a SELECT and return its rows as a JSON array string encoded by Postgres."""
+
+        with self.connection() as conn:
+            with conn.cursor() as cur:
+                if read_only:
+                    cur.execute(_READ_ONLY_SQL)
+                try:
+                    cur.execute(_json_array_sql(sql))
+                except PsycopgSyntaxError as exc:
+                    raise QueryNotWrappableError(str(exc)) from exc
+                return cur.fetchone()[0]
 
     def fetch_one(self, sql: str, params: Optional[Sequence[Any]] = None) -> Optional[dict[str, Any]]:
         with self.connection() as conn:
             with conn.cursor() as cur:
                 cur.execute(sql, params or ())
-                return cur.fetchone()
+                return _as_dict(cur, cur.fetchone())
 
     def execute(
         self,
@@ -64,11 +137,264 @@ class Database:
         with self.connection() as conn:
             with conn.cursor() as cur:
                 cur.execute(sql, params or ())
-                result = cur.fetchone() if returning else None
+                result = _as_dict(cur, cur.fetchone()) if returning else None
                 conn.commit()
                 return result
 
+    def execute_many(
+        self,
+        sql: str,
+        rows: Sequence[Sequence[Any]],
+        *,
+        template: Optional[str] = None,
+        returning: bool = False,
+        page_size: int = 500,
+    ) -> list[dict[str, Any]]:
+        """Run a multi-row statement via ``execute_values``; ``sql`` must contain a single ``VALUES %s``."""
+
+        if not rows:
+            return []
+        with self.connection() as conn:
+            with conn.cursor() as cur:
+                result = execute_values(cur, sql, rows, template=template, page_size=page_size, fetch=returning)
+                conn.commit()
+                if not result:
+                    return []
+                columns = _column_names(cur)
+                return [dict(zip(columns, row)) for row in result]
+
+
+class AsyncpgDatabase:
+    """Async repository backed by a shared ``asyncpg`` pool.
+
+    Exposes the same ``fetch_all``/``fetch_one``/``execute`` calls as :class:`Database`
+    (with ``%s`` placeholders) but runs them natively on the event loop.
+    """
+
+    def __init__(self, url: str, *, min_connections: int = 2, max_connections: int = 20) -> None:
+        if not url:
+            raise DatabaseError("DATABASE_URL must be configured for MCP server")
+        if asyncpg is None:
+            raise DatabaseError("DB_DRIVER=asyncpg requires the `asyncpg` package")
+        self._url = Database._normalise_url(url)
+        self._min_connections = max(0, min_connections)
+        self._max_connections = max(1, self._min_connections, max_connections)
+        self._pool: Optional[Any] = None
+        self._pool_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pool_lock = asyncio.Lock()
+
+    async def _get_pool(self) -> Any:
+        loop = asyncio.get_running_loop()
+        if self._pool is None or self._pool_loop is not loop:
+            async with self._pool_lock:
+                if self._pool is None or self._pool_loop is not loop:
+                    try:
+                        self._pool = await asyncpg.create_pool(
+                            dsn=self._url, min_size=self._min_connections, max_size=self._max_connections
+                        )
+                    except (OSError, asyncpg.PostgresError) as exc:
+                        raise DatabaseError(str(exc)) from exc
+                    self._pool_loop = loop
+        return self._pool
+
+    async def close(self) -> None:
+        pool, self._pool, self._pool_loop = self._pool, None, None
+        if pool is not None:
+            await pool.close()
+
+    async def fetch_all(
+        self, sql: str, params: Optional[Sequence[Any]] = None, *, read_only: bool = False
+    ) -> list[dict[str, Any]]:
+        query, args = _asyncpg_query(sql, params)
+        pool = await self._get_pool()
+        async with pool.acquire() as conn:
+            async with _asyncpg_transaction(conn, read_only):
+                rows = await conn.fetch(query, *args)
+        return [dict(row) for row in rows]
+
+    async def fetch_json(self, sql: str, *, read_only: bool = False) -> str:
+        pool = await self._get_pool()
+        async with pool.acquire() as conn:
+            try:
+                async with _asyncpg_transaction(conn, read_only):
+                    return await conn.fetchval(_json_array_sql(sql))
+            except asyncpg.PostgresSyntaxError as exc:
+                raise QueryNotWrappableError(str(exc)) from exc
+
+    async def fetch_one(self, sql: str, params: Optional[Sequence[Any]] = None) -> Optional[dict[str, Any]]:
+        query, args = _asyncpg_query(sql, params)
+        pool = await self._get_pool()
+        async with pool.acquire() as conn:
+            row = await conn.fetchrow(query, *args)
+        return dict(row) if row is not None else None
+
+    async def execute(
+        self,
+        sql: str,
+        params: Optional[Sequence[Any]] = None,
+        *,
+        returning: bool = False,
+    ) -> Optional[dict[str, Any]]:
+        query, args = _asyncpg_query(sql, params)
+        pool = await self._get_pool()
+        async with pool.acquire() as conn:
+            if returning:
+                row = await conn.fetchrow(query, *args)
+                return dict(row) if row is not None else None
+            await conn.execute(query, *args)
+            return None
+
+    async def execute_many(
+        self,
+        sql: str,
+        rows: Sequence[Sequence[Any]],
+        *,
+        template: Optional[str] = None,
+        returning: bool = False,
+        page_size: int = 500,
+    ) -> list[dict[str, Any]]:
+        """Multi-row ``VALUES %s`` statement, one round trip per page, inside a single transaction."""
+
+        if not rows:
+            return []
+        results: list[dict[str, Any]] = []
+        pool = await self._get_pool()
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                for start in range(0, len(rows), page_size):
+                    query, args = _asyncpg_values_query(sql, rows[start : start + page_size], template)
+                    if returning:
+                        results.extend(dict(row) for row in await conn.fetch(query, *args))
+                    else:
+                        await conn.execute(query, *args)
+        return results
+
+
+class ThreadedDatabase:
+    """Async facade over the psycopg2 :class:`Database` that keeps blocking calls off the event loop."""
+
+    def __init__(self, database: Database) -> None:
+        self._database = database
+
+    async def close(self) -> None:
+        await asyncio.to_thread(self._database.close)
+
+    async def fetch_all(
+        self, sql: str, params: Optional[Sequence[Any]] = None, *, read_only: bool = False
+    ) -> list[dict[str, Any]]:
+        return await asyncio.to_thread(self._database.fetch_all, sql, params, read_only=read_only)
+
+    async def fetch_json(self, sql: str, *, read_only: bool = False) -> str:
+        return await asyncio.to_thread(self._database.fetch_json, sql, read_only=read_only)
+
+    async def fetch_one(self, sql: str, params: Optional[Sequence[Any]] = None) -> Optional[dict[str, Any]]:
+        return await asyncio.to_thread(self._database.fetch_one, sql, params)
+
+    async def execute(
+        self,
+        sql: str,
+        params: Optional[Sequence[Any]] = None,
+        *,
+        returning: bool = False,
+    ) -> Optional[dict[str, Any]]:
+        return await asyncio.to_thread(self._database.execute, sql, params, returning=returning)
+
+    async def execute_many(
+        self,
+        sql: str,
+        rows: Sequence[Sequence[Any]],
+        *,
+        template: Optional[str] = None,
+        returning: bool = False,
+        page_size: int = 500,
+    ) -> list[dict[str, Any]]:
+        return await asyncio.to_thread(
+            self._database.execute_many, sql, rows, template=template, returning=returning, page_size=page_size
+        )
+
+
+AsyncDatabase = Union[AsyncpgDatabase, ThreadedDatabase]
+
+
+def create_async_database(
+    url: str,
+    *,
+    driver: str = "asyncpg",
+    min_connections: Optional[int] = None,
+    max_connections: Optional[int] = None,
+) -> AsyncDatabase:
+    """Build the async database for ``driver`` (``asyncpg`` or ``psycopg2``); unset pool bounds keep driver defaults."""
+
+    driver = (driver or "asyncpg").strip().lower()
+    sizing = {
+        key: value
+        for key, value in (("min_connections", min_connections), ("max_connections", max_connections))
+        if value is not None
+    }
+    if driver == "asyncpg":
+        return AsyncpgDatabase(url, **sizing)
+    if driver == "psycopg2":
+        return ThreadedDatabase(Database(url, **sizing))
+    raise DatabaseError(f"Unsupported DB_DRIVER: {driver}")
+
+
+_PLACEHOLDER = re.compile(r"%(s|%)")
+
+
+@lru_cache(maxsize=256)
+def _asyncpg_sql(sql: str) -> str:
+    counter = iter(range(1, sql.count("%s") + 1))
+    return _PLACEHOLDER.sub(lambda match: "%" if match.group(1) == "%" else f"${next(counter)}", sql)
+
+
+def _asyncpg_query(sql: str, params: Optional[Sequence[Any]]) -> tuple[str, Sequence[Any]]:
+    """Rewrite psycopg2 ``%s`` placeholders to asyncpg's ``$n`` form; SQL without params is left untouched."""
+
+    if not params:
+        return sql, ()
+    return _asyncpg_sql(sql), params
+
+
+def _asyncpg_values_query(
+    sql: str, rows: Sequence[Sequence[Any]], template: Optional[str]
+) -> tuple[str, list[Any]]:
+    """Expand ``VALUES %s`` into one ``template`` per row (``execute_values`` semantics) with ``$n`` placeholders."""
+
+    row_template = template or "(" + ", ".join(["%s"] * len(rows[0])) + ")"
+    values = ", ".join([row_template] * len(rows))
+    return _asyncpg_sql(sql.replace("%s", values, 1)), [value for row in rows for value in row]
+
+
+# ``read_only`` fetches run in a transaction Postgres refuses to write from, so side effects hidden in a
+# SELECT (volatile functions, data-modifying CTEs) fail instead of being autocommitted.
+_READ_ONLY_SQL = "SET TRANSACTION READ ONLY"
+
+
+def _asyncpg_transaction(conn: Any, read_only: bool) -> Any:
+    return conn.transaction(readonly=True) if read_only else nullcontext()
+
+
+def _json_array_sql(sql: str) -> str:
+    """Wrap a SELECT so Postgres aggregates its rows into one JSON array (``json_agg`` keeps column order)."""
+
+    inner = sql.strip().rstrip(";")
+    return f"SELECT COALESCE(json_agg(t), '[]'::json)::text FROM ({inner}) AS t"
+
+
+def _column_names(cursor: Any) -> list[str]:
+    return [column[0] for column in cursor.description or ()]
+
+
+def _as_dict(cursor: Any, row: Optional[tuple]) -> Optional[dict[str, Any]]:
+    if row is None:
+        return None
+    return dict(zip(_column_names(cursor), row))
+
+
+_SELECT_RE = re.compile(r"\s*select", re.IGNORECASE)
+
 
 def ensure_select_only(sql: str) -> None:
-    if not sql.lstrip().lower().startswith("select"):
+    # Anchored match on the leading keyword; avoids lowercasing a copy of the whole statement.
+    if _SELECT_RE.match(sql) is None:
         raise DatabaseError("Only SELECT queries are allowed")
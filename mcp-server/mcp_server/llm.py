@@ -7,13 +7,29 @@ that the rest of the codebase can remain agnostic to concrete LLM vendors.
 from __future__ import annotations
 
 from abc import ABC, abstractmethod
+import asyncio
+from contextlib import AsyncExitStack, asynccontextmanager, nullcontext
 from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from functools import lru_cache, partial
 import json
 import os
-from typing import Any, Dict, Iterable, Mapping, Optional
+import random
+import time
+from typing import Any, AsyncContextManager, AsyncIterator, Callable, Dict, Mapping, Optional, Sequence, Tuple
 
 import httpx
 
+from mcp_server import _json
+from mcp_server.llm_cache import LLMCache, build_cache
+
+try:  # HTTP/2 needs the optional `h2` package (installed via httpx[http2]).
+    import h2  # noqa: F401
+except ImportError:  # pragma: no cover - depends on environment
+    HTTP2_AVAILABLE = False
+else:
+    HTTP2_AVAILABLE = True
+
 
 Message = Dict[str, str]
 
@@ -22,20 +38,243 @@ class LLMError(Exception):
     """Raised when an LLM invocation fails or is misconfigured."""
 
 
-class LLMProvider(ABC):
-    """Strategy interface for invoking chat-completion style providers."""
+DEFAULT_MAX_CONNECTIONS = 200
+DEFAULT_MAX_KEEPALIVE = 100
+DEFAULT_KEEPALIVE_EXPIRY = 30.0
+
+# Responses worth retrying: rate limiting and transient upstream failures.
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# Batch states after which the batch will never produce (more) output.
+BATCH_FAILED_STATUSES = frozenset({"failed", "expired", "cancelled"})
+
+
+@dataclass(frozen=True)
+class BatchStatus:
+    """Progress of a submitted chat batch; ``replies`` maps each request id to its text once completed."""
+
+    batch_id: str
+    status: str
+    replies: Mapping[str, str]
+    errors: Mapping[str, str]
+
+    @property
+    def done(self) -> bool:
+        return self.status == "completed" or self.status in BATCH_FAILED_STATUSES
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """Exponential backoff with jitter for rate-limited or transiently failing chat calls."""
+
+    max_retries: int = 3
+    base_delay: float = 0.5
+    max_delay: float = 30.0
 
-    def __init__(self, *, timeout: float = 30.0) -> None:
+    def delay(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """Seconds to wait before retry ``attempt`` (0-based), honouring a ``Retry-After`` header."""
+
+        hinted = _retry_after_seconds(retry_after)
+        if hinted is None:
+            hinted = self.base_delay * 2**attempt + random.uniform(0, self.base_delay)
+        return min(max(hinted, 0.0), self.max_delay)
+
+
+def _retry_after_seconds(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return parsedate_to_datetime(value).timestamp() - time.time()
+    except (TypeError, ValueError):
+        return None
+
+
+class LLMProvider(ABC):
+    """Strategy interface for invoking chat-completion style providers.
+
+    Each provider keeps one long-lived HTTP client so consecutive calls reuse pooled
+    keep-alive connections instead of paying a TCP/TLS handshake per request. Chat
+    requests retry on 429/5xx per ``retry`` and, with ``max_concurrency``, at most
+    that many are in flight at once.
+    """
+
+    def __init__(
+        self,
+        *,
+        timeout: float = 30.0,
+        limits: Optional[httpx.Limits] = None,
+        retry: Optional[RetryPolicy] = None,
+        max_concurrency: Optional[int] = None,
+    ) -> None:
         self._timeout = timeout
+        self._limits = limits or httpx.Limits(
+            max_connections=DEFAULT_MAX_CONNECTIONS,
+            max_keepalive_connections=DEFAULT_MAX_KEEPALIVE,
+            keepalive_expiry=DEFAULT_KEEPALIVE_EXPIRY,
+        )
+        self._retry = retry or RetryPolicy()
+        self._max_concurrency = max_concurrency
+        self._http: Optional[httpx.AsyncClient] = None
+        self._http_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._slots: Optional[asyncio.Semaphore] = None
 
     @abstractmethod
-    async def chat(self, messages: Iterable[Message], *, model: Optional[str] = None) -> str:
-        """Perform a chat completion and return the provider's textual reply."""
+    async def chat(self, messages: Sequence[Message], *, model: Optional[str] = None) -> str:
+        """Perform a chat completion and return the provider's textual reply.
+
+        ``messages`` is sent as-is (callers pass a list), so providers must not mutate it.
+        """
+
+    async def stream_chat(self, messages: Sequence[Message], *, model: Optional[str] = None) -> AsyncIterator[str]:
+        """Yield the reply as it is generated; providers without streaming yield it in one piece."""
+
+        yield await self.chat(messages, model=model)
 
     def _client(self) -> httpx.AsyncClient:
+        """Return the shared HTTP client, creating it on first use in the running event loop."""
+
+        loop = asyncio.get_running_loop()
+        if self._http is None or self._http.is_closed or self._http_loop is not loop:
+            # Pooled connections belong to the loop that opened them, so a new loop gets a new client.
+            self._http = self._build_client()
+            self._http_loop = loop
+            self._slots = asyncio.Semaphore(self._max_concurrency) if self._max_concurrency else None
+        return self._http
+
+    async def submit_batch(self, requests: Mapping[str, Sequence[Message]], *, model: Optional[str] = None) -> str:
+        """Queue ``{request_id: messages}`` for asynchronous, discounted processing and return the batch id."""
+
+        raise LLMError(f"{type(self).__name__} does not support batch submission")
+
+    async def batch_status(self, batch_id: str) -> BatchStatus:
+        """Poll a batch created by :meth:`submit_batch`."""
+
+        raise LLMError(f"{type(self).__name__} does not support batch submission")
+
+    async def _post(self, url: str, **kwargs: Any) -> httpx.Response:
+        return await self._request("POST", url, **kwargs)
+
+    async def _request(self, method: str, url: str, **kwargs: Any) -> httpx.Response:
+        """Send with the shared client, retrying rate limits, 5xx and failed connects with backoff."""
+
+        send = getattr(self._client(), method.lower())
+        attempt = 0
+        while True:
+            try:
+                async with self._slots or nullcontext():
+                    resp = await send(url, **kwargs)
+            except (httpx.ConnectError, httpx.ConnectTimeout):
+                # Nothing reached the provider, so the request is safe to resend.
+                if attempt >= self._retry.max_retries:
+                    raise
+                delay = self._retry.delay(attempt)
+            else:
+                if resp.status_code not in RETRY_STATUSES or attempt >= self._retry.max_retries:
+                    resp.raise_for_status()
+                    return resp
+                delay = self._retry.delay(attempt, resp.headers.get("Retry-After"))
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    @asynccontextmanager
+    async def _stream(self, method: str, url: str, **kwargs: Any) -> AsyncIterator[httpx.Response]:
+        """Open a streamed response with the retry and concurrency rules of :meth:`_request`.
+
+        Only opening the stream is retried, before any of the body reaches the caller; the
+        concurrency slot is held until the stream is closed.
+        """
+
+        client = self._client()
+        attempt = 0
+        while True:
+            async with AsyncExitStack() as stack:
+                await stack.enter_async_context(self._slots or nullcontext())
+                try:
+                    resp = await stack.enter_async_context(client.stream(method, url, **kwargs))
+                except (httpx.ConnectError, httpx.ConnectTimeout):
+                    if attempt >= self._retry.max_retries:
+                        raise
+                    delay = self._retry.delay(attempt)
+                else:
+                    if resp.status_code not in RETRY_STATUSES or attempt >= self._retry.max_retries:
+                        resp.raise_for_status()
+                        yield resp
+                        return
+                    delay = self._retry.delay(attempt, resp.headers.get("Retry-After"))
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    def _build_client(self) -> httpx.AsyncClient:
         """Factory for a configured HTTP client."""
 
-        return httpx.AsyncClient(timeout=self._timeout)
+        return httpx.AsyncClient(timeout=self._timeout, limits=self._limits, http2=HTTP2_AVAILABLE)
+
+    def _warmup_url(self) -> Optional[str]:
+        """Base URL to pre-connect to, or ``None`` to skip warm-up."""
+
+        return None
+
+    async def warmup(self) -> None:
+        """Open a pooled connection to the provider so the first chat skips DNS and TLS setup."""
+
+        url = self._warmup_url()
+        if not url:
+            return
+        try:
+            await self._client().head(url)
+        except httpx.HTTPError:
+            pass  # Warm-up is best-effort; any status code still leaves a warm connection.
+
+    def cache_namespace(self) -> str:
+        """Identity of this provider's configuration, so cached replies never cross models or endpoints."""
+
+        settings = getattr(self, "_settings", None)
+        fields = {k: v for k, v in vars(settings).items() if k != "api_key"} if settings is not None else {}
+        return json.dumps([type(self).__name__, fields], sort_keys=True)
+
+    async def aclose(self) -> None:
+        """Close the shared HTTP client and its pooled connections."""
+
+        client, self._http, self._http_loop = self._http, None, None
+        if client is not None and not client.is_closed:
+            await client.aclose()
+
+    async def __aenter__(self) -> "LLMProvider":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.aclose()
+
+
+async def _iter_sse_events(stream: AsyncContextManager[httpx.Response]) -> AsyncIterator[Dict[str, Any]]:
+    """Open ``stream`` and yield each JSON event from its ``text/event-stream`` body."""
+
+    async with stream as resp:
+        async for line in resp.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            data = line[5:].strip()
+            if data == "[DONE]":
+                break
+            if data:
+                yield _json.loads(data)
+
+
+async def _stream_openai_compatible(
+    provider: LLMProvider, url: str, *, headers: Dict[str, str], payload: Dict[str, Any]
+) -> AsyncIterator[str]:
+    """Yield content deltas from an OpenAI-style streaming chat completion."""
+
+    stream = provider._stream("POST", url, headers=headers, json={**payload, "stream": True})
+    async for event in _iter_sse_events(stream):
+        for choice in event.get("choices") or ():
+            delta = (choice.get("delta") or {}).get("content")
+            if delta:
+                yield delta
 
 
 @dataclass(frozen=True)
@@ -45,22 +284,107 @@ class OpenAISettings:
 
 
 class OpenAIProvider(LLMProvider):
-    def __init__(self, settings: OpenAISettings) -> None:
-        super().__init__()
+    def __init__(
+        self,
+        settings: OpenAISettings,
+        *,
+        limits: Optional[httpx.Limits] = None,
+        retry: Optional[RetryPolicy] = None,
+        max_concurrency: Optional[int] = None,
+    ) -> None:
+        super().__init__(limits=limits, retry=retry, max_concurrency=max_concurrency)
         self._settings = settings
 
-    async def chat(self, messages: Iterable[Message], *, model: Optional[str] = None) -> str:
-        payload_messages = list(messages)
+    def _warmup_url(self) -> Optional[str]:
+        return "https://api.openai.com"
+
+    async def chat(self, messages: Sequence[Message], *, model: Optional[str] = None) -> str:
+        chosen_model = model or self._settings.default_model
+        resp = await self._post(
+            "https://api.openai.com/v1/chat/completions",
+            headers={"Authorization": f"Bearer {self._settings.api_key}"},
+            json={"model": chosen_model, "messages": messages},
+        )
+        data = _json.response_json(resp)
+        return data["choices"][0]["message"]["content"].strip()
+
+    async def stream_chat(self, messages: Sequence[Message], *, model: Optional[str] = None) -> AsyncIterator[str]:
+        async for delta in _stream_openai_compatible(
+            self,
+            "https://api.openai.com/v1/chat/completions",
+            headers={"Authorization": f"Bearer {self._settings.api_key}"},
+            payload={"model": model or self._settings.default_model, "messages": messages},
+        ):
+            yield delta
+
+    async def submit_batch(self, requests: Mapping[str, Sequence[Message]], *, model: Optional[str] = None) -> str:
+        """Upload the requests as JSONL and start a 24h Batch API job (billed at half the synchronous rate)."""
+
         chosen_model = model or self._settings.default_model
-        async with self._client() as client:
-            resp = await client.post(
-                "https://api.openai.com/v1/chat/completions",
-                headers={"Authorization": f"Bearer {self._settings.api_key}"},
-                json={"model": chosen_model, "messages": payload_messages},
+        lines = b"\n".join(
+            _json.dumps(
+                {
+                    "custom_id": request_id,
+                    "method": "POST",
+                    "url": "/v1/chat/completions",
+                    "body": {"model": chosen_model, "messages": messages},
+                }
             )
-            resp.raise_for_status()
-            data = resp.json()
-            return data["choices"][0]["message"]["content"].strip()
+            for request_id, messages in requests.items()
+        )
+        headers = {"Authorization": f"Bearer {self._settings.api_key}"}
+        upload = await self._post(
+            "https://api.openai.com/v1/files",
+            headers=headers,
+            data={"purpose": "batch"},
+            files={"file": ("batch.jsonl", lines, "application/jsonl")},
+        )
+        resp = await self._post(
+            "https://api.openai.com/v1/batches",
+            headers=headers,
+            json={
+                "input_file_id": _json.response_json(upload)["id"],
+                "endpoint": "/v1/chat/completions",
+                "completion_window": "24h",
+            },
+        )
+        return _json.response_json(resp)["id"]
+
+    async def batch_status(self, batch_id: str) -> BatchStatus:
+        headers = {"Authorization": f"Bearer {self._settings.api_key}"}
+        resp = await self._request("GET", f"https://api.openai.com/v1/batches/{batch_id}", headers=headers)
+        batch = _json.response_json(resp)
+        status = batch.get("status") or "unknown"
+        replies: Dict[str, str] = {}
+        errors: Dict[str, str] = {}
+        # Results are only read once the job is finished; partial output files are not exposed earlier.
+        if status == "completed" or status in BATCH_FAILED_STATUSES:
+            for file_id in (batch.get("output_file_id"), batch.get("error_file_id")):
+                if not file_id:
+                    continue
+                content = await self._request(
+                    "GET", f"https://api.openai.com/v1/files/{file_id}/content", headers=headers
+                )
+                for line in content.content.splitlines():
+                    if line.strip():
+                        _collect_batch_line(_json.loads(line), replies, errors)
+        return BatchStatus(batch_id=batch_id, status=status, replies=replies, errors=errors)
+
+
+def _collect_batch_line(record: Mapping[str, Any], replies: Dict[str, str], errors: Dict[str, str]) -> None:
+    """Sort one Batch API output line into ``replies`` or ``errors`` by its ``custom_id``."""
+
+    request_id = record.get("custom_id")
+    response = record.get("response") or {}
+    if response.get("status_code") == 200:
+        try:
+            replies[request_id] = response["body"]["choices"][0]["message"]["content"].strip()
+            return
+        except (KeyError, IndexError, TypeError, AttributeError):
+            errors[request_id] = "Batch response missing message content"
+            return
+    error = record.get("error") or (response.get("body") or {}).get("error") or {}
+    errors[request_id] = error.get("message") or f"Batch request failed with status {response.get('status_code')}"
 
 
 @dataclass(frozen=True)
@@ -69,40 +393,76 @@ class AnthropicSettings:
     default_model: str
 
 
+# Conversation roles the Messages API accepts; system text goes in a separate field.
+_ANTHROPIC_ROLES = frozenset({"user", "assistant"})
+
+
 class AnthropicProvider(LLMProvider):
-    def __init__(self, settings: AnthropicSettings) -> None:
-        super().__init__()
+    def __init__(
+        self,
+        settings: AnthropicSettings,
+        *,
+        limits: Optional[httpx.Limits] = None,
+        retry: Optional[RetryPolicy] = None,
+        max_concurrency: Optional[int] = None,
+    ) -> None:
+        super().__init__(limits=limits, retry=retry, max_concurrency=max_concurrency)
         self._settings = settings
 
-    async def chat(self, messages: Iterable[Message], *, model: Optional[str] = None) -> str:
-        payload_messages = list(messages)
-        chosen_model = model or self._settings.default_model
-        system_text = "\n".join(m["content"] for m in payload_messages if m.get("role") == "system")
+    def _warmup_url(self) -> Optional[str]:
+        return "https://api.anthropic.com"
+
+    def _headers(self) -> Dict[str, str]:
+        return {
+            "x-api-key": self._settings.api_key,
+            "anthropic-version": "2023-06-01",
+            "anthropic-beta": "prompt-caching-2024-07-31",
+        }
+
+    def _payload(self, messages: Sequence[Message], model: Optional[str]) -> Dict[str, Any]:
+        system_blocks = []
         content = []
-        for message in payload_messages:
+        for message in messages:
             role = message.get("role")
-            if role == "user":
-                content.append({"role": "user", "content": message.get("content")})
-            elif role == "assistant":
-                content.append({"role": "assistant", "content": message.get("content")})
+            if role in _ANTHROPIC_ROLES:
+                content.append({"role": role, "content": message.get("content")})
+            elif role == "system":
+                system_blocks.append({"type": "text", "text": message["content"]})
+        if system_blocks:
+            # The leading system prompt is the static instruction text; mark it as a prompt-cache
+            # breakpoint so later blocks (e.g. injected RAG context) can vary without a full re-read.
+            system_blocks[0]["cache_control"] = {"type": "ephemeral"}
+        return {
+            "model": model or self._settings.default_model,
+            "system": system_blocks or None,
+            "messages": content,
+            "max_tokens": 1024,
+        }
+
+    async def chat(self, messages: Sequence[Message], *, model: Optional[str] = None) -> str:
+        resp = await self._post(
+            "https://api.anthropic.com/v1/messages",
+            headers=self._headers(),
+            json=self._payload(messages, model),
+        )
+        data = _json.response_json(resp)
+        return "".join(block.get("text", "") for block in data.get("content", [])).strip()
 
-        async with self._client() as client:
-            resp = await client.post(
+    async def stream_chat(self, messages: Sequence[Message], *, model: Optional[str] = None) -> AsyncIterator[str]:
+        async for event in _iter_sse_events(
+            self._stream(
+                "POST",
                 "https://api.anthropic.com/v1/messages",
-                headers={
-                    "x-api-key": self._settings.api_key,
-                    "anthropic-version": "2023-06-01",
-                },
-                json={
-                    "model": chosen_model,
-                    "system": system_text or None,
-                    "messages": content,
-                    "max_tokens": 1024,
-                },
+                headers=self._headers(),
+                json={**self._payload(messages, model), "stream": True},
             )
-            resp.raise_for_status()
-            data = resp.json()
-            return "".join(block.get("text", "") for block in data.get("content", [])).strip()
+        ):
+            if event.get("type") == "content_block_delta":
+                text = (event.get("delta") or {}).get("text")
+                if text:
+                    yield text
+            elif event.get("type") == "message_stop":
+                break
 
 
 @dataclass(frozen=True)
@@ -112,22 +472,38 @@ class OpenRouterSettings:
 
 
 class OpenRouterProvider(LLMProvider):
-    def __init__(self, settings: OpenRouterSettings) -> None:
-        super().__init__()
+    def __init__(
+        self,
+        settings: OpenRouterSettings,
+        *,
+        limits: Optional[httpx.Limits] = None,
+        retry: Optional[RetryPolicy] = None,
+        max_concurrency: Optional[int] = None,
+    ) -> None:
+        super().__init__(limits=limits, retry=retry, max_concurrency=max_concurrency)
         self._settings = settings
 
-    async def chat(self, messages: Iterable[Message], *, model: Optional[str] = None) -> str:
-        payload_messages = list(messages)
+    def _warmup_url(self) -> Optional[str]:
+        return "https://openrouter.ai"
+
+    async def chat(self, messages: Sequence[Message], *, model: Optional[str] = None) -> str:
         chosen_model = model or self._settings.default_model
-        async with self._client() as client:
-            resp = await client.post(
-                "https://openrouter.ai/api/v1/chat/completions",
-                headers={"Authorization": f"Bearer {self._settings.api_key}"},
-                json={"model": chosen_model, "messages": payload_messages},
-            )
-            resp.raise_for_status()
-            data = resp.json()
-            return data["choices"][0]["message"]["content"].strip()
+        resp = await self._post(
+            "https://openrouter.ai/api/v1/chat/completions",
+            headers={"Authorization": f"Bearer {self._settings.api_key}"},
+            json={"model": chosen_model, "messages": messages},
+        )
+        data = _json.response_json(resp)
+        return data["choices"][0]["message"]["content"].strip()
+
+    async def stream_chat(self, messages: Sequence[Message], *, model: Optional[str] = None) -> AsyncIterator[str]:
+        async for delta in _stream_openai_compatible(
+            self,
+            "https://openrouter.ai/api/v1/chat/completions",
+            headers={"Authorization": f"Bearer {self._settings.api_key}"},
+            payload={"model": model or self._settings.default_model, "messages": messages},
+        ):
+            yield delta
 
 
 @dataclass(frozen=True)
@@ -138,31 +514,55 @@ class OllamaSettings:
 
 
 class OllamaProvider(LLMProvider):
-    def __init__(self, settings: OllamaSettings) -> None:
-        super().__init__()
+    def __init__(
+        self,
+        settings: OllamaSettings,
+        *,
+        limits: Optional[httpx.Limits] = None,
+        retry: Optional[RetryPolicy] = None,
+        max_concurrency: Optional[int] = None,
+    ) -> None:
+        super().__init__(limits=limits, retry=retry, max_concurrency=max_concurrency)
         self._settings = settings
 
-    async def chat(self, messages: Iterable[Message], *, model: Optional[str] = None) -> str:
-        payload_messages = list(messages)
-        chosen_model = model or self._settings.default_model
+    def _warmup_url(self) -> Optional[str]:
+        return self._settings.endpoint
+
+    def _payload(self, messages: Sequence[Message], model: Optional[str], *, stream: bool) -> Dict[str, Any]:
         payload: Dict[str, Any] = {
-            "model": chosen_model,
-            "messages": payload_messages,
-            "stream": False,
+            "model": model or self._settings.default_model,
+            "messages": messages,
+            "stream": stream,
         }
         if self._settings.options_json:
             try:
                 payload["options"] = json.loads(self._settings.options_json)
             except json.JSONDecodeError:
                 pass
-        async with self._client() as client:
-            resp = await client.post(f"{self._settings.endpoint}/api/chat", json=payload)
-            resp.raise_for_status()
-            data = resp.json()
-            message = data.get("message", {}).get("content")
-            if not message:
-                raise LLMError("Ollama response missing message content")
-            return message.strip()
+        return payload
+
+    async def stream_chat(self, messages: Sequence[Message], *, model: Optional[str] = None) -> AsyncIterator[str]:
+        payload = self._payload(messages, model, stream=True)
+        async with self._stream("POST", f"{self._settings.endpoint}/api/chat", json=payload) as resp:
+            # Ollama streams newline-delimited JSON objects rather than SSE.
+            async for line in resp.aiter_lines():
+                if not line.strip():
+                    continue
+                chunk = _json.loads(line)
+                delta = (chunk.get("message") or {}).get("content")
+                if delta:
+                    yield delta
+                if chunk.get("done"):
+                    break
+
+    async def chat(self, messages: Sequence[Message], *, model: Optional[str] = None) -> str:
+        payload = self._payload(messages, model, stream=False)
+        resp = await self._post(f"{self._settings.endpoint}/api/chat", json=payload)
+        data = _json.response_json(resp)
+        message = data.get("message", {}).get("content")
+        if not message:
+            raise LLMError("Ollama response missing message content")
+        return message.strip()
 
 
 @dataclass(frozen=True)
@@ -174,26 +574,110 @@ class AzureOpenAISettings:
 
 
 class AzureOpenAIProvider(LLMProvider):
-    def __init__(self, settings: AzureOpenAISettings) -> None:
-        super().__init__()
+    def __init__(
+        self,
+        settings: AzureOpenAISettings,
+        *,
+        limits: Optional[httpx.Limits] = None,
+        retry: Optional[RetryPolicy] = None,
+        max_concurrency: Optional[int] = None,
+    ) -> None:
+        super().__init__(limits=limits, retry=retry, max_concurrency=max_concurrency)
         self._settings = settings
 
-    async def chat(self, messages: Iterable[Message], *, model: Optional[str] = None) -> str:  # noqa: D401
-        del model  # Azure deployments are tied to a single model variant.
-        payload_messages = list(messages)
-        url = (
+    def _warmup_url(self) -> Optional[str]:
+        return self._settings.endpoint
+
+    def _url(self) -> str:
+        return (
             f"{self._settings.endpoint}/openai/deployments/{self._settings.deployment}/"
             f"chat/completions?api-version={self._settings.api_version}"
         )
-        async with self._client() as client:
-            resp = await client.post(
-                url,
-                headers={"api-key": self._settings.api_key},
-                json={"messages": payload_messages},
-            )
-            resp.raise_for_status()
-            data = resp.json()
-            return data["choices"][0]["message"]["content"].strip()
+
+    async def chat(self, messages: Sequence[Message], *, model: Optional[str] = None) -> str:  # noqa: D401
+        del model  # Azure deployments are tied to a single model variant.
+        resp = await self._post(
+            self._url(),
+            headers={"api-key": self._settings.api_key},
+            json={"messages": messages},
+        )
+        data = _json.response_json(resp)
+        return data["choices"][0]["message"]["content"].strip()
+
+    async def stream_chat(self, messages: Sequence[Message], *, model: Optional[str] = None) -> AsyncIterator[str]:
+        del model
+        async for delta in _stream_openai_compatible(
+            self,
+            self._url(),
+            headers={"api-key": self._settings.api_key},
+            payload={"messages": messages},
+        ):
+            yield delta
+
+
+class CachedProvider(LLMProvider):
+    """Decorator that answers repeated identical chat requests from an :class:`LLMCache`.
+
+    Only enable it for deterministic workloads (e.g. temperature 0): a cached
+    reply is replayed verbatim for the cache TTL. Identical requests that arrive
+    while the first is still in flight wait for its reply instead of calling the
+    provider again. With ``cache=None`` only that in-flight coalescing is done.
+    """
+
+    def __init__(self, inner: LLMProvider, cache: Optional[LLMCache]) -> None:
+        super().__init__()
+        self._inner = inner
+        self._cache = cache
+        self._namespace = inner.cache_namespace()
+        self._inflight: Dict[str, "asyncio.Task[str]"] = {}
+
+    async def chat(self, messages: Sequence[Message], *, model: Optional[str] = None) -> str:
+        key = LLMCache.cache_key(self._namespace, model, messages)
+        task = self._inflight.get(key)
+        if task is None or task.get_loop() is not asyncio.get_running_loop():
+            task = asyncio.ensure_future(self._chat_through_cache(key, messages, model))
+            self._inflight[key] = task
+            task.add_done_callback(partial(self._forget_inflight, key))
+        # Shield the shared task so one caller's cancellation does not fail the others.
+        return await asyncio.shield(task)
+
+    def _forget_inflight(self, key: str, task: "asyncio.Task[str]") -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+    async def _chat_through_cache(self, key: str, messages: Sequence[Message], model: Optional[str]) -> str:
+        if self._cache is None:
+            return await self._inner.chat(messages, model=model)
+        try:
+            cached = await self._cache.get(key)
+        except Exception:  # pragma: no cover - a broken cache must not take chat down
+            cached = None
+        if cached is not None:
+            return cached
+        reply = await self._inner.chat(messages, model=model)
+        try:
+            await self._cache.set(key, reply)
+        except Exception:  # pragma: no cover - see above
+            pass
+        return reply
+
+    def stream_chat(self, messages: Sequence[Message], *, model: Optional[str] = None) -> AsyncIterator[str]:
+        return self._inner.stream_chat(messages, model=model)
+
+    async def submit_batch(self, requests: Mapping[str, Sequence[Message]], *, model: Optional[str] = None) -> str:
+        return await self._inner.submit_batch(requests, model=model)
+
+    async def batch_status(self, batch_id: str) -> BatchStatus:
+        return await self._inner.batch_status(batch_id)
+
+    def cache_namespace(self) -> str:
+        return self._namespace
+
+    async def warmup(self) -> None:
+        await self._inner.warmup()
+
+    async def aclose(self) -> None:
+        await self._inner.aclose()
 
 
 def _require(env: Mapping[str, str], key: str) -> str:
@@ -203,45 +687,121 @@ def _require(env: Mapping[str, str], key: str) -> str:
     return value
 
 
+def _env_number(env: Mapping[str, str], key: str, default: float, cast: Any = int) -> Any:
+    raw = env.get(key)
+    if not raw:
+        return cast(default)
+    try:
+        return cast(raw)
+    except ValueError as exc:
+        raise LLMError(f"Environment variable {key} must be a number") from exc
+
+
+def _http_limits(env: Mapping[str, str]) -> httpx.Limits:
+    """Connection-pool limits shared by every provider, tunable for high fan-out workloads."""
+
+    return httpx.Limits(
+        max_connections=_env_number(env, "LLM_HTTP_MAX_CONNECTIONS", DEFAULT_MAX_CONNECTIONS),
+        max_keepalive_connections=_env_number(env, "LLM_HTTP_MAX_KEEPALIVE", DEFAULT_MAX_KEEPALIVE),
+        keepalive_expiry=_env_number(env, "LLM_HTTP_KEEPALIVE_EXPIRY", DEFAULT_KEEPALIVE_EXPIRY, float),
+    )
+
+
+def _retry_policy(env: Mapping[str, str]) -> RetryPolicy:
+    """Backoff for 429/5xx responses (``LLM_MAX_RETRIES=0`` disables retries)."""
+
+    return RetryPolicy(
+        max_retries=max(0, _env_number(env, "LLM_MAX_RETRIES", RetryPolicy.max_retries)),
+        base_delay=_env_number(env, "LLM_RETRY_BASE_DELAY", RetryPolicy.base_delay, float),
+    )
+
+
+# Environment prefixes that influence provider selection; anything else is ignored when memoising.
+_CONFIG_PREFIXES = ("LLM_", "OPENAI_", "ANTHROPIC_", "OPENROUTER_", "OLLAMA_", "AZURE_OPENAI_", "REDIS_")
+
+
 def create_provider(environment: Optional[Mapping[str, str]] = None) -> LLMProvider:
-    """Factory that builds a provider based on environment configuration."""
+    """Factory that builds a provider based on environment configuration.
+
+    Dispatch and validation run once per distinct configuration; later calls only
+    construct the provider from the memoised, already validated settings.
+    """
+
+    env = os.environ if environment is None else environment
+    config = tuple(sorted((key, value) for key, value in env.items() if key.startswith(_CONFIG_PREFIXES)))
+    return _provider_factory(config)()
+
+
+def reset_provider_cache() -> None:
+    """Forget memoised provider factories (e.g. after tests change the environment)."""
 
-    env = dict(environment or os.environ)
+    _provider_factory.cache_clear()
+
+
+@lru_cache(maxsize=16)
+def _provider_factory(config: Tuple[Tuple[str, str], ...]) -> Callable[[], LLMProvider]:
+    env = dict(config)
+    make_provider = _provider_constructor(env)
+    try:
+        cache_enabled = build_cache(env) is not None
+    except ValueError as exc:
+        raise LLMError(str(exc)) from exc
+    if cache_enabled:
+        return lambda: CachedProvider(make_provider(), build_cache(env))
+    if (env.get("LLM_COALESCE") or "").strip().lower() in {"1", "true", "yes"}:
+        # No reply is stored, but a burst of identical concurrent requests shares one upstream call.
+        return lambda: CachedProvider(make_provider(), None)
+    return make_provider
+
+
+def _provider_constructor(env: Mapping[str, str]) -> Callable[[], LLMProvider]:
     provider_name = env.get("LLM_PROVIDER", "openai").lower()
+    transport: Dict[str, Any] = {
+        "limits": _http_limits(env),
+        "retry": _retry_policy(env),
+        # e.g. OPENAI_MAX_CONCURRENCY; unset or 0 leaves in-flight requests unbounded.
+        "max_concurrency": max(0, _env_number(env, f"{provider_name.upper()}_MAX_CONCURRENCY", 0)) or None,
+    }
 
     if provider_name == "openai":
         api_key = _require(env, "OPENAI_API_KEY")
         default_model = env.get("LLM_MODEL", "gpt-4o-mini")
-        return OpenAIProvider(OpenAISettings(api_key=api_key, default_model=default_model))
+        return partial(OpenAIProvider, OpenAISettings(api_key=api_key, default_model=default_model), **transport)
 
     if provider_name == "anthropic":
         api_key = _require(env, "ANTHROPIC_API_KEY")
         default_model = env.get("LLM_MODEL", "claude-3-5-sonnet-20240620")
-        return AnthropicProvider(AnthropicSettings(api_key=api_key, default_model=default_model))
+        return partial(AnthropicProvider, AnthropicSettings(api_key=api_key, default_model=default_model), **transport)
 
     if provider_name == "openrouter":
         api_key = _require(env, "OPENROUTER_API_KEY")
         default_model = env.get("LLM_MODEL", "openrouter/auto")
-        return OpenRouterProvider(OpenRouterSettings(api_key=api_key, default_model=default_model))
+        return partial(OpenRouterProvider, OpenRouterSettings(api_key=api_key, default_model=default_model), **transport)
 
     if provider_name == "ollama":
         endpoint = env.get("OLLAMA_ENDPOINT", "http://localhost:11434").rstrip("/")
         default_model = env.get("OLLAMA_MODEL", env.get("LLM_MODEL", "llama3"))
         options_json = env.get("OLLAMA_OPTIONS")
-        return OllamaProvider(OllamaSettings(endpoint=endpoint, default_model=default_model, options_json=options_json))
+        return partial(
+            OllamaProvider,
+            OllamaSettings(endpoint=endpoint, default_model=default_model, options_json=options_json),
+            **transport,
+        )
 
     if provider_name == "azure_openai":
         api_key = _require(env, "AZURE_OPENAI_API_KEY")
         endpoint = _require(env, "AZURE_OPENAI_ENDPOINT")
         deployment = _require(env, "AZURE_OPENAI_DEPLOYMENT")
         api_version = env.get("AZURE_OPENAI_API_VERSION", "2024-05-01-preview")
-        return AzureOpenAIProvider(
+        return partial(
+            AzureOpenAIProvider,
             AzureOpenAISettings(
                 api_key=api_key,
                 endpoint=endpoint,
                 deployment=deployment,
                 api_version=api_version,
-            )
+            ),
+            **transport,
         )
 
     raise LLMError(f"Unsupported LLM_PROVIDER: {provider_name}")
@@ -0,0 +1,195 @@
+"""Response cache for deterministic LLM chat calls.
+
+Identical ``(provider, model, messages)`` requests are answered from a cache instead
+of the network. The in-process backend is an LRU with per-entry TTL; a Redis
+backend can be selected so several server processes share one cache.
+:class:`SemanticCache` additionally matches near-duplicate requests by embedding.
+"""
+
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+import hashlib
+import time
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from mcp_server import _json
+
+
+class CacheBackend(ABC):
+    """Minimal async key/value store used by :class:`LLMCache`."""
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[str]:  # pragma: no cover - interface hook
+        raise NotImplementedError
+
+    @abstractmethod
+    async def set(self, key: str, value: str, ttl_seconds: Optional[float]) -> None:  # pragma: no cover
+        raise NotImplementedError
+
+
+class MemoryCacheBackend(CacheBackend):
+    """Bounded in-process LRU.
+
+    Reads and writes never await, so they cannot interleave on the event loop and
+    need no lock.
+    """
+
+    def __init__(self, max_entries: int = 1024) -> None:
+        self._max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[Optional[float], str]]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at is not None and time.monotonic() >= expires_at:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: str, ttl_seconds: Optional[float]) -> None:
+        expires_at = time.monotonic() + ttl_seconds if ttl_seconds else None
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+
+class RedisCacheBackend(CacheBackend):
+    """Redis-backed cache shared across processes (requires the ``redis`` package)."""
+
+    def __init__(self, url: str, *, prefix: str = "llm-cache:") -> None:
+        try:
+            import redis.asyncio as redis_asyncio
+        except ImportError as exc:  # pragma: no cover - depends on environment
+            raise ValueError("LLM_CACHE_BACKEND=redis requires the `redis` package") from exc
+        self._redis = redis_asyncio.from_url(url, decode_responses=True)
+        self._prefix = prefix
+
+    async def get(self, key: str) -> Optional[str]:
+        return await self._redis.get(self._prefix + key)
+
+    async def set(self, key: str, value: str, ttl_seconds: Optional[float]) -> None:
+        await self._redis.set(self._prefix + key, value, px=int(ttl_seconds * 1000) if ttl_seconds else None)
+
+
+class LLMCache:
+    """Caches chat replies keyed by a digest of the provider, model and messages."""
+
+    def __init__(self, backend: CacheBackend, *, ttl_seconds: Optional[float] = None) -> None:
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+
+    @staticmethod
+    def cache_key(namespace: str, model: Optional[str], messages: Sequence[Mapping[str, Any]]) -> str:
+        raw = _json.dumps({"namespace": namespace, "model": model, "messages": messages}, sort_keys=True)
+        return hashlib.sha256(raw).hexdigest()
+
+    async def get(self, key: str) -> Optional[str]:
+        return await self.backend.get(key)
+
+    async def set(self, key: str, value: str) -> None:
+        await self.backend.set(key, value, self.ttl_seconds)
+
+
+@dataclass(frozen=True)
+class _SemanticEntry:
+    scope: str
+    expires_at: Optional[float]
+    vector: np.ndarray
+    reply: str
+
+
+class SemanticCache:
+    """LRU of replies matched by cosine similarity of the final user turn's embedding.
+
+    Entries are grouped by ``scope`` (a digest of everything else in the request), and
+    only a reply from the same scope whose embedding scores at least ``threshold`` is
+    reused. A lookup scores every entry of the scope with one matrix-vector product.
+    """
+
+    def __init__(
+        self, *, threshold: float = 0.95, max_entries: int = 1024, ttl_seconds: Optional[float] = 3600.0
+    ) -> None:
+        self.threshold = threshold
+        self._max_entries = max_entries
+        self._ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[int, _SemanticEntry]" = OrderedDict()
+        self._next_id = 0
+        # Stacked unit vectors per scope, rebuilt lazily after that scope changes.
+        self._scopes: Dict[str, Tuple[List[int], np.ndarray]] = {}
+
+    def lookup(self, scope: str, vector: Sequence[float]) -> Optional[str]:
+        query = _unit_vector(vector)
+        ids, matrix = self._scope_matrix(scope)
+        if query is None or not ids or matrix.shape[1] != query.shape[0]:
+            return None
+        scores = matrix @ query
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            return None
+        entry_id = ids[best]
+        entry = self._entries[entry_id]
+        if entry.expires_at is not None and time.monotonic() >= entry.expires_at:
+            self._drop(entry_id)
+            return None
+        self._entries.move_to_end(entry_id)
+        return entry.reply
+
+    def store(self, scope: str, vector: Sequence[float], reply: str) -> None:
+        unit = _unit_vector(vector)
+        if unit is None:
+            return
+        expires_at = time.monotonic() + self._ttl_seconds if self._ttl_seconds else None
+        self._entries[self._next_id] = _SemanticEntry(scope, expires_at, unit, reply)
+        self._next_id += 1
+        self._scopes.pop(scope, None)
+        while len(self._entries) > self._max_entries:
+            _, evicted = self._entries.popitem(last=False)
+            self._scopes.pop(evicted.scope, None)
+
+    def _drop(self, entry_id: int) -> None:
+        entry = self._entries.pop(entry_id)
+        self._scopes.pop(entry.scope, None)
+
+    def _scope_matrix(self, scope: str) -> Tuple[List[int], np.ndarray]:
+        cached = self._scopes.get(scope)
+        if cached is None:
+            ids = [entry_id for entry_id, entry in self._entries.items() if entry.scope == scope]
+            matrix = np.stack([self._entries[i].vector for i in ids]) if ids else np.empty((0, 0), dtype=np.float32)
+            cached = self._scopes[scope] = (ids, matrix)
+        return cached
+
+
+def _unit_vector(vector: Sequence[float]) -> Optional[np.ndarray]:
+    array = np.asarray(vector, dtype=np.float32)
+    norm = float(np.linalg.norm(array))
+    if array.ndim != 1 or norm == 0.0:
+        return None
+    return array / norm
+
+
+def build_cache(env: Mapping[str, str]) -> Optional[LLMCache]:
+    """Build the cache selected by ``LLM_CACHE_BACKEND`` (``memory`` or ``redis``); ``None`` disables it."""
+
+    kind = (env.get("LLM_CACHE_BACKEND") or "").strip().lower()
+    if kind in {"", "none", "off", "false", "0"}:
+        return None
+    try:
+        ttl = float(env.get("LLM_CACHE_TTL") or 3600)
+        max_entries = int(env.get("LLM_CACHE_MAX_ENTRIES") or 1024)
+    except ValueError as exc:
+        raise ValueError("LLM_CACHE_TTL and LLM_CACHE_MAX_ENTRIES must be numbers") from exc
+    if kind == "memory":
+        return LLMCache(MemoryCacheBackend(max_entries), ttl_seconds=ttl)
+    if kind == "redis":
+        url = env.get("LLM_CACHE_REDIS_URL") or env.get("REDIS_URL") or "redis://localhost:6379/0"
+        return LLMCache(RedisCacheBackend(url), ttl_seconds=ttl)
+    raise ValueError(f"Unsupported LLM_CACHE_BACKEND: {kind}")
@@ -3,17 +3,33 @@
 from __future__ import annotations
 
 import asyncio
+from collections import OrderedDict
+import copy
+import heapq
 import json
 import os
 import sqlite3
 from abc import ABC, abstractmethod
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pathlib import Path
-from threading import RLock
-from typing import Iterable, List, Optional, Sequence
+from threading import Lock, RLock, local
+from typing import Iterable, List, Optional, Sequence, Tuple
 import uuid
 
 import httpx
+import numpy as np
+
+from mcp_server import _json, _rag_kernels
+
+try:  # Approximate nearest-neighbour search is optional (pip install hnswlib).
+    import hnswlib
+except ImportError:  # pragma: no cover - depends on environment
+    hnswlib = None
+
+try:  # In-database vector search is optional (pip install sqlite-vec).
+    import sqlite_vec
+except ImportError:  # pragma: no cover - depends on environment
+    sqlite_vec = None
 
 
 class RAGError(RuntimeError):
@@ -38,27 +54,104 @@ class EmbeddingBackend(ABC):
     async def embed(self, text: str) -> List[float]:  # pragma: no cover - interface hook
         raise NotImplementedError
 
+    async def embed_many(self, texts: Sequence[str]) -> List[List[float]]:
+        """Embed several texts; backends with a batch endpoint override this to use one request."""
+
+        return [await self.embed(text) for text in texts]
+
+    async def aclose(self) -> None:
+        """Release any network resources held by the backend."""
+
 
 @dataclass
 class OllamaEmbeddingBackend(EmbeddingBackend):
     endpoint: str
     model: str
     timeout: float = 30.0
+    _http: Optional[httpx.AsyncClient] = field(default=None, init=False, repr=False, compare=False)
+    _http_loop: Optional[asyncio.AbstractEventLoop] = field(default=None, init=False, repr=False, compare=False)
+
+    def _client(self) -> httpx.AsyncClient:
+        """Keep-alive client reused for every embed call made from the running event loop."""
+
+        loop = asyncio.get_running_loop()
+        if self._http is None or self._http.is_closed or self._http_loop is not loop:
+            self._http = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_keepalive_connections=16),
+            )
+            self._http_loop = loop
+        return self._http
+
+    async def aclose(self) -> None:
+        client, self._http, self._http_loop = self._http, None, None
+        if client is not None and not client.is_closed:
+            await client.aclose()
 
     async def embed(self, text: str) -> List[float]:
         payload = {"model": self.model, "prompt": text}
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
-            resp = await client.post(f"{self.endpoint.rstrip('/')}/api/embeddings", json=payload)
-            try:
-                resp.raise_for_status()
-            except httpx.HTTPStatusError as exc:  # pragma: no cover - network failure best-effort
-                raise RAGError(str(exc)) from exc
-            data = resp.json()
+        resp = await self._client().post(f"{self.endpoint.rstrip('/')}/api/embeddings", json=payload)
+        try:
+            resp.raise_for_status()
+        except httpx.HTTPStatusError as exc:  # pragma: no cover - network failure best-effort
+            raise RAGError(str(exc)) from exc
+        data = _json.response_json(resp)
         embedding = data.get("embedding")
         if not embedding:
             raise RAGError("Ollama embeddings response missing 'embedding'")
         return [float(x) for x in embedding]
 
+    async def embed_many(self, texts: Sequence[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        payload = {"model": self.model, "input": list(texts)}
+        resp = await self._client().post(f"{self.endpoint.rstrip('/')}/api/embed", json=payload)
+        try:
+            resp.raise_for_status()
+        except httpx.HTTPStatusError as exc:  # pragma: no cover - network failure best-effort
+            raise RAGError(str(exc)) from exc
+        data = _json.response_json(resp)
+        embeddings = data.get("embeddings")
+        if not isinstance(embeddings, list) or len(embeddings) != len(texts):
+            raise RAGError("Ollama embed response missing 'embeddings' for every input")
+        return [[float(x) for x in embedding] for embedding in embeddings]
+
+
+class CachingEmbeddingBackend(EmbeddingBackend):
+    """LRU cache of query embeddings in front of another backend, so repeated queries skip the round trip.
+
+    Only :meth:`embed` is cached: ``embed_many`` carries document chunks at ingest time, which are rarely
+    embedded twice and would otherwise evict the query vectors. Entries are read-only float32 arrays.
+    """
+
+    def __init__(self, inner: EmbeddingBackend, *, max_entries: int = 4096) -> None:
+        self._inner = inner
+        self._max_entries = max_entries
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+
+    def _put(self, text: str, vector: Sequence[float]) -> np.ndarray:
+        stored = np.array(vector, dtype=np.float32)
+        stored.setflags(write=False)
+        self._entries[text] = stored
+        self._entries.move_to_end(text)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+        return stored
+
+    async def embed(self, text: str) -> List[float]:
+        stored = self._entries.get(text)
+        if stored is not None:
+            self._entries.move_to_end(text)
+        else:
+            stored = self._put(text, await self._inner.embed(text))
+        return stored.tolist()
+
+    async def embed_many(self, texts: Sequence[str]) -> List[List[float]]:
+        return await self._inner.embed_many(texts)
+
+    async def aclose(self) -> None:
+        await self._inner.aclose()
+
 
 class BaseRAGStore(ABC):
     """Interface for storage backends that support upsert and similarity query."""
@@ -71,6 +164,13 @@ class BaseRAGStore(ABC):
     def name(self) -> str:
         return self._name
 
+    @property
+    def embedder(self) -> EmbeddingBackend:
+        return self._embedder
+
+    async def aclose(self) -> None:
+        await self._embedder.aclose()
+
     @abstractmethod
     async def upsert(
         self,
@@ -78,9 +178,24 @@ class BaseRAGStore(ABC):
         source: Optional[str],
         content: str,
         store: Optional[str] = None,
+        embedding: Optional[List[float]] = None,
     ) -> str:
         raise NotImplementedError
 
+    async def upsert_many(
+        self,
+        documents: Sequence[Tuple[Optional[str], str]],
+        *,
+        store: Optional[str] = None,
+    ) -> List[str]:
+        """Insert ``(source, content)`` pairs, embedding them in a single batch."""
+
+        embeddings = await self._embedder.embed_many([content for _, content in documents])
+        return [
+            await self.upsert(source=source, content=content, store=store, embedding=vector)
+            for (source, content), vector in zip(documents, embeddings)
+        ]
+
     @abstractmethod
     async def query(
         self,
@@ -96,29 +211,129 @@ class BaseRAGStore(ABC):
 class SQLiteRAGStore(BaseRAGStore):
     """SQLite-backed persistent store."""
 
-    def __init__(self, db_path: Path, embedder: EmbeddingBackend, *, name: Optional[str] = None) -> None:
+    def __init__(
+        self,
+        db_path: Path,
+        embedder: EmbeddingBackend,
+        *,
+        name: Optional[str] = None,
+        precision: str = "float32",
+        ann_min_docs: Optional[int] = None,
+        use_sqlite_vec: bool = False,
+    ) -> None:
         path = Path(db_path)
         path.parent.mkdir(parents=True, exist_ok=True)
         super().__init__(embedder, name or f"sqlite:{path}")
+        self._precision = precision
+        self._ann_min_docs = ann_min_docs
+        self._path = path
+        # Writes go through one connection under ``_lock``; reads use a connection per thread so
+        # concurrent queries (WAL readers) never wait on each other or on writers.
         self._conn = sqlite3.connect(path, check_same_thread=False)
         self._conn.row_factory = sqlite3.Row
         self._lock = RLock()
+        self._readers = local()
+        self._reader_conns: List[sqlite3.Connection] = []  # every thread's reader, so close() can reach them
+        self._cache_lock = Lock()
+        # (row-count, max-id) token -> (rows, embedding index); rows are append-only so the token detects new data.
+        self._matrix_cache: Optional[Tuple[Tuple[int, int], List[sqlite3.Row], _EmbeddingIndex]] = None
+        self._use_sqlite_vec = use_sqlite_vec
+        self._vec_synced_id = 0  # highest rag_documents.id mirrored into vec_documents
         self._ensure_schema()
 
+    _CREATE_TABLE = """
+        CREATE TABLE IF NOT EXISTS {table} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            source TEXT,
+            content TEXT NOT NULL,
+            embedding BLOB NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """
+
     def _ensure_schema(self) -> None:
         with self._lock:
+            # WAL lets readers proceed during writes; NORMAL sync is durable across app crashes in WAL mode.
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("PRAGMA temp_store=MEMORY")
+            self._conn.execute(self._CREATE_TABLE.format(table="rag_documents"))
+            self._migrate()
+            if self._use_sqlite_vec:
+                self._load_sqlite_vec()
+                # Resume from what an earlier run mirrored instead of re-reading every row.
+                self._vec_synced_id = self._vec_max_rowid() or 0
+                self._sync_vec_table()
+            self._conn.commit()
+
+    def _load_sqlite_vec(self) -> None:
+        if sqlite_vec is None:
+            raise RAGError("RAG_SQLITE_VEC requires the `sqlite-vec` package")
+        if not hasattr(self._conn, "enable_load_extension"):
+            raise RAGError("This Python's sqlite3 module cannot load extensions (needed for sqlite-vec)")
+        self._conn.enable_load_extension(True)
+        try:
+            sqlite_vec.load(self._conn)
+        finally:
+            self._conn.enable_load_extension(False)
+
+    def _vec_max_rowid(self) -> Optional[int]:
+        """Highest rowid mirrored into ``vec_documents``, or ``None`` when the table does not exist yet."""
+
+        exists = self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'vec_documents'"
+        ).fetchone()
+        if not exists:
+            return None
+        return int(self._conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM vec_documents").fetchone()[0])
+
+    def _sync_vec_table(self) -> None:
+        """Mirror rows not yet in ``vec_documents`` (including ones written by other connections).
+
+        Rows are append-only and every sync mirrors all of them in the writer's transaction, so
+        rows up to the table's highest rowid are already present and plain INSERTs never collide.
+        """
+
+        rows = self._conn.execute(
+            "SELECT id, embedding FROM rag_documents WHERE id > ? ORDER BY id", (self._vec_synced_id,)
+        ).fetchall()
+        if not rows:
+            return
+        mirrored = self._vec_max_rowid()
+        if mirrored is None:
+            # vec0 columns have a fixed width, taken from the first stored embedding.
+            dim = len(rows[0]["embedding"]) // 4
             self._conn.execute(
-                """
-                CREATE TABLE IF NOT EXISTS rag_documents (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    source TEXT,
-                    content TEXT NOT NULL,
-                    embedding TEXT NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-                """
+                f"CREATE VIRTUAL TABLE vec_documents USING vec0(embedding float[{dim}] distance_metric=cosine)"
             )
-            self._conn.commit()
+        elif mirrored > self._vec_synced_id:
+            # Another connection mirrored some of these already.
+            self._vec_synced_id = mirrored
+            rows = [row for row in rows if row["id"] > mirrored]
+        if rows:
+            self._conn.executemany(
+                "INSERT INTO vec_documents (rowid, embedding) VALUES (?, ?)",
+                [(row["id"], row["embedding"]) for row in rows],
+            )
+            self._vec_synced_id = int(rows[-1]["id"])
+
+    def _migrate(self) -> None:
+        """Convert databases created with JSON-text embeddings to float32 BLOBs, keeping ids."""
+
+        columns = {row["name"]: row["type"] for row in self._conn.execute("PRAGMA table_info(rag_documents)")}
+        if columns.get("embedding", "").upper() != "TEXT":
+            return
+        self._conn.execute(self._CREATE_TABLE.format(table="rag_documents_v2"))
+        rows = self._conn.execute("SELECT id, source, content, embedding, created_at FROM rag_documents").fetchall()
+        self._conn.executemany(
+            "INSERT INTO rag_documents_v2 (id, source, content, embedding, created_at) VALUES (?, ?, ?, ?, ?)",
+            [
+                (row["id"], row["source"], row["content"], _encode_embedding(_json.loads(row["embedding"])), row["created_at"])
+                for row in rows
+            ],
+        )
+        self._conn.execute("DROP TABLE rag_documents")
+        self._conn.execute("ALTER TABLE rag_documents_v2 RENAME TO rag_documents")
 
     async def upsert(
         self,
@@ -126,20 +341,43 @@ class SQLiteRAGStore(BaseRAGStore):
         source: Optional[str],
         content: str,
         store: Optional[str] = None,
+        embedding: Optional[List[float]] = None,
     ) -> str:
-        embedding = await self._embedder.embed(content)
+        embedding = embedding or await self._embedder.embed(content)
         doc_id = await asyncio.to_thread(self._insert_document, source, content, embedding)
         return str(doc_id)
 
+    async def upsert_many(
+        self,
+        documents: Sequence[Tuple[Optional[str], str]],
+        *,
+        store: Optional[str] = None,
+    ) -> List[str]:
+        embeddings = await self._embedder.embed_many([content for _, content in documents])
+        rows = [(source, content, vector) for (source, content), vector in zip(documents, embeddings)]
+        doc_ids = await asyncio.to_thread(self._insert_many, rows)
+        return [str(doc_id) for doc_id in doc_ids]
+
     def _insert_document(self, source: Optional[str], content: str, embedding: Iterable[float]) -> int:
-        vector_json = json.dumps(list(embedding))
+        return self._insert_many([(source, content, embedding)])[0]
+
+    def _insert_many(self, rows: Sequence[Tuple[Optional[str], str, Iterable[float]]]) -> List[int]:
+        """Insert rows in one transaction, so a batch costs a single commit."""
+
+        encoded = [(source, content, _encode_embedding(embedding)) for source, content, embedding in rows]
+        doc_ids: List[int] = []
         with self._lock:
-            cur = self._conn.execute(
-                "INSERT INTO rag_documents (source, content, embedding) VALUES (?, ?, ?)",
-                (source, content, vector_json),
-            )
+            try:
+                for row in encoded:
+                    cur = self._conn.execute("INSERT INTO rag_documents (source, content, embedding) VALUES (?, ?, ?)", row)
+                    doc_ids.append(int(cur.lastrowid))
+                if self._use_sqlite_vec:
+                    self._sync_vec_table()
+            except Exception:
+                self._conn.rollback()
+                raise
             self._conn.commit()
-            return int(cur.lastrowid)
+            return doc_ids
 
     async def query(
         self,
@@ -150,36 +388,137 @@ class SQLiteRAGStore(BaseRAGStore):
         stores: Optional[Sequence[str]] = None,
     ) -> List[RAGDocument]:
         query_vec = embedding or await self._embedder.embed(text)
-        rows = await asyncio.to_thread(self._fetch_rows)
-        docs: List[RAGDocument] = []
-        for row in rows:
-            doc_vec = json.loads(row["embedding"])
-            score = _cosine_similarity(query_vec, doc_vec)
-            docs.append(
-                RAGDocument(
-                    id=str(row["id"]),
-                    source=row["source"],
-                    content=row["content"],
-                    score=score,
-                    store=self.name,
-                )
+        if self._use_sqlite_vec:
+            return await asyncio.to_thread(self._query_vec_table, query_vec, limit)
+        rows, index = await asyncio.to_thread(self._fetch_matrix)
+        indices, scores = index.top_k(query_vec, limit)
+        return [
+            RAGDocument(
+                id=str(rows[idx]["id"]),
+                source=rows[idx]["source"],
+                content=rows[idx]["content"],
+                score=float(score),
+                store=self.name,
             )
-        docs.sort(key=lambda item: item.score, reverse=True)
-        return docs[: max(0, limit)]
+            for idx, score in zip(indices, scores)
+        ]
+
+    def _query_vec_table(self, query_vec: Sequence[float], limit: int) -> List[RAGDocument]:
+        """Top-k inside SQLite via sqlite-vec; only the winning rows are read into Python."""
 
-    def _fetch_rows(self) -> List[sqlite3.Row]:
+        if limit <= 0:
+            return []
         with self._lock:
-            cur = self._conn.execute("SELECT id, source, content, embedding FROM rag_documents")
-            return cur.fetchall()
+            self._sync_vec_table()
+            self._conn.commit()
+            if not self._vec_synced_id:
+                return []
+            rows = self._conn.execute(
+                """
+                SELECT d.id, d.source, d.content, v.distance
+                FROM (
+                    SELECT rowid, distance FROM vec_documents WHERE embedding MATCH ? AND k = ?
+                ) AS v
+                JOIN rag_documents AS d ON d.id = v.rowid
+                ORDER BY v.distance
+                """,
+                (np.asarray(query_vec, dtype=np.float32).tobytes(), limit),
+            ).fetchall()
+        return [
+            RAGDocument(
+                id=str(row["id"]),
+                source=row["source"],
+                content=row["content"],
+                score=1.0 - float(row["distance"]),
+                store=self.name,
+            )
+            for row in rows
+        ]
+
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._readers, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self._path, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            self._readers.conn = conn
+            with self._lock:
+                self._reader_conns.append(conn)
+        return conn
+
+    def close(self) -> None:
+        """Close the writer and every thread's reader connection."""
+
+        with self._lock:
+            readers, self._reader_conns = self._reader_conns, []
+            self._readers = local()
+            for conn in readers:
+                conn.close()
+            self._conn.close()
+
+    async def aclose(self) -> None:
+        await asyncio.to_thread(self.close)
+        await super().aclose()
+
+    def _fetch_matrix(self) -> Tuple[List[sqlite3.Row], _EmbeddingIndex]:
+        """Return all rows plus their embedding index, reusing the last load when the table is unchanged."""
+
+        reader = self._reader()
+        # One read transaction, so the token and the rows fetched for it come from the same snapshot.
+        reader.execute("BEGIN")
+        try:
+            return self._fetch_matrix_in_snapshot(reader)
+        finally:
+            reader.execute("COMMIT")
+
+    def _fetch_matrix_in_snapshot(self, reader: sqlite3.Connection) -> Tuple[List[sqlite3.Row], _EmbeddingIndex]:
+        count, max_id = reader.execute("SELECT COUNT(*), COALESCE(MAX(id), 0) FROM rag_documents").fetchone()
+        token = (int(count), int(max_id))
+        cached = self._matrix_cache
+        if cached is not None and cached[0] == token:
+            return cached[1], cached[2]
+        with self._cache_lock:
+            cached = self._matrix_cache
+            if cached is not None and cached[0] == token:
+                return cached[1], cached[2]
+            if cached is not None and token[1] > cached[0][1]:
+                # Append-only table: load just the rows added since the cached snapshot.
+                new_rows = self._fetch_rows(after_id=cached[0][1])
+                if cached[0][0] + len(new_rows) == token[0]:
+                    rows = cached[1] + new_rows
+                    index = cached[2].extended(_blobs_as_matrix([row["embedding"] for row in new_rows]))
+                    self._matrix_cache = (token, rows, index)
+                    return rows, index
+            rows = self._fetch_rows()
+            matrix = _blobs_as_matrix([row["embedding"] for row in rows])
+            index = _EmbeddingIndex(matrix, precision=self._precision, ann_min_docs=self._ann_min_docs)
+            self._matrix_cache = (token, rows, index)
+            return rows, index
+
+    def _fetch_rows(self, *, after_id: int = 0) -> List[sqlite3.Row]:
+        cur = self._reader().execute(
+            "SELECT id, source, content, embedding FROM rag_documents WHERE id > ? ORDER BY id",
+            (after_id,),
+        )
+        return cur.fetchall()
 
 
 class InMemoryRAGStore(BaseRAGStore):
     """Ephemeral in-memory store useful for transient or file based docs."""
 
-    def __init__(self, embedder: EmbeddingBackend, *, name: str = "memory") -> None:
+    def __init__(
+        self,
+        embedder: EmbeddingBackend,
+        *,
+        name: str = "memory",
+        precision: str = "float32",
+        ann_min_docs: Optional[int] = None,
+    ) -> None:
         super().__init__(embedder, name)
-        self._lock = RLock()
-        self._docs: dict[str, dict[str, Iterable[float] | str | None]] = {}
+        # Append-only, so readers can take ``len()`` as a snapshot and read the prefix without locking.
+        self._docs: List[Tuple[str, dict[str, Iterable[float] | str | None]]] = []
+        # Covers the first ``size`` documents; extended lazily on query under ``_index_lock``.
+        self._index = _EmbeddingIndex(np.empty((0, 0), dtype=np.float32), precision=precision, ann_min_docs=ann_min_docs)
+        self._index_lock = Lock()
 
     async def upsert(
         self,
@@ -187,15 +526,20 @@ class InMemoryRAGStore(BaseRAGStore):
         source: Optional[str],
         content: str,
         store: Optional[str] = None,
+        embedding: Optional[List[float]] = None,
     ) -> str:
-        embedding = await self._embedder.embed(content)
+        embedding = embedding or await self._embedder.embed(content)
         doc_id = str(uuid.uuid4())
-        with self._lock:
-            self._docs[doc_id] = {
-                "source": source,
-                "content": content,
-                "embedding": list(embedding),
-            }
+        self._docs.append(
+            (
+                doc_id,
+                {
+                    "source": source,
+                    "content": content,
+                    "embedding": list(embedding),
+                },
+            )
+        )
         return doc_id
 
     async def query(
@@ -207,23 +551,29 @@ class InMemoryRAGStore(BaseRAGStore):
         stores: Optional[Sequence[str]] = None,
     ) -> List[RAGDocument]:
         query_vec = embedding or await self._embedder.embed(text)
-        with self._lock:
-            items = list(self._docs.items())
+        items = self._docs
+        index = self._index
+        if index.size < len(items):
+            with self._index_lock:
+                index = self._index
+                count = len(items)
+                if index.size < count:
+                    pending = [payload["embedding"] for _, payload in items[index.size : count]]
+                    index = self._index = index.extended(_as_matrix(pending))
+        indices, scores = index.top_k(query_vec, limit)
         docs: List[RAGDocument] = []
-        for doc_id, payload in items:
-            doc_vec = payload["embedding"]
-            score = _cosine_similarity(query_vec, doc_vec)
+        for idx, score in zip(indices, scores):
+            doc_id, payload = items[idx]
             docs.append(
                 RAGDocument(
                     id=doc_id,
                     source=payload["source"],
                     content=payload["content"],
-                    score=score,
+                    score=float(score),
                     store=self.name,
                 )
             )
-        docs.sort(key=lambda item: item.score, reverse=True)
-        return docs[: max(0, limit)]
+        return docs
 
 
 class CompositeRAGStore(BaseRAGStore):
@@ -235,29 +585,49 @@ class CompositeRAGStore(BaseRAGStore):
         embedder: EmbeddingBackend,
         *,
         name: str = "composite",
+        max_concurrency: Optional[int] = None,
     ) -> None:
         if not stores:
             raise RAGError("CompositeRAGStore requires at least one store")
         super().__init__(embedder, name)
         self._stores = {store.name: store for store in stores}
         self._default = stores[0]
+        self._max_concurrency = max_concurrency
 
     @property
     def store_names(self) -> List[str]:
         return list(self._stores.keys())
 
+    async def aclose(self) -> None:
+        await asyncio.gather(*(store.aclose() for store in self._stores.values()))
+        await super().aclose()
+
     async def upsert(
         self,
         *,
         source: Optional[str],
         content: str,
         store: Optional[str] = None,
+        embedding: Optional[List[float]] = None,
     ) -> str:
+        target = self._target(store)
+        doc_id = await target.upsert(source=source, content=content, embedding=embedding)
+        return f"{target.name}:{doc_id}"
+
+    async def upsert_many(
+        self,
+        documents: Sequence[Tuple[Optional[str], str]],
+        *,
+        store: Optional[str] = None,
+    ) -> List[str]:
+        target = self._target(store)
+        return [f"{target.name}:{doc_id}" for doc_id in await target.upsert_many(documents)]
+
+    def _target(self, store: Optional[str]) -> BaseRAGStore:
         target = self._default if store is None else self._stores.get(store)
         if target is None:
             raise RAGError(f"Unknown store '{store}'")
-        doc_id = await target.upsert(source=source, content=content)
-        return f"{target.name}:{doc_id}"
+        return target
 
     async def query(
         self,
@@ -279,9 +649,18 @@ class CompositeRAGStore(BaseRAGStore):
             selected = list(self._stores.values())
 
         query_vec = embedding or await self._embedder.embed(text)
+        # Query every store at once so latency is the slowest store, not the sum of all of them.
+        semaphore = asyncio.Semaphore(self._max_concurrency) if self._max_concurrency else None
+
+        async def _query(store: BaseRAGStore) -> List[RAGDocument]:
+            if semaphore is None:
+                return await store.query(text=text, limit=limit, embedding=query_vec)
+            async with semaphore:
+                return await store.query(text=text, limit=limit, embedding=query_vec)
+
+        per_store = await asyncio.gather(*(_query(store) for store in selected))
         docs: List[RAGDocument] = []
-        for store in selected:
-            results = await store.query(text=text, limit=limit, embedding=query_vec)
+        for store, results in zip(selected, per_store):
             for doc in results:
                 docs.append(
                     RAGDocument(
@@ -292,23 +671,201 @@ class CompositeRAGStore(BaseRAGStore):
                         store=store.name,
                     )
                 )
-        docs.sort(key=lambda item: item.score, reverse=True)
-        return docs[: max(0, limit)]
+        return heapq.nlargest(max(0, limit), docs, key=lambda item: item.score)
+
+
+def _encode_embedding(embedding: Iterable[float]) -> bytes:
+    return np.asarray(list(embedding), dtype=np.float32).tobytes()
+
 
+def _blobs_as_matrix(blobs: Sequence[bytes]) -> np.ndarray:
+    """Decode float32 embedding BLOBs straight into an ``(N, D)`` matrix."""
 
-def _cosine_similarity(a: Iterable[float], b: Iterable[float]) -> float:
-    a_list = list(a)
-    b_list = list(b)
-    if not a_list or not b_list:
-        return 0.0
-    if len(a_list) != len(b_list):
+    if not blobs:
+        return np.empty((0, 0), dtype=np.float32)
+    if len({len(blob) for blob in blobs}) != 1:
         raise RAGError("Embedding dimensionality mismatch")
-    dot = sum(x * y for x, y in zip(a_list, b_list))
-    norm_a = sum(x * x for x in a_list) ** 0.5
-    norm_b = sum(y * y for y in b_list) ** 0.5
-    if norm_a == 0 or norm_b == 0:
-        return 0.0
-    return dot / (norm_a * norm_b)
+    return np.frombuffer(b"".join(blobs), dtype=np.float32).reshape(len(blobs), -1)
+
+
+def _as_matrix(vectors: Sequence[Sequence[float]]) -> np.ndarray:
+    """Stack document embeddings into an ``(N, D)`` float32 matrix."""
+
+    if not vectors:
+        return np.empty((0, 0), dtype=np.float32)
+    try:
+        return np.asarray(vectors, dtype=np.float32).reshape(len(vectors), -1)
+    except ValueError as exc:
+        raise RAGError("Embedding dimensionality mismatch") from exc
+
+
+def _top_k_indices(scores: np.ndarray, limit: int) -> np.ndarray:
+    """Indices of the ``limit`` highest scores, best first, without sorting every score."""
+
+    k = max(0, min(limit, scores.shape[0]))
+    if k == 0:
+        return np.empty(0, dtype=np.intp)
+    if k < scores.shape[0]:
+        top = np.argpartition(-scores, k - 1)[:k]
+    else:
+        top = np.arange(k)
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+EMBEDDING_PRECISIONS = ("float32", "int8")
+
+
+class _HnswIndex:
+    """Incrementally built HNSW graph (hnswlib) giving approximate cosine top-k in ~O(log N)."""
+
+    def __init__(self, dim: int, capacity: int) -> None:
+        self._index = hnswlib.Index(space="cosine", dim=dim)
+        self._index.init_index(max_elements=capacity, M=16, ef_construction=200)
+        self._lock = Lock()  # hnswlib's resize is not safe against concurrent searches
+        self.count = 0
+
+    @classmethod
+    def build(cls, matrix: np.ndarray) -> "_HnswIndex":
+        index = cls(matrix.shape[1], max(1024, 2 * matrix.shape[0]))
+        index.add(matrix)
+        return index
+
+    def add(self, rows: np.ndarray) -> None:
+        with self._lock:
+            needed = self.count + rows.shape[0]
+            if needed > self._index.get_max_elements():
+                self._index.resize_index(max(needed, 2 * self._index.get_max_elements()))
+            self._index.add_items(rows, np.arange(self.count, needed))
+            self.count = needed
+
+    def search(self, query: np.ndarray, k: int, visible: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Top ``k`` labels below ``visible`` (rows added after a snapshot are ignored)."""
+
+        with self._lock:
+            fetch = min(self.count, k + self.count - visible)
+            self._index.set_ef(max(64, fetch))
+            labels, distances = self._index.knn_query(query, k=fetch)
+        labels, distances = labels[0].astype(np.intp), distances[0]
+        keep = labels < visible
+        scores = np.nan_to_num(1.0 - distances[keep], nan=0.0)  # zero vectors have no direction
+        return labels[keep][:k], scores[:k].astype(np.float32)
+
+
+class _EmbeddingIndex:
+    """Document embeddings held in memory for cosine top-k search.
+
+    Rows are scaled to unit length once, as they enter the index, so scoring a
+    query is a plain dot product with the normalised query vector.
+    With ``precision="int8"`` each row is stored as int8 with a per-row scale, a
+    quarter of the float32 footprint. NumPy has no BLAS kernel for integer
+    products, so int8 rows are scored in float32 blocks, which keeps the
+    temporary copy small (or by a Numba kernel when available). Once ``ann_min_docs`` rows are held and ``hnswlib`` is
+    installed, queries go through an HNSW graph instead of the brute-force scan.
+    Instances are snapshots: :meth:`extended` returns a new index for appended
+    rows and leaves readers of the old one undisturbed.
+    """
+
+    _BLOCK_ROWS = 4096
+
+    def __init__(
+        self,
+        matrix: np.ndarray,
+        *,
+        precision: str = "float32",
+        ann_min_docs: Optional[int] = None,
+    ) -> None:
+        if precision not in EMBEDDING_PRECISIONS:
+            raise RAGError(f"Unsupported embedding precision '{precision}'")
+        self._precision = precision
+        self._ann_min_docs = ann_min_docs
+        self.size = matrix.shape[0]
+        self._dim = matrix.shape[1] if self.size else 0
+        if self.size:
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            # Zero vectors stay zero and therefore score 0 against everything.
+            matrix = np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+        self._scales: Optional[np.ndarray] = None
+        self._ann: Optional[_HnswIndex] = None
+        if self._wants_ann():
+            self._ann = _HnswIndex.build(matrix)
+        if precision == "int8" and self.size:
+            peaks = np.abs(matrix).max(axis=1)
+            self._scales = np.where(peaks > 0, peaks / 127.0, 1.0).astype(np.float32)
+            matrix = np.round(matrix / self._scales[:, None]).astype(np.int8)
+        self._matrix = matrix
+
+    def _wants_ann(self) -> bool:
+        return hnswlib is not None and self._ann_min_docs is not None and self.size >= max(1, self._ann_min_docs)
+
+    def _float_rows(self) -> np.ndarray:
+        if self._scales is None:
+            return self._matrix
+        return self._matrix.astype(np.float32) * self._scales[:, None]
+
+    def extended(self, rows: np.ndarray) -> "_EmbeddingIndex":
+        """Return a new index holding this one's rows followed by ``rows``."""
+
+        if rows.shape[0] == 0:
+            return self
+        if self.size == 0:
+            return _EmbeddingIndex(rows, precision=self._precision, ann_min_docs=self._ann_min_docs)
+        if rows.shape[1] != self._dim:
+            raise RAGError("Embedding dimensionality mismatch")
+        tail = _EmbeddingIndex(rows, precision=self._precision)
+        merged = copy.copy(self)
+        merged.size = self.size + tail.size
+        merged._matrix = np.concatenate([self._matrix, tail._matrix])
+        if self._scales is not None:
+            merged._scales = np.concatenate([self._scales, tail._scales])
+        if self._ann is not None and self._ann.count == self.size:
+            self._ann.add(rows)
+        elif merged._wants_ann():
+            merged._ann = _HnswIndex.build(merged._float_rows())
+        return merged
+
+    def _dots(self, q: np.ndarray) -> np.ndarray:
+        if self._scales is None:
+            return self._matrix @ q
+        dots = np.empty(self.size, dtype=np.float32)
+        if _rag_kernels.SIMSIMD_AVAILABLE:
+            _rag_kernels.int8_dots_simd(self._matrix, self._scales, q, dots)
+            return dots
+        if _rag_kernels.NUMBA_AVAILABLE:
+            _rag_kernels.int8_dots(self._matrix, self._scales, q, dots)
+            return dots
+        for start in range(0, self.size, self._BLOCK_ROWS):
+            block = self._matrix[start : start + self._BLOCK_ROWS]
+            dots[start : start + block.shape[0]] = block.astype(np.float32) @ q
+        return dots * self._scales
+
+    def _query_vector(self, query: Sequence[float]) -> Optional[np.ndarray]:
+        q = np.asarray(query, dtype=np.float32)
+        if self.size == 0 or q.size == 0:
+            return None
+        if self._dim != q.shape[0]:
+            raise RAGError("Embedding dimensionality mismatch")
+        return q
+
+    def scores(self, query: Sequence[float]) -> np.ndarray:
+        """Exact cosine similarity of ``query`` against every stored row."""
+
+        q = self._query_vector(query)
+        q_norm = np.linalg.norm(q) if q is not None else 0.0
+        if q is None or q_norm == 0:
+            return np.zeros(self.size, dtype=np.float32)
+        return self._dots(q / q_norm)
+
+    def top_k(self, query: Sequence[float], limit: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Row indices of the ``limit`` best matches, best first, and their scores."""
+
+        k = max(0, min(limit, self.size))
+        if k and self._ann is not None:
+            q = self._query_vector(query)
+            if q is not None:
+                return self._ann.search(q, k, self.size)
+        scores = self.scores(query)
+        top = _top_k_indices(scores, k)
+        return top, scores[top]
 
 
 def build_default_store() -> BaseRAGStore:
@@ -316,7 +873,23 @@ def build_default_store() -> BaseRAGStore:
     if not endpoint:
         raise RAGError("OLLAMA_ENDPOINT is required to use RAG embeddings")
     model = os.getenv("RAG_EMBED_MODEL") or os.getenv("OLLAMA_MODEL") or "llama3"
-    embedder = OllamaEmbeddingBackend(endpoint=endpoint, model=model)
+    embedder: EmbeddingBackend = OllamaEmbeddingBackend(endpoint=endpoint, model=model)
+    try:
+        cache_size = int(os.getenv("RAG_EMBED_CACHE_SIZE", "4096"))
+    except ValueError as exc:
+        raise RAGError("RAG_EMBED_CACHE_SIZE must be an integer") from exc
+    if cache_size > 0:
+        embedder = CachingEmbeddingBackend(embedder, max_entries=cache_size)
+    precision = os.getenv("RAG_EMBEDDING_PRECISION", "float32").lower()
+    if precision not in EMBEDDING_PRECISIONS:
+        raise RAGError(f"RAG_EMBEDDING_PRECISION must be one of {', '.join(EMBEDDING_PRECISIONS)}")
+    use_sqlite_vec = os.getenv("RAG_SQLITE_VEC", "false").lower() in {"1", "true", "yes", "on"}
+    ann_min_docs: Optional[int] = None
+    if os.getenv("RAG_ANN", "auto").lower() not in {"0", "false", "no", "off"}:
+        try:
+            ann_min_docs = int(os.getenv("RAG_ANN_MIN_DOCS", "1000"))
+        except ValueError as exc:
+            raise RAGError("RAG_ANN_MIN_DOCS must be an integer") from exc
 
     raw_sources = os.getenv("RAG_SOURCES")
     if raw_sources:
@@ -332,27 +905,48 @@ def build_default_store() -> BaseRAGStore:
                 raise RAGError("Each RAG source must be an object")
             kind = entry.get("type", "sqlite").lower()
             name = entry.get("name")
+            entry_precision = str(entry.get("precision", precision)).lower()
             if kind == "sqlite":
                 path = entry.get("path")
                 if not path:
                     raise RAGError("sqlite RAG source requires 'path'")
-                stores.append(SQLiteRAGStore(Path(path), embedder, name=name))
+                stores.append(
+                    SQLiteRAGStore(
+                        Path(path),
+                        embedder,
+                        name=name,
+                        precision=entry_precision,
+                        ann_min_docs=ann_min_docs,
+                        use_sqlite_vec=bool(entry.get("sqlite_vec", use_sqlite_vec)),
+                    )
+                )
             elif kind == "memory":
-                stores.append(InMemoryRAGStore(embedder, name=name or f"memory:{idx}"))
+                stores.append(
+                    InMemoryRAGStore(
+                        embedder, name=name or f"memory:{idx}", precision=entry_precision, ann_min_docs=ann_min_docs
+                    )
+                )
             else:
                 raise RAGError(f"Unsupported RAG source type '{kind}'")
         if not stores:
             raise RAGError("RAG_SOURCES did not yield any stores")
         if len(stores) == 1:
             return stores[0]
-        return CompositeRAGStore(stores=stores, embedder=embedder)
+        try:
+            max_concurrency = int(os.getenv("RAG_QUERY_CONCURRENCY", "0")) or None
+        except ValueError as exc:
+            raise RAGError("RAG_QUERY_CONCURRENCY must be an integer") from exc
+        return CompositeRAGStore(stores=stores, embedder=embedder, max_concurrency=max_concurrency)
 
     db_path = Path(os.getenv("RAG_DB_PATH", "rag_store.db"))
-    return SQLiteRAGStore(db_path, embedder)
+    return SQLiteRAGStore(
+        db_path, embedder, precision=precision, ann_min_docs=ann_min_docs, use_sqlite_vec=use_sqlite_vec
+    )
 
 
 __all__ = [
     "BaseRAGStore",
+    "CachingEmbeddingBackend",
     "CompositeRAGStore",
     "EmbeddingBackend",
     "InMemoryRAGStore",
@@ -1,34 +1,106 @@
-import json
+import asyncio
 import os
-import subprocess
-from functools import lru_cache
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from functools import lru_cache, partial
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Sequence, TextIO, Tuple, Union
 
 import httpx
 from dotenv import load_dotenv
 
 from mcp.server import FastMCP
-
-from mcp_server.database import Database, DatabaseError, ensure_select_only
-from mcp_server.llm import LLMError, create_provider
+from mcp.server.fastmcp import Context
+
+from mcp_server import _json
+from mcp_server.database import (
+    AsyncDatabase,
+    DatabaseError,
+    QueryNotWrappableError,
+    create_async_database,
+    ensure_select_only,
+)
+from mcp_server.llm import HTTP2_AVAILABLE, LLMError, create_provider
+from mcp_server.llm_cache import LLMCache, SemanticCache
 from mcp_server.rag_store import RAGError, build_default_store
 
 
 load_dotenv()
 
-mcp = FastMCP(name="mcp-relay")
+
+@asynccontextmanager
+async def _lifespan(server: FastMCP) -> AsyncIterator[None]:
+    warmup = asyncio.create_task(warm_up_llm())
+    try:
+        yield
+    finally:
+        if not warmup.done():
+            warmup.cancel()
+        if _llm_provider.cache_info().currsize:
+            await _llm_provider().aclose()
+        if _rag_store.cache_info().currsize:
+            await _rag_store().aclose()
+        if _database.cache_info().currsize:
+            await _database().close()
+        await _close_http()
+
+
+mcp = FastMCP(name="mcp-relay", lifespan=_lifespan)
+
+
+_http_client: Optional[httpx.AsyncClient] = None
+_http_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _get_http() -> httpx.AsyncClient:
+    """Shared pooled client for health checks and URL imports, bound to the running loop."""
+
+    global _http_client, _http_loop
+    loop = asyncio.get_running_loop()
+    if _http_client is None or _http_client.is_closed or _http_loop is not loop:
+        _http_client = httpx.AsyncClient(
+            timeout=30,
+            http2=HTTP2_AVAILABLE,
+            # Keep idle sockets for 30s (httpx defaults to 5s) so periodic health probes reuse them.
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=50, keepalive_expiry=30.0),
+        )
+        _http_loop = loop
+    return _http_client
+
+
+async def _close_http() -> None:
+    global _http_client, _http_loop
+    client, _http_client, _http_loop = _http_client, None, None
+    if client is not None and not client.is_closed:
+        await client.aclose()
 
 
 @lru_cache(maxsize=1)
-def _database() -> Database:
+def _database() -> AsyncDatabase:
     url = os.getenv("DATABASE_URL")
     if not url:
         raise DatabaseError("DATABASE_URL is not set for MCP server")
-    return Database(url)
+    return create_async_database(
+        url,
+        driver=os.getenv("DB_DRIVER", "asyncpg"),
+        min_connections=_env_int("PG_POOL_MIN"),
+        max_connections=_env_int("PG_POOL_MAX"),
+    )
+
 
+def _env_int(key: str) -> Optional[int]:
+    raw = os.getenv(key)
+    if not raw:
+        return None
+    try:
+        return int(raw)
+    except ValueError as exc:
+        raise DatabaseError(f"{key} must be an integer") from exc
 
-def _maybe_database() -> Optional[Database]:
+
+def _maybe_database() -> Optional[AsyncDatabase]:
     try:
         return _database()
     except DatabaseError:
@@ -40,8 +112,45 @@ def _llm_provider():
     return create_provider(os.environ)
 
 
+@dataclass(frozen=True)
+class _ToolSettings:
+    """Environment consulted on every tool call, read once per process."""
+
+    rag_enabled: bool
+    rag_top_k: int
+    llm_provider: str
+    llm_max_concurrency: int
+    rag_result_ttl: int
+    backend_url: str
+    rag_import_chunk_chars: int
+    rag_import_chunk_overlap: int
+    rag_import_concurrency: int
+
+
+def _int_or_default(key: str, default: int) -> int:
+    try:
+        return int(os.getenv(key, str(default)))
+    except ValueError:
+        return default
+
+
+@lru_cache(maxsize=1)
+def _tool_settings() -> _ToolSettings:
+    return _ToolSettings(
+        rag_enabled=os.getenv("RAG_ENABLED", "true").lower() not in {"0", "false", "no"},
+        rag_top_k=_int_or_default("RAG_TOP_K", 3),
+        llm_provider=os.getenv("LLM_PROVIDER", "openai"),
+        llm_max_concurrency=_int_or_default("LLM_MAX_CONCURRENCY", 10),
+        rag_result_ttl=_int_or_default("RAG_RESULT_CACHE_TTL", 0),
+        backend_url=os.getenv("BACKEND_URL", "http://localhost:8000").rstrip("/"),
+        rag_import_chunk_chars=max(1, _int_or_default("RAG_IMPORT_CHUNK_CHARS", 4000)),
+        rag_import_chunk_overlap=max(0, _int_or_default("RAG_IMPORT_CHUNK_OVERLAP", 200)),
+        rag_import_concurrency=max(1, _int_or_default("RAG_IMPORT_CONCURRENCY", 4)),
+    )
+
+
 def _rag_enabled() -> bool:
-    return os.getenv("RAG_ENABLED", "true").lower() not in {"0", "false", "no"}
+    return _tool_settings().rag_enabled
 
 
 @lru_cache(maxsize=1)
@@ -51,18 +160,137 @@ def _rag_store():
     return build_default_store()
 
 
-async def _llm_chat(messages: List[Dict[str, str]], *, model: Optional[str] = None) -> str:
+@lru_cache(maxsize=1)
+def _semantic_cache() -> Optional[SemanticCache]:
+    raw = os.getenv("LLM_SEMANTIC_CACHE_THRESHOLD", "").strip()
+    if not raw:
+        return None
+    try:
+        threshold = float(raw)
+    except ValueError as exc:
+        raise LLMError("LLM_SEMANTIC_CACHE_THRESHOLD must be a number") from exc
+    return SemanticCache(
+        threshold=threshold,
+        max_entries=_int_or_default("LLM_CACHE_MAX_ENTRIES", 1024),
+        ttl_seconds=_int_or_default("LLM_CACHE_TTL", 3600),
+    )
+
+
+async def warm_up_llm() -> None:
+    """Pre-connect the configured LLM provider; failures are ignored so startup never blocks on it."""
+
+    try:
+        await _llm_provider().warmup()
+    except Exception:  # pragma: no cover - warm-up is best-effort
+        pass
+
+
+async def _llm_chat(
+    messages: List[Dict[str, str]],
+    *,
+    model: Optional[str] = None,
+    stream: bool = False,
+    on_delta: Optional[Callable[[str], Awaitable[Any]]] = None,
+) -> str:
+    """Return the reply; with ``stream`` it is read incrementally and each delta is passed to ``on_delta``."""
+
     provider = _llm_provider()
+    cache = _semantic_cache()
+    probe = await _semantic_probe(provider, messages, model) if cache is not None else None
+    if probe is not None:
+        cached = cache.lookup(*probe)
+        if cached is not None:
+            if stream and on_delta is not None:
+                await on_delta(cached)
+            return cached
     try:
-        return await provider.chat(messages, model=model)
+        if not stream:
+            reply = await provider.chat(messages, model=model)
+        else:
+            parts: List[str] = []
+            async for delta in provider.stream_chat(messages, model=model):
+                parts.append(delta)
+                if on_delta is not None:
+                    await on_delta(delta)
+            reply = "".join(parts).strip()
     except LLMError:
         raise
     except Exception as exc:  # pragma: no cover - defensive wrapper
         raise LLMError(str(exc)) from exc
+    if probe is not None:
+        cache.store(*probe, reply)
+    return reply
+
+
+async def _semantic_probe(
+    provider: Any, messages: List[Dict[str, str]], model: Optional[str]
+) -> Optional[Tuple[str, List[float]]]:
+    """Scope and embedding of the final user turn for the semantic cache, or ``None`` if unavailable."""
+
+    if not messages or messages[-1].get("role") != "user":
+        return None
+    try:
+        vector = await _rag_store().embedder.embed(messages[-1]["content"])
+    except Exception:
+        return None  # The cache is an optimisation; without embeddings the request simply goes upstream.
+    return LLMCache.cache_key(provider.cache_namespace(), model, messages[:-1]), vector
+
+
+def _delta_sink(stream: bool, ctx: Optional[Context]) -> Optional[Callable[[str], Awaitable[Any]]]:
+    """Forward streamed deltas to the MCP client as log notifications when a request context is available."""
+
+    return ctx.info if stream and ctx is not None else None
 
 
 def _json_error(exc: Exception) -> str:
-    return json.dumps({"error": str(exc)})
+    return _json.dumps_text({"error": str(exc)})
+
+
+# Fixed tool responses, serialised once.
+_NO_MESSAGES_JSON = _json.dumps_text({"summary": "No messages found", "items": []})
+_INSERT_ECHO_FAILED_JSON = _json.dumps_text({"error": "Failed to insert echo message"})
+_INSERT_ECHO_MANY_FAILED_JSON = _json.dumps_text({"error": "Failed to insert echo messages"})
+_PERSIST_ENHANCED_FAILED_JSON = _json.dumps_text({"error": "Failed to persist enhanced message"})
+
+
+# Context retrievals by (query, limit): recent results for RAG_RESULT_CACHE_TTL seconds, and
+# in-flight queries so concurrent identical retrievals share one store.query(). Both are
+# dropped whenever the knowledge base changes.
+_RAG_RECENT_MAX_ENTRIES = 256
+_rag_recent: "OrderedDict[Tuple[str, int], Tuple[float, List[Any]]]" = OrderedDict()
+_rag_inflight: Dict[Tuple[str, int], "asyncio.Task[List[Any]]"] = {}
+
+
+async def _retrieve_context(store: Any, query: str, limit: int) -> List[Any]:
+    key = (query, limit)
+    recent = _rag_recent.get(key)
+    if recent is not None and time.monotonic() < recent[0]:
+        _rag_recent.move_to_end(key)
+        return recent[1]
+    task = _rag_inflight.get(key)
+    if task is None or task.get_loop() is not asyncio.get_running_loop():
+        task = asyncio.ensure_future(store.query(text=query, limit=limit))
+        _rag_inflight[key] = task
+        task.add_done_callback(partial(_finish_retrieval, key, _tool_settings().rag_result_ttl))
+    # Shield the shared task so one caller's cancellation does not fail the others.
+    return await asyncio.shield(task)
+
+
+def _finish_retrieval(key: Tuple[str, int], ttl: int, task: "asyncio.Task[List[Any]]") -> None:
+    if _rag_inflight.get(key) is not task:
+        return  # The knowledge base changed while this query ran; do not keep its result.
+    del _rag_inflight[key]
+    if ttl <= 0 or task.cancelled() or task.exception() is not None:
+        return
+    _rag_recent[key] = (time.monotonic() + ttl, task.result())
+    _rag_recent.move_to_end(key)
+    while len(_rag_recent) > _RAG_RECENT_MAX_ENTRIES:
+        _rag_recent.popitem(last=False)
+
+
+def _forget_retrievals() -> None:
+    _rag_recent.clear()
+    _rag_inflight.clear()
 
 
 async def _inject_rag_context(query: str, messages: List[Dict[str, str]]) -> Optional[Dict[str, Any]]:
@@ -73,13 +301,10 @@ async def _inject_rag_context(query: str, messages: List[Dict[str, str]]) -> Opt
     except RAGError as exc:
         return {"enabled": False, "error": str(exc)}
 
-    try:
-        limit = int(os.getenv("RAG_TOP_K", "3"))
-    except ValueError:
-        limit = 3
+    limit = _tool_settings().rag_top_k
 
     try:
-        results = await store.query(text=query, limit=limit)
+        results = await _retrieve_context(store, query, limit)
     except Exception as exc:  # pragma: no cover - defensive
         return {"enabled": True, "error": str(exc)}
 
@@ -114,27 +339,32 @@ async def _inject_rag_context(query: str, messages: List[Dict[str, str]]) -> Opt
 
 @mcp.tool(name="health", description="Checks backend /healthz endpoint and returns status")
 async def health() -> str:
-    backend_url = os.getenv("BACKEND_URL", "http://localhost:8000")
     try:
-        async with httpx.AsyncClient(timeout=3) as client:
-            response = await client.get(f"{backend_url}/healthz")
-            response.raise_for_status()
-            return json.dumps(response.json())
+        response = await _get_http().get(f"{_tool_settings().backend_url}/healthz", timeout=3)
+        response.raise_for_status()
+        return _json.dumps_text(_json.response_json(response))
     except Exception as exc:
-        return json.dumps({"status": "error", "error": str(exc)})
+        return _json.dumps_text({"status": "error", "error": str(exc)})
 
 
 @mcp.tool(name="echo", description="Echo a message and the length")
 async def echo(message: str) -> str:
-    return json.dumps({"message": message, "length": len(message)})
+    return _json.dumps_text({"message": message, "length": len(message)})
 
 
 @mcp.tool(name="db_query", description="Run a read-only SQL query (SELECT only) and return rows as JSON")
 async def db_query(sql: str) -> str:
     try:
         ensure_select_only(sql)
-        rows = _database().fetch_all(sql)
-        return json.dumps(rows, default=str)
+        db = _database()
+        try:
+            # Let Postgres encode the result set; no per-row dicts or re-serialisation in Python.
+            return await db.fetch_json(sql, read_only=True)
+        except QueryNotWrappableError:
+            # Statements that cannot be wrapped in a subquery fall back to fetching rows; any other
+            # failure is reported as-is rather than running the query a second time.
+            rows = await db.fetch_all(sql, read_only=True)
+            return _json.dumps_text(rows, default=str)
     except Exception as exc:
         return _json_error(exc)
 
@@ -142,7 +372,7 @@ async def db_query(sql: str) -> str:
 @mcp.tool(name="db_insert_echo", description="Insert a row into echo_messages table with given content")
 async def db_insert_echo(content: str) -> str:
     try:
-        result = _database().execute(
+        result = await _database().execute(
             "INSERT INTO echo_messages(content, created_at) VALUES (%s, NOW()) RETURNING id",
             (content,),
             returning=True,
@@ -151,58 +381,86 @@ async def db_insert_echo(content: str) -> str:
         return _json_error(exc)
 
     if not result:
-        return json.dumps({"error": "Failed to insert echo message"})
+        return _INSERT_ECHO_FAILED_JSON
+
+    return _json.dumps_text({"id": result["id"], "content": content})
+
+
+@mcp.tool(
+    name="db_insert_echo_many",
+    description="Insert several rows into echo_messages in one round trip and return their ids",
+)
+async def db_insert_echo_many(contents: List[str]) -> str:
+    if not contents:
+        return _json.dumps_text([])
+    try:
+        rows = await _database().execute_many(
+            "INSERT INTO echo_messages(content, created_at) VALUES %s RETURNING id",
+            [(content,) for content in contents],
+            template="(%s, NOW())",
+            returning=True,
+        )
+    except Exception as exc:
+        return _json_error(exc)
+
+    if len(rows) != len(contents):
+        return _INSERT_ECHO_MANY_FAILED_JSON
 
-    return json.dumps({"id": result["id"], "content": content})
+    return _json.dumps_text([{"id": row["id"], "content": content} for row, content in zip(rows, contents)])
 
 
-def _run(cmd: List[str], cwd: Optional[str] = None, env: Optional[Dict[str, str]] = None) -> str:
-    complete_env = os.environ.copy()
-    if env:
-        complete_env.update(env)
-    proc = subprocess.run(cmd, cwd=cwd, env=complete_env, capture_output=True, text=True)
-    out = proc.stdout.strip()
-    err = proc.stderr.strip()
+# Working directories for the alembic/compose tools, resolved once against the launch directory.
+_BACKEND_DIR = os.getenv("BACKEND_DIR") or os.path.join(os.getcwd(), "backend")
+_INFRA_DIR = os.path.join(os.getcwd(), "infra")
+
+
+async def _run(cmd: List[str], cwd: Optional[str] = None, env: Optional[Dict[str, str]] = None) -> str:
+    # Without overrides the child simply inherits our environment; no per-call copy is needed.
+    complete_env = {**os.environ, **env} if env else None
+    proc = await asyncio.create_subprocess_exec(
+        *cmd,
+        cwd=cwd,
+        env=complete_env,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    stdout, stderr = await proc.communicate()
+    out = stdout.decode(errors="replace").strip()
+    err = stderr.decode(errors="replace").strip()
     if proc.returncode != 0:
-        return json.dumps({"ok": False, "code": proc.returncode, "stdout": out, "stderr": err})
-    return json.dumps({"ok": True, "stdout": out})
+        return _json.dumps_text({"ok": False, "code": proc.returncode, "stdout": out, "stderr": err})
+    return _json.dumps_text({"ok": True, "stdout": out})
 
 
 @mcp.tool(name="alembic_upgrade", description="Run Alembic migrations (upgrade head) in backend/")
 async def alembic_upgrade() -> str:
-    backend_dir = os.getenv("BACKEND_DIR", os.path.join(os.getcwd(), "backend"))
     env = {"DATABASE_URL": os.getenv("DATABASE_URL", "")}
-    return _run(["alembic", "upgrade", "head"], cwd=backend_dir, env=env)
+    return await _run(["alembic", "upgrade", "head"], cwd=_BACKEND_DIR, env=env)
 
 
 @mcp.tool(name="compose_up_dev", description="docker compose up -d --build for dev stack")
 async def compose_up_dev() -> str:
-    infra_dir = os.path.join(os.getcwd(), "infra")
-    return _run(["docker", "compose", "-f", "docker-compose.dev.yml", "up", "-d", "--build"], cwd=infra_dir)
+    return await _run(["docker", "compose", "-f", "docker-compose.dev.yml", "up", "-d", "--build"], cwd=_INFRA_DIR)
 
 
 @mcp.tool(name="compose_down_dev", description="docker compose down for dev stack")
 async def compose_down_dev() -> str:
-    infra_dir = os.path.join(os.getcwd(), "infra")
-    return _run(["docker", "compose", "-f", "docker-compose.dev.yml", "down"], cwd=infra_dir)
+    return await _run(["docker", "compose", "-f", "docker-compose.dev.yml", "down"], cwd=_INFRA_DIR)
 
 
 @mcp.tool(name="compose_logs_dev", description="docker compose logs --tail=100 for dev stack")
 async def compose_logs_dev() -> str:
-    infra_dir = os.path.join(os.getcwd(), "infra")
-    return _run(["docker", "compose", "-f", "docker-compose.dev.yml", "logs", "--tail", "100"], cwd=infra_dir)
+    return await _run(["docker", "compose", "-f", "docker-compose.dev.yml", "logs", "--tail", "100"], cwd=_INFRA_DIR)
 
 
 @mcp.tool(name="compose_up_prod", description="docker compose up -d --build for prod stack")
 async def compose_up_prod() -> str:
-    infra_dir = os.path.join(os.getcwd(), "infra")
-    return _run(["docker", "compose", "-f", "docker-compose.prod.yml", "up", "-d", "--build"], cwd=infra_dir)
+    return await _run(["docker", "compose", "-f", "docker-compose.prod.yml", "up", "-d", "--build"], cwd=_INFRA_DIR)
 
 
 @mcp.tool(name="compose_down_prod", description="docker compose down for prod stack")
 async def compose_down_prod() -> str:
-    infra_dir = os.path.join(os.getcwd(), "infra")
-    return _run(["docker", "compose", "-f", "docker-compose.prod.yml", "down"], cwd=infra_dir)
+    return await _run(["docker", "compose", "-f", "docker-compose.prod.yml", "down"], cwd=_INFRA_DIR)
 
 
 @mcp.tool(name="rag_upsert", description="Insert or update text in the RAG knowledge base")
@@ -214,18 +472,41 @@ async def rag_upsert(content: str, source: Optional[str] = None, store: Optional
 
     try:
         doc_id = await rag_store.upsert(source=source, content=content, store=store)
-        resolved_store = store
-        if not resolved_store:
-            if ":" in doc_id:
-                resolved_store = doc_id.split(":", 1)[0]
-            else:
-                resolved_store = getattr(rag_store, "name", None)
-        payload = {"id": doc_id, "source": source, "store": resolved_store}
-        return json.dumps(payload)
+        _forget_retrievals()
+        return _json.dumps_text(_upserted(rag_store, doc_id, source, store))
     except Exception as exc:
         return _json_error(exc)
 
 
+def _upserted(rag_store, doc_id: str, source: Optional[str], store: Optional[str]) -> Dict[str, Any]:
+    resolved_store = store
+    if not resolved_store:
+        if ":" in doc_id:
+            resolved_store = doc_id.split(":", 1)[0]
+        else:
+            resolved_store = getattr(rag_store, "name", None)
+    return {"id": doc_id, "source": source, "store": resolved_store}
+
+
+async def _rag_query(
+    rag_store, query: str, limit: int, store: Optional[str], embedding: Optional[List[float]] = None
+) -> List[Dict[str, Any]]:
+    selected = None
+    if store:
+        selected = [item.strip() for item in store.split(",") if item.strip()]
+    results = await rag_store.query(text=query, limit=limit, embedding=embedding, stores=selected)
+    return [
+        {
+            "id": doc.id,
+            "source": doc.source,
+            "content": doc.content,
+            "store": doc.store,
+            "score": round(doc.score, 4),
+        }
+        for doc in results
+    ]
+
+
 @mcp.tool(name="rag_search", description="Search the RAG knowledge base for relevant entries")
 async def rag_search(query: str, limit: int = 3, store: Optional[str] = None) -> str:
     try:
@@ -234,42 +515,68 @@ async def rag_search(query: str, limit: int = 3, store: Optional[str] = None) ->
         return _json_error(exc)
 
     try:
-        selected = None
-        if store:
-            selected = [item.strip() for item in store.split(",") if item.strip()]
-        results = await rag_store.query(text=query, limit=limit, stores=selected)
-        return json.dumps(
-            [
-                {
-                    "id": doc.id,
-                    "source": doc.source,
-                    "content": doc.content,
-                    "store": doc.store,
-                    "score": round(doc.score, 4),
-                }
-                for doc in results
-            ]
-        )
+        return _json.dumps_text(await _rag_query(rag_store, query, limit, store))
     except Exception as exc:
         return _json_error(exc)
 
 
+@mcp.tool(
+    name="rag_search_batch",
+    description=(
+        "Run several RAG searches in one call. Each query is an object with 'query' and optional"
+        " 'limit'/'store'; returns one result list (or an error object) per query, in order."
+    ),
+)
+async def rag_search_batch(queries: List[Dict[str, Any]]) -> str:
+    try:
+        rag_store = _rag_store()
+    except Exception as exc:
+        return _json_error(exc)
+
+    # One embedding request for every distinct query text; each lookup then only scores the stores.
+    texts = list(dict.fromkeys(str(item["query"]) for item in queries if isinstance(item, dict) and "query" in item))
+    try:
+        embeddings = dict(zip(texts, await rag_store.embedder.embed_many(texts))) if texts else {}
+    except Exception:
+        embeddings = {}  # Each query embeds on its own and reports its own failure.
+
+    async def _one(item: Dict[str, Any]) -> Any:
+        try:
+            text = str(item["query"])
+            return await _rag_query(
+                rag_store, text, int(item.get("limit", 3)), item.get("store"), embeddings.get(text)
+            )
+        except Exception as exc:
+            return {"error": str(exc)}
+
+    results = await asyncio.gather(*(_one(item) for item in queries))
+    return _json.dumps_text(results)
+
+
 @mcp.tool(name="rag_sources", description="List configured RAG store identifiers")
 async def rag_sources() -> str:
     try:
-        rag_store = _rag_store()
+        return _rag_sources_json()
     except Exception as exc:
         return _json_error(exc)
 
+
+@lru_cache(maxsize=1)
+def _rag_sources_json() -> str:
+    # Store names are fixed for the life of the (cached) store, so the encoded list is too.
+    rag_store = _rag_store()
     names = getattr(rag_store, "store_names", None)
     if names is None:
         names = [getattr(rag_store, "name", "default")]
-    return json.dumps(names)
+    return _json.dumps_text(names)
 
 
 @mcp.tool(
     name="rag_import",
-    description="Load content from a local file path or HTTP(S) URL into the RAG knowledge base",
+    description=(
+        "Load content from a local file path or HTTP(S) URL into the RAG knowledge base. The content is streamed;"
+        " text longer than RAG_IMPORT_CHUNK_CHARS is stored as overlapping chunks, one document each."
+    ),
 )
 async def rag_import(location: str, store: Optional[str] = None, source: Optional[str] = None) -> str:
     try:
@@ -278,36 +585,211 @@ async def rag_import(location: str, store: Optional[str] = None, source: Optiona
         return _json_error(exc)
 
     if location.startswith("http://") or location.startswith("https://"):
-        try:
-            async with httpx.AsyncClient(timeout=30) as client:
-                resp = await client.get(location)
-                resp.raise_for_status()
-                content = resp.text
-        except Exception as exc:
-            return _json_error(exc)
+        blocks = _url_blocks(location)
         resolved_source = source or location
     else:
         path = Path(location).expanduser()
-        if not path.exists():
-            return _json_error(RAGError(f"File not found: {path}"))
-        try:
-            content = path.read_text(encoding="utf-8")
-        except Exception as exc:
-            return _json_error(exc)
+        blocks = _file_blocks(path)
         resolved_source = source or str(path)
 
+    settings = _tool_settings()
+    chunks = _text_chunks(blocks, settings.rag_import_chunk_chars, settings.rag_import_chunk_overlap)
+    # Each batch is embedded in one request; up to RAG_IMPORT_CONCURRENCY batches are in flight while
+    # more text is read, and reading waits for a free slot so memory stays bounded.
+    slots = asyncio.Semaphore(settings.rag_import_concurrency)
+    pending: List["asyncio.Task[List[str]]"] = []
+
+    async def _upsert(documents: List[Tuple[Optional[str], str]]) -> List[str]:
+        try:
+            return await store_instance.upsert_many(documents, store=store)
+        finally:
+            slots.release()
+
+    async def _submit(documents: List[Tuple[Optional[str], str]]) -> None:
+        await slots.acquire()
+        pending.append(asyncio.ensure_future(_upsert(documents)))
+
+    doc_ids: List[str] = []
+    batch: List[Tuple[Optional[str], str]] = []
     try:
-        doc_id = await store_instance.upsert(source=resolved_source, content=content, store=store)
-        resolved_store = store
-        if not resolved_store:
-            if ":" in doc_id:
-                resolved_store = doc_id.split(":", 1)[0]
-            else:
-                resolved_store = getattr(store_instance, "name", None)
-        payload = {"id": doc_id, "source": resolved_source, "store": resolved_store}
-        return json.dumps(payload)
+        async for chunk in chunks:
+            batch.append((resolved_source, chunk))
+            if len(batch) >= _IMPORT_UPSERT_BATCH:
+                await _submit(batch)
+                batch = []
+        if batch:
+            await _submit(batch)
+        for ids in await asyncio.gather(*pending):
+            doc_ids.extend(ids)
     except Exception as exc:
-        return _json_error(exc)
+        # Batches already sent are allowed to finish so the caller learns exactly which chunks were stored.
+        settled = await asyncio.gather(*pending, return_exceptions=True)
+        stored = [doc_id for ids in settled if isinstance(ids, list) for doc_id in ids]
+        if not stored:
+            return _json_error(exc)
+        return _json.dumps_text({"error": str(exc), "stored_ids": stored})
+    finally:
+        if pending:
+            _forget_retrievals()
+
+    if not doc_ids:
+        return _json.dumps_text({"error": f"No content to import from {location}"})
+    result = _upserted(store_instance, doc_ids[0], resolved_source, store)
+    if len(doc_ids) == 1:
+        return _json.dumps_text(result)
+    # "id" (the first chunk) keeps the single-document shape that callers read.
+    return _json.dumps_text({**result, "ids": doc_ids, "chunks": len(doc_ids)})
+
+
+_IMPORT_READ_SIZE = 64 * 1024
+_IMPORT_UPSERT_BATCH = 32
+
+
+def _open_text_file(path: Path) -> TextIO:
+    """Blocking open for ``rag_import``; callers run it in a worker thread."""
+
+    if not path.exists():
+        raise RAGError(f"File not found: {path}")
+    return path.open("r", encoding="utf-8", buffering=_IMPORT_READ_SIZE)
+
+
+async def _file_blocks(path: Path) -> AsyncIterator[str]:
+    handle = await asyncio.to_thread(_open_text_file, path)
+    try:
+        while True:
+            block = await asyncio.to_thread(handle.read, _IMPORT_READ_SIZE)
+            if not block:
+                return
+            yield block
+    finally:
+        handle.close()
+
+
+async def _url_blocks(url: str) -> AsyncIterator[str]:
+    async with _get_http().stream("GET", url) as resp:
+        resp.raise_for_status()
+        async for text in resp.aiter_text():
+            if text:
+                yield text
+
+
+async def _text_chunks(blocks: AsyncIterator[str], size: int, overlap: int) -> AsyncIterator[str]:
+    """Cut streamed text into ``size``-character windows that share ``overlap`` characters.
+
+    Text no longer than ``size`` comes out as a single chunk, so small documents import unchanged.
+    """
+
+    step = max(1, size - min(overlap, size // 2))
+    buffer = ""
+    async for block in blocks:
+        buffer += block
+        start = 0
+        while len(buffer) - start > size:
+            yield buffer[start : start + size]
+            start += step
+        buffer = buffer[start:]
+    if buffer.strip():
+        yield buffer
+
+
+# Tools that may be combined into a single batch_execute call.
+_BATCH_TOOLS = {
+    "rag_import": rag_import,
+    "rag_search": rag_search,
+    "rag_upsert": rag_upsert,
+}
+
+
+@mcp.tool(
+    name="batch_execute",
+    description=(
+        "Run several RAG operations in one call. Each op is an object with 'tool' (one of rag_import,"
+        " rag_upsert, rag_search) and 'args'; ops run concurrently (at most max_concurrent at a time)"
+        " and one result or error object is returned per op, in order. rag_upsert ops aimed at the same"
+        " store are embedded and inserted as one batch."
+    ),
+)
+async def batch_execute(ops: List[Dict[str, Any]], max_concurrent: int = 8) -> str:
+    semaphore = asyncio.Semaphore(max(1, max_concurrent))
+    results: List[Any] = [None] * len(ops)
+
+    # Group well-formed rag_upsert ops by target store so each group costs one embedding request.
+    upsert_groups: Dict[Optional[str], List[int]] = {}
+    for idx, op in enumerate(ops):
+        args = op.get("args")
+        if (
+            op.get("tool") == "rag_upsert"
+            and isinstance(args, dict)
+            and isinstance(args.get("content"), str)
+            and set(args) <= {"content", "source", "store"}
+        ):
+            upsert_groups.setdefault(args.get("store"), []).append(idx)
+    grouped = {idx for indices in upsert_groups.values() for idx in indices}
+
+    async def _upsert_group(store: Optional[str], indices: List[int]) -> None:
+        documents = [(ops[idx]["args"].get("source"), ops[idx]["args"]["content"]) for idx in indices]
+        async with semaphore:
+            try:
+                rag_store = _rag_store()
+                doc_ids = await rag_store.upsert_many(documents, store=store)
+                _forget_retrievals()
+            except Exception as exc:
+                for idx in indices:
+                    results[idx] = {"error": str(exc)}
+                return
+        for idx, (source, _), doc_id in zip(indices, documents, doc_ids):
+            results[idx] = _upserted(rag_store, doc_id, source, store)
+
+    async def _one(op: Dict[str, Any]) -> Any:
+        handler = _BATCH_TOOLS.get(op.get("tool", ""))
+        if handler is None:
+            return {"error": f"Unsupported batch tool '{op.get('tool')}'"}
+        args = op.get("args") or {}
+        if not isinstance(args, dict):
+            return {"error": "Batch op 'args' must be an object"}
+        async with semaphore:
+            try:
+                return _json.loads(await handler(**args))
+            except Exception as exc:
+                return {"error": str(exc)}
+
+    async def _run_one(idx: int) -> None:
+        results[idx] = await _one(ops[idx])
+
+    await asyncio.gather(
+        *(_upsert_group(store, indices) for store, indices in upsert_groups.items()),
+        *(_run_one(idx) for idx in range(len(ops)) if idx not in grouped),
+    )
+    return _json.dumps_text(results)
+
+
+_SUPPORT_ENGINEER_PROMPT = (
+    "Act as a support engineer. Using any knowledge base context provided, identify the root cause of the"
+    " user's issue and outline concrete resolution steps. If the context is insufficient, say so explicitly."
+)
+# Shared by every default-prompt conversation; message lists are built per call and never mutate it.
+_SUPPORT_ENGINEER_MESSAGE = {"role": "system", "content": _SUPPORT_ENGINEER_PROMPT}
+
+
+def _support_messages(text: str, instructions: Optional[str] = None) -> List[Dict[str, str]]:
+    system = {"role": "system", "content": instructions} if instructions else _SUPPORT_ENGINEER_MESSAGE
+    return [system, {"role": "user", "content": text}]
+
+
+_INSERT_ENHANCED_MANY_SQL = (
+    "INSERT INTO echo_messages_enhanced (source_message_id, enhanced_content) VALUES %s RETURNING id, source_message_id"
+)
+
+# Replies collected from a Batch API job carry its batch_id; the partial unique index on
+# (batch_id, source_message_id) makes collecting the same batch again a no-op.
+_INSERT_BATCH_ENHANCED_SQL = (
+    "INSERT INTO echo_messages_enhanced (batch_id, source_message_id, enhanced_content) VALUES %s"
+    " ON CONFLICT (batch_id, source_message_id) WHERE batch_id IS NOT NULL DO NOTHING"
+)
+_BATCH_ENHANCED_IDS_SQL = "SELECT id, source_message_id FROM echo_messages_enhanced WHERE batch_id = %s"
+
+# Batch API requests are tagged with this prefix plus the echo_messages id.
+_BATCH_REQUEST_PREFIX = "echo-"
 
 
 @mcp.tool(
@@ -315,37 +797,36 @@ async def rag_import(location: str, store: Optional[str] = None, source: Optiona
     description=(
         "Fetch a message by id from echo_messages, enhance it with the LLM, "
         "and store the result in echo_messages_enhanced. Returns new enhanced id."
+        " stream=true reads the reply incrementally and sends partial text as log notifications."
     ),
 )
 async def enhance_message_and_store(
     source_id: int,
     instructions: Optional[str] = None,
     model: Optional[str] = None,
+    stream: bool = False,
+    ctx: Context = None,
 ) -> str:
+    # One pooled handle for both statements; each borrows a connection only for its own round
+    # trip, so nothing is held while the LLM call below is in flight.
     try:
-        row = _database().fetch_one("SELECT id, content FROM echo_messages WHERE id = %s", (source_id,))
+        db = _database()
+        row = await db.fetch_one("SELECT id, content FROM echo_messages WHERE id = %s", (source_id,))
     except Exception as exc:
         return _json_error(exc)
 
     if not row:
-        return json.dumps({"error": f"echo_message id {source_id} not found"})
+        return _json.dumps_text({"error": f"echo_message id {source_id} not found"})
 
-    system = instructions or (
-        "Act as a support engineer. Using any knowledge base context provided, identify the root cause of the"
-        " user's issue and outline concrete resolution steps. If the context is insufficient, say so explicitly."
-    )
-    messages = [
-        {"role": "system", "content": system},
-        {"role": "user", "content": row["content"]},
-    ]
+    messages = _support_messages(row["content"], instructions)
     rag_info = await _inject_rag_context(row["content"], messages)
     try:
-        enhanced = await _llm_chat(messages, model=model)
+        enhanced = await _llm_chat(messages, model=model, stream=stream, on_delta=_delta_sink(stream, ctx))
     except Exception as exc:
         return _json_error(exc)
 
     try:
-        result = _database().execute(
+        result = await db.execute(
             "INSERT INTO echo_messages_enhanced (source_message_id, enhanced_content) VALUES (%s, %s) RETURNING id",
             (source_id, enhanced),
             returning=True,
@@ -354,7 +835,7 @@ async def enhance_message_and_store(
         return _json_error(exc)
 
     if not result:
-        return json.dumps({"error": "Failed to persist enhanced message"})
+        return _PERSIST_ENHANCED_FAILED_JSON
 
     response: Dict[str, Any] = {
         "source_id": source_id,
@@ -363,48 +844,91 @@ async def enhance_message_and_store(
     }
     if rag_info:
         response["rag"] = rag_info
-    return json.dumps(response)
+    return _json.dumps_text(response)
+
 
+# The (source_message_id, created_at DESC) INCLUDE (id) index from migration 0003 serves these
+# without a sort, and as an index-only scan when enhanced_content is not requested.
+_LIST_ENHANCED_SQL = """
+    SELECT {columns}
+    FROM echo_messages_enhanced
+    WHERE source_message_id = %s
+    ORDER BY created_at DESC
+    LIMIT %s
+"""
+_LIST_ENHANCED_WITH_CONTENT_SQL = _LIST_ENHANCED_SQL.format(columns="id, source_message_id, enhanced_content, created_at")
+_LIST_ENHANCED_IDS_SQL = _LIST_ENHANCED_SQL.format(columns="id, source_message_id, created_at")
 
-@mcp.tool(name="list_enhanced_for_message", description="List enhanced records for a given echo_messages.id")
-async def list_enhanced_for_message(source_id: int, limit: int = 10) -> str:
+
+@mcp.tool(
+    name="list_enhanced_for_message",
+    description=(
+        "List enhanced records for a given echo_messages.id;"
+        " pass include_content=false to return only ids and timestamps"
+    ),
+)
+async def list_enhanced_for_message(source_id: int, limit: int = 10, include_content: bool = True) -> str:
+    sql = _LIST_ENHANCED_WITH_CONTENT_SQL if include_content else _LIST_ENHANCED_IDS_SQL
     try:
-        rows = _database().fetch_all(
-            """
-            SELECT id, source_message_id, enhanced_content, created_at
-            FROM echo_messages_enhanced
-            WHERE source_message_id = %s
-            ORDER BY created_at DESC
-            LIMIT %s
-            """,
-            (source_id, limit),
-        )
-        return json.dumps(rows, default=str)
+        rows = await _database().fetch_all(sql, (source_id, limit))
+        return _json.dumps_text(rows, default=str)
     except Exception as exc:
         return _json_error(exc)
 
 
-@mcp.tool(name="enhance_text", description="Use LLM to rewrite text to be clearer and more readable")
-async def enhance_text(text: str, instructions: Optional[str] = None, model: Optional[str] = None) -> str:
-    system = instructions or (
-        "Act as a support engineer. Using any knowledge base context provided, identify the root cause of the"
-        " user's issue and outline concrete resolution steps. If the context is insufficient, say so explicitly."
-    )
-    messages = [
-        {"role": "system", "content": system},
-        {"role": "user", "content": text},
-    ]
+@mcp.tool(
+    name="enhance_text",
+    description=(
+        "Use LLM to rewrite text to be clearer and more readable;"
+        " stream=true reads the reply incrementally and sends partial text as log notifications"
+    ),
+)
+async def enhance_text(
+    text: str,
+    instructions: Optional[str] = None,
+    model: Optional[str] = None,
+    stream: bool = False,
+    ctx: Context = None,
+) -> str:
+    messages = _support_messages(text, instructions)
     rag_info = await _inject_rag_context(text, messages)
     try:
-        improved = await _llm_chat(messages, model=model)
+        improved = await _llm_chat(messages, model=model, stream=stream, on_delta=_delta_sink(stream, ctx))
         payload = {"original": text, "enhanced": improved}
         if rag_info:
             payload["rag"] = rag_info
-        return json.dumps(payload)
+        return _json.dumps_text(payload)
     except Exception as exc:
         return _json_error(exc)
 
 
+# Both rows are written after the LLM reply, in one statement (one round trip, one implicit transaction).
+_INSERT_MESSAGE_AND_ENHANCED_SQL = """
+    WITH message AS (
+        INSERT INTO echo_messages (content, created_at) VALUES (%s, NOW()) RETURNING id
+    )
+    INSERT INTO echo_messages_enhanced (source_message_id, enhanced_content)
+    SELECT id, %s FROM message
+    RETURNING id, source_message_id
+"""
+
+
+async def _store_message(db: AsyncDatabase, text: str) -> Tuple[Optional[int], Optional[str]]:
+    """Insert ``text`` alone into echo_messages; returns ``(id, storage_error)``."""
+
+    try:
+        row = await db.execute(
+            "INSERT INTO echo_messages(content, created_at) VALUES (%s, NOW()) RETURNING id",
+            (text,),
+            returning=True,
+        )
+    except Exception as exc:
+        return None, str(exc)
+    if row and "id" in row:
+        return row["id"], None
+    return None, "Failed to insert echo message"
+
+
 @mcp.tool(
     name="enhance_text_and_store",
     description="Insert a message into echo_messages, enhance it, and store the enriched content with processing metadata.",
@@ -414,39 +938,19 @@ async def enhance_text_and_store(
     instructions: Optional[str] = None,
     model: Optional[str] = None,
 ) -> str:
-    system = instructions or (
-        "Act as a support engineer. Using any knowledge base context provided, identify the root cause of the"
-        " user's issue and outline concrete resolution steps. If the context is insufficient, say so explicitly."
-    )
+    system = instructions or _SUPPORT_ENGINEER_PROMPT
     db = _maybe_database()
     message_id: Optional[int] = None
     enhanced_id: Optional[int] = None
-    storage_error: Optional[str] = None
+    storage_error: Optional[str] = None if db is not None else "Database not configured"
 
-    if db is None:
-        storage_error = "Database not configured"
-    else:
-        try:
-            message_row = db.execute(
-                "INSERT INTO echo_messages(content, created_at) VALUES (%s, NOW()) RETURNING id",
-                (text,),
-                returning=True,
-            )
-            if message_row and "id" in message_row:
-                message_id = message_row["id"]
-            else:
-                storage_error = "Failed to insert echo message"
-        except Exception as exc:
-            storage_error = str(exc)
-
-    messages = [
-        {"role": "system", "content": system},
-        {"role": "user", "content": text},
-    ]
+    messages = _support_messages(text, instructions)
     rag_info = await _inject_rag_context(text, messages)
     try:
         enhanced = await _llm_chat(messages, model=model)
     except Exception as exc:
+        if db is not None:
+            message_id, storage_error = await _store_message(db, text)
         payload: Dict[str, Any] = {
             "message_id": message_id,
             "original": text,
@@ -456,26 +960,22 @@ async def enhance_text_and_store(
             payload["rag"] = rag_info
         if storage_error:
             payload["storage_error"] = storage_error
-        return json.dumps(payload)
+        return _json.dumps_text(payload)
 
     processing_payload = {
         "instructions": system,
         "model": model,
-        "provider": os.getenv("LLM_PROVIDER", "openai"),
+        "provider": _tool_settings().llm_provider,
     }
     if rag_info:
         processing_payload["rag"] = rag_info
 
-    if db and storage_error is None and message_id is not None:
-        payload_to_store = json.dumps({"enhanced": enhanced, "processing": processing_payload})
+    if db is not None:
+        payload_to_store = _json.dumps_text({"enhanced": enhanced, "processing": processing_payload})
         try:
-            enhanced_row = db.execute(
-                "INSERT INTO echo_messages_enhanced (source_message_id, enhanced_content) VALUES (%s, %s) RETURNING id",
-                (message_id, payload_to_store),
-                returning=True,
-            )
-            if enhanced_row and "id" in enhanced_row:
-                enhanced_id = enhanced_row["id"]
+            row = await db.execute(_INSERT_MESSAGE_AND_ENHANCED_SQL, (text, payload_to_store), returning=True)
+            if row and "id" in row:
+                message_id, enhanced_id = row["source_message_id"], row["id"]
             else:
                 storage_error = "Failed to persist enhanced message"
         except Exception as exc:
@@ -486,7 +986,7 @@ async def enhance_text_and_store(
     if storage_error:
         processing_details["storage_error"] = storage_error
 
-    return json.dumps(
+    return _json.dumps_text(
         {
             "message_id": message_id,
             "enhanced_id": enhanced_id,
@@ -499,11 +999,19 @@ async def enhance_text_and_store(
 
 @mcp.tool(
     name="enhance_recent_messages",
-    description="Fetch recent echo_messages from DB and ask LLM to produce a readable summary/clarification",
+    description=(
+        "Fetch recent echo_messages from DB and ask LLM to produce a readable summary/clarification."
+        " With per_message=true each message is enhanced by its own concurrent LLM call."
+    ),
 )
-async def enhance_recent_messages(limit: int = 5, style: Optional[str] = None, model: Optional[str] = None) -> str:
+async def enhance_recent_messages(
+    limit: int = 5,
+    style: Optional[str] = None,
+    model: Optional[str] = None,
+    per_message: bool = False,
+) -> str:
     try:
-        rows: List[Dict[str, Any]] = _database().fetch_all(
+        rows: List[Dict[str, Any]] = await _database().fetch_all(
             "SELECT id, content, created_at FROM echo_messages ORDER BY created_at DESC LIMIT %s",
             (limit,),
         )
@@ -511,12 +1019,15 @@ async def enhance_recent_messages(limit: int = 5, style: Optional[str] = None, m
         return _json_error(exc)
 
     if not rows:
-        return json.dumps({"summary": "No messages found", "items": []})
+        return _NO_MESSAGES_JSON
 
     bullet_style = style or (
         "Summarize and clarify each message as bullet points, preserving intent."
         " Return a concise section titled 'Enhanced Messages' followed by bullets."
     )
+    if per_message:
+        return await _enhance_each_message(rows, bullet_style, model)
+
     text_blob = "\n".join([f"[{row['id']}] {row['content']} (at {row['created_at']})" for row in rows])
     messages = [
         {"role": "system", "content": bullet_style},
@@ -524,12 +1035,153 @@ async def enhance_recent_messages(limit: int = 5, style: Optional[str] = None, m
     ]
     try:
         enhanced = await _llm_chat(messages, model=model)
-        return json.dumps({"items": rows, "enhanced": enhanced}, default=str)
+        return _json.dumps_text({"items": rows, "enhanced": enhanced}, default=str)
+    except Exception as exc:
+        return _json.dumps_text({"items": rows, "error": str(exc)}, default=str)
+
+
+async def _enhance_each_message(rows: List[Dict[str, Any]], style: str, model: Optional[str]) -> str:
+    """Enhance every row with its own LLM call, at most ``LLM_MAX_CONCURRENCY`` at a time."""
+
+    conversations = [
+        [{"role": "system", "content": style}, {"role": "user", "content": row["content"]}] for row in rows
+    ]
+    results = await _chat_each(conversations, model)
+    enhanced = [
+        {"id": row["id"], "error": str(result)}
+        if isinstance(result, Exception)
+        else {"id": row["id"], "enhanced": result}
+        for row, result in zip(rows, results)
+    ]
+    return _json.dumps_text({"items": rows, "enhanced": enhanced}, default=str)
+
+
+async def _chat_each(
+    conversations: Sequence[List[Dict[str, str]]], model: Optional[str]
+) -> List[Union[str, BaseException]]:
+    """Run one LLM call per conversation, at most ``LLM_MAX_CONCURRENCY`` at a time; failures are returned."""
+
+    semaphore = asyncio.Semaphore(max(1, _tool_settings().llm_max_concurrency))
+
+    async def _chat(messages: List[Dict[str, str]]) -> str:
+        async with semaphore:
+            return await _llm_chat(messages, model=model)
+
+    return await asyncio.gather(*(_chat(messages) for messages in conversations), return_exceptions=True)
+
+
+async def _store_enhanced(db: AsyncDatabase, replies: Sequence[Tuple[int, str]]) -> Dict[int, int]:
+    """Insert ``(source_id, enhanced_content)`` pairs in one statement; returns source id -> enhanced id."""
+
+    if not replies:
+        return {}
+    rows = await db.execute_many(_INSERT_ENHANCED_MANY_SQL, list(replies), returning=True)
+    return {row["source_message_id"]: row["id"] for row in rows}
+
+
+@mcp.tool(
+    name="enhance_messages_many",
+    description=(
+        "Enhance several echo_messages by id and store the results in echo_messages_enhanced. The messages are"
+        " read and the results written in one round trip each, with the LLM calls run concurrently (bounded by"
+        " LLM_MAX_CONCURRENCY). use_batch_api=true instead submits an OpenAI Batch API job (half price, done"
+        " within 24h) and returns its batch_id for enhance_messages_batch_collect."
+    ),
+)
+async def enhance_messages_many(
+    source_ids: List[int],
+    instructions: Optional[str] = None,
+    model: Optional[str] = None,
+    use_batch_api: bool = False,
+) -> str:
+    ids = list(dict.fromkeys(source_ids))
+    if not ids:
+        return _json.dumps_text({"items": [], "missing": []})
+    try:
+        db = _database()
+        rows: List[Dict[str, Any]] = await db.fetch_all(
+            "SELECT id, content FROM echo_messages WHERE id = ANY(%s)", (ids,)
+        )
+    except Exception as exc:
+        return _json_error(exc)
+
+    found = {row["id"] for row in rows}
+    missing = [source_id for source_id in ids if source_id not in found]
+    conversations = [_support_messages(row["content"], instructions) for row in rows]
+    await asyncio.gather(
+        *(_inject_rag_context(row["content"], messages) for row, messages in zip(rows, conversations))
+    )
+
+    if use_batch_api:
+        requests = {f"{_BATCH_REQUEST_PREFIX}{row['id']}": messages for row, messages in zip(rows, conversations)}
+        try:
+            batch_id = await _llm_provider().submit_batch(requests, model=model)
+        except Exception as exc:
+            return _json_error(exc)
+        return _json.dumps_text({"batch_id": batch_id, "submitted": [row["id"] for row in rows], "missing": missing})
+
+    results = await _chat_each(conversations, model)
+    replies = [(row["id"], result) for row, result in zip(rows, results) if not isinstance(result, BaseException)]
+    try:
+        stored = await _store_enhanced(db, replies)
     except Exception as exc:
-        return json.dumps({"items": rows, "error": str(exc)}, default=str)
+        return _json_error(exc)
+
+    items: List[Dict[str, Any]] = []
+    for row, result in zip(rows, results):
+        if isinstance(result, BaseException):
+            items.append({"source_id": row["id"], "error": str(result)})
+        else:
+            items.append({"source_id": row["id"], "enhanced_id": stored.get(row["id"]), "enhanced_content": result})
+    return _json.dumps_text({"items": items, "missing": missing})
+
+
+@mcp.tool(
+    name="enhance_messages_batch_collect",
+    description=(
+        "Check a batch submitted by enhance_messages_many(use_batch_api=true). Once it has finished, the replies"
+        " are stored in echo_messages_enhanced and returned; later calls return the same rows without storing"
+        " them again."
+    ),
+)
+async def enhance_messages_batch_collect(batch_id: str) -> str:
+    try:
+        batch = await _llm_provider().batch_status(batch_id)
+    except Exception as exc:
+        return _json_error(exc)
+    if not batch.done:
+        return _json.dumps_text({"batch_id": batch_id, "status": batch.status})
+
+    replies: List[Tuple[int, str]] = []
+    errors = dict(batch.errors)
+    for request_id, reply in batch.replies.items():
+        try:
+            replies.append((int(request_id[len(_BATCH_REQUEST_PREFIX) :]), reply))
+        except ValueError:
+            errors[request_id] = "Unrecognised batch request id"
+    try:
+        db = _database()
+        await db.execute_many(_INSERT_BATCH_ENHANCED_SQL, [(batch_id, *reply) for reply in replies])
+        rows = await db.fetch_all(_BATCH_ENHANCED_IDS_SQL, (batch_id,))
+    except Exception as exc:
+        return _json_error(exc)
+
+    stored = {row["source_message_id"]: row["id"] for row in rows}
+    items = [
+        {"source_id": source_id, "enhanced_id": stored.get(source_id), "enhanced_content": reply}
+        for source_id, reply in replies
+    ]
+    return _json.dumps_text({"batch_id": batch_id, "status": batch.status, "items": items, "errors": errors})
 
 
 def main() -> None:
+    try:
+        import uvloop
+    except ImportError:  # pragma: no cover - depends on environment
+        pass
+    else:
+        # FastMCP starts its loop through anyio.run, which creates it from the installed policy.
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
     mcp.run(transport="stdio")
 
 
@@ -15,16 +15,18 @@ ROOT = Path(__file__).resolve().parents[1]
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 
-from mcp_server.server import (  # noqa: E402
-    enhance_message_and_store,
-    enhance_recent_messages,
-    enhance_text,
-    list_enhanced_for_message,
-)
-
+# mcp_server.server is imported inside each command so ``--help`` and argument
+# errors do not pay for loading the server, its provider and database modules.
 
 cli = typer.Typer(help="Utilities for invoking MCP enrichment tools directly.")
 
+_PROVIDER_KEY_ENV = {
+    "openai": "OPENAI_API_KEY",
+    "anthropic": "ANTHROPIC_API_KEY",
+    "openrouter": "OPENROUTER_API_KEY",
+    "azure_openai": "AZURE_OPENAI_API_KEY",
+}
+
 
 def _require_llm_env() -> None:
     provider = os.getenv("LLM_PROVIDER")
@@ -32,13 +34,7 @@ def _require_llm_env() -> None:
         typer.echo("LLM_PROVIDER env var is not set.", err=True)
         raise typer.Exit(code=2)
     provider = provider.lower()
-    key_map = {
-        "openai": "OPENAI_API_KEY",
-        "anthropic": "ANTHROPIC_API_KEY",
-        "openrouter": "OPENROUTER_API_KEY",
-        "azure_openai": "AZURE_OPENAI_API_KEY",
-    }
-    api_env = key_map.get(provider)
+    api_env = _PROVIDER_KEY_ENV.get(provider)
     if api_env and not os.getenv(api_env):
         typer.echo(f"Environment variable {api_env} is required for provider {provider}.", err=True)
         raise typer.Exit(code=2)
@@ -56,6 +52,8 @@ def cmd_enhance_text(
 
     _require_llm_env()
 
+    from mcp_server.server import enhance_text
+
     async def _run() -> None:
         result = await enhance_text(text=text, instructions=instructions, model=model)
         typer.echo(result)
@@ -73,6 +71,8 @@ def cmd_enhance_message(
 
     _require_llm_env()
 
+    from mcp_server.server import enhance_message_and_store
+
     async def _run() -> None:
         result = await enhance_message_and_store(source_id=source_id, instructions=instructions, model=model)
         typer.echo(result)
@@ -87,6 +87,8 @@ def cmd_list_enhanced(
 ) -> None:
     """List stored enhanced variants for a specific source message."""
 
+    from mcp_server.server import list_enhanced_for_message
+
     async def _run() -> None:
         result = await list_enhanced_for_message(source_id=source_id, limit=limit)
         typer.echo(result)
@@ -99,13 +101,16 @@ def cmd_enhance_recent(
     limit: int = typer.Option(5, "--limit", "-l", help="How many recent rows to fetch"),
     style: Optional[str] = typer.Option(None, "--style", "-s", help="Custom instructions"),
     model: Optional[str] = typer.Option(None, "--model", "-m"),
+    per_message: bool = typer.Option(False, "--per-message", help="Enhance each message with its own LLM call"),
 ) -> None:
     """Summarize recent echo_messages with an LLM."""
 
     _require_llm_env()
 
+    from mcp_server.server import enhance_recent_messages
+
     async def _run() -> None:
-        result = await enhance_recent_messages(limit=limit, style=style, model=model)
+        result = await enhance_recent_messages(limit=limit, style=style, model=model, per_message=per_message)
         typer.echo(result)
 
     asyncio.run(_run())
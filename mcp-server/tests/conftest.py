@@ -13,4 +13,15 @@ if str(MCP_ROOT) not in sys.path:
 @pytest.fixture(autouse=True)
 def _default_env(monkeypatch):
     monkeypatch.setenv("DATABASE_URL", os.getenv("DATABASE_URL", "sqlite:///:memory:"))
+    from mcp_server import server
+
+    # Tool settings are snapshotted per process; let each test see its own environment.
+    server._tool_settings.cache_clear()
+    server._semantic_cache.cache_clear()
+    server._forget_retrievals()
+    server._rag_sources_json.cache_clear()
     yield
+    server._tool_settings.cache_clear()
+    server._semantic_cache.cache_clear()
+    server._forget_retrievals()
+    server._rag_sources_json.cache_clear()
@@ -0,0 +1,340 @@
+from types import SimpleNamespace
+
+import pytest
+
+from mcp_server import database as database_module
+from mcp_server.database import Database
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+        self.rolled_back = False
+
+    def rollback(self):
+        self.rolled_back = True
+
+
+class FakePool:
+    instances = []
+
+    def __init__(self, minconn, maxconn, dsn, **kwargs):
+        self.args = SimpleNamespace(minconn=minconn, maxconn=maxconn, dsn=dsn, kwargs=kwargs)
+        self.idle = []
+        self.returned = []
+        FakePool.instances.append(self)
+
+    def getconn(self):
+        return self.idle.pop() if self.idle else FakeConnection()
+
+    def putconn(self, conn, close=False):
+        self.returned.append((conn, close))
+        if not close:
+            self.idle.append(conn)
+
+
+@pytest.fixture()
+def fake_pool(monkeypatch):
+    FakePool.instances = []
+    monkeypatch.setattr(database_module, "ThreadedConnectionPool", FakePool)
+    return FakePool
+
+
+def test_connections_are_reused_from_a_single_pool(fake_pool):
+    db = Database("postgresql+psycopg2://u:p@localhost/db", max_connections=4)
+
+    with db.connection() as first:
+        pass
+    with db.connection() as second:
+        pass
+
+    assert len(fake_pool.instances) == 1
+    pool = fake_pool.instances[0]
+    assert pool.args.dsn == "postgresql://u:p@localhost/db"
+    assert pool.args.maxconn == 4
+    assert first is second
+
+
+def test_closed_connections_are_discarded(fake_pool):
+    db = Database("postgresql://u:p@localhost/db")
+
+    with db.connection() as conn:
+        conn.closed = 1
+    with db.connection() as replacement:
+        pass
+
+    assert replacement is not conn
+    assert fake_pool.instances[0].returned[0] == (conn, True)
+
+
+def test_failed_work_rolls_back_before_release(fake_pool):
+    db = Database("postgresql://u:p@localhost/db")
+
+    with pytest.raises(RuntimeError):
+        with db.connection() as conn:
+            raise RuntimeError("boom")
+
+    assert conn.rolled_back
+    assert fake_pool.instances[0].returned == [(conn, False)]
+
+
+def test_callers_wait_for_a_free_connection_instead_of_exhausting_the_pool(fake_pool):
+    import threading
+
+    db = Database("postgresql://u:p@localhost/db", max_connections=1)
+    release = threading.Event()
+    second_acquired = threading.Event()
+
+    def hold():
+        with db.connection():
+            release.wait(timeout=5)
+
+    def wait_for_slot():
+        with db.connection():
+            second_acquired.set()
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    waiter = threading.Thread(target=wait_for_slot)
+    waiter.start()
+
+    assert not second_acquired.wait(timeout=0.05)
+    release.set()
+    holder.join()
+    waiter.join()
+    assert second_acquired.is_set()
+
+
+def test_create_async_database_passes_pool_bounds(fake_pool):
+    db = database_module.create_async_database("postgresql://u:p@localhost/db", driver="psycopg2", max_connections=3)
+    assert db._database._max_connections == 3
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.description = [("id",), ("content",)]
+        self._rows = rows
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.executed = (sql, params)
+
+    def fetchall(self):
+        return list(self._rows)
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+
+def test_rows_are_fetched_as_tuples_and_mapped_to_plain_dicts(fake_pool):
+    db = Database("postgresql://u:p@localhost/db")
+    conn = FakeConnection()
+    conn.cursor = lambda: FakeCursor([(1, "hi"), (2, "there")])
+    db._get_pool().idle.append(conn)
+
+    columns, rows = db.fetch_rows("SELECT id, content FROM echo_messages")
+    assert columns == ["id", "content"]
+    assert rows == [(1, "hi"), (2, "there")]
+
+    assert db.fetch_all("SELECT id, content FROM echo_messages") == [
+        {"id": 1, "content": "hi"},
+        {"id": 2, "content": "there"},
+    ]
+    assert type(db.fetch_one("SELECT id, content FROM echo_messages")) is dict
+
+
+def test_asyncpg_query_rewrites_placeholders_only_with_params():
+    sql, args = database_module._asyncpg_query(
+        "SELECT * FROM t WHERE a = %s AND b LIKE 'x%%' LIMIT %s", (1, 2)
+    )
+    assert sql == "SELECT * FROM t WHERE a = $1 AND b LIKE 'x%' LIMIT $2"
+    assert args == (1, 2)
+
+    raw = "SELECT '%s%%' AS literal"
+    assert database_module._asyncpg_query(raw, None) == (raw, ())
+
+
+class FakeAsyncpgConnection:
+    def __init__(self, calls):
+        self.calls = calls
+
+    async def fetch(self, sql, *args):
+        self.calls.append(("fetch", sql, args))
+        return [{"id": 1, "content": "hi"}]
+
+    async def fetchrow(self, sql, *args):
+        self.calls.append(("fetchrow", sql, args))
+        return {"id": 7}
+
+    async def fetchval(self, sql, *args):
+        self.calls.append(("fetchval", sql, args))
+        return "[]"
+
+    def transaction(self, **kwargs):
+        calls = self.calls
+
+        class _Transaction:
+            async def __aenter__(self):
+                calls.append(("begin", kwargs))
+
+            async def __aexit__(self, *exc):
+                calls.append(("end",))
+                return False
+
+        return _Transaction()
+
+
+class FakeAsyncpgPool:
+    def __init__(self, calls):
+        self.calls = calls
+        self.closed = False
+
+    def acquire(self):
+        pool = self
+
+        class _Acquire:
+            async def __aenter__(self):
+                return FakeAsyncpgConnection(pool.calls)
+
+            async def __aexit__(self, *exc):
+                return False
+
+        return _Acquire()
+
+    async def close(self):
+        self.closed = True
+
+
+@pytest.mark.asyncio
+async def test_asyncpg_database_shares_one_pool(monkeypatch):
+    created = []
+    calls = []
+
+    async def create_pool(**kwargs):
+        pool = FakeAsyncpgPool(calls)
+        created.append((kwargs, pool))
+        return pool
+
+    monkeypatch.setattr(database_module, "asyncpg", SimpleNamespace(create_pool=create_pool, PostgresError=Exception))
+    db = database_module.AsyncpgDatabase("postgresql+psycopg2://u:p@localhost/db")
+
+    rows = await db.fetch_all("SELECT id, content FROM echo_messages WHERE id = %s", (1,))
+    inserted = await db.execute("INSERT INTO echo_messages(content) VALUES (%s) RETURNING id", ("x",), returning=True)
+    await db.close()
+
+    assert rows == [{"id": 1, "content": "hi"}]
+    assert inserted == {"id": 7}
+    assert len(created) == 1
+    kwargs, pool = created[0]
+    assert kwargs == {"dsn": "postgresql://u:p@localhost/db", "min_size": 2, "max_size": 20}
+    assert calls[0] == ("fetch", "SELECT id, content FROM echo_messages WHERE id = $1", (1,))
+    assert pool.closed
+
+
+@pytest.mark.asyncio
+async def test_asyncpg_read_only_fetches_run_in_a_read_only_transaction(monkeypatch):
+    calls = []
+
+    async def create_pool(**kwargs):
+        return FakeAsyncpgPool(calls)
+
+    monkeypatch.setattr(database_module, "asyncpg", SimpleNamespace(create_pool=create_pool, PostgresError=Exception))
+    db = database_module.AsyncpgDatabase("postgresql://u:p@localhost/db")
+
+    await db.fetch_json("SELECT id FROM echo_messages", read_only=True)
+    await db.fetch_all("SELECT id FROM echo_messages", read_only=True)
+    await db.fetch_all("SELECT id FROM echo_messages")
+
+    assert [call[0] for call in calls] == ["begin", "fetchval", "end", "begin", "fetch", "end", "fetch"]
+    assert calls[0] == ("begin", {"readonly": True}) and calls[3] == ("begin", {"readonly": True})
+
+
+def test_psycopg2_read_only_fetches_mark_the_transaction_read_only(fake_pool):
+    class RecordingCursor(FakeCursor):
+        def __init__(self, rows):
+            super().__init__(rows)
+            self.statements = []
+
+        def execute(self, sql, params=None):
+            self.statements.append(sql)
+
+    db = Database("postgresql://u:p@localhost/db")
+    cursor = RecordingCursor([("[]",)])
+    conn = FakeConnection()
+    conn.cursor = lambda: cursor
+    db._get_pool().idle.append(conn)
+
+    db.fetch_json("SELECT id FROM echo_messages", read_only=True)
+    db.fetch_all("SELECT id FROM echo_messages", read_only=True)
+
+    assert cursor.statements[0] == cursor.statements[2] == "SET TRANSACTION READ ONLY"
+    assert cursor.statements[3] == "SELECT id FROM echo_messages"
+
+
+def test_create_async_database_selects_driver(fake_pool):
+    db = database_module.create_async_database("postgresql://u:p@localhost/db", driver="psycopg2")
+    assert isinstance(db, database_module.ThreadedDatabase)
+
+    with pytest.raises(database_module.DatabaseError):
+        database_module.create_async_database("postgresql://u:p@localhost/db", driver="mysql")
+
+
+@pytest.mark.parametrize("sql", ["SELECT 1", "  \n\tselect * from t", "Select\n1"])
+def test_ensure_select_only_accepts_selects(sql):
+    database_module.ensure_select_only(sql)
+
+
+@pytest.mark.parametrize("sql", ["DELETE FROM t", "", "  update t set a = 'select'"])
+def test_ensure_select_only_rejects_other_statements(sql):
+    with pytest.raises(database_module.DatabaseError):
+        database_module.ensure_select_only(sql)
+
+
+def test_fetch_json_lets_postgres_encode_the_rows(fake_pool):
+    db = Database("postgresql://u:p@localhost/db")
+    cursor = FakeCursor([('[{"id": 1}]',)])
+    conn = FakeConnection()
+    conn.cursor = lambda: cursor
+    db._get_pool().idle.append(conn)
+
+    assert db.fetch_json("SELECT id FROM echo_messages;  ") == '[{"id": 1}]'
+    assert cursor.executed == (
+        "SELECT COALESCE(json_agg(t), '[]'::json)::text FROM (SELECT id FROM echo_messages) AS t",
+        None,
+    )
+
+
+def test_fetch_json_reports_statements_that_cannot_be_wrapped(fake_pool):
+    from psycopg2.errors import SyntaxError as PsycopgSyntaxError
+
+    class UnwrappableCursor(FakeCursor):
+        def execute(self, sql, params=None):
+            raise PsycopgSyntaxError("SELECT ... INTO is not allowed here")
+
+    db = Database("postgresql://u:p@localhost/db")
+    conn = FakeConnection()
+    conn.cursor = lambda: UnwrappableCursor([])
+    db._get_pool().idle.append(conn)
+
+    with pytest.raises(database_module.QueryNotWrappableError):
+        db.fetch_json("SELECT id INTO copy FROM echo_messages")
+    assert conn.rolled_back
+
+
+def test_asyncpg_values_query_expands_one_template_per_row():
+    sql, args = database_module._asyncpg_values_query(
+        "INSERT INTO echo_messages(content, created_at) VALUES %s RETURNING id",
+        [("a",), ("b",)],
+        "(%s, NOW())",
+    )
+    assert sql == "INSERT INTO echo_messages(content, created_at) VALUES ($1, NOW()), ($2, NOW()) RETURNING id"
+    assert args == ["a", "b"]
+
+    sql, args = database_module._asyncpg_values_query("INSERT INTO t(a, b) VALUES %s", [(1, 2), (3, 4)], None)
+    assert sql == "INSERT INTO t(a, b) VALUES ($1, $2), ($3, $4)"
+    assert args == [1, 2, 3, 4]
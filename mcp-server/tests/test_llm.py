@@ -1,8 +1,14 @@
 import asyncio
+import json
 from types import SimpleNamespace
 
+import pytest
+
 
 class DummyResponse:
+    status_code = 200
+    headers = {}
+
     def __init__(self, payload):
         self._payload = payload
 
@@ -12,8 +18,14 @@ class DummyResponse:
     def json(self):
         return self._payload
 
+    @property
+    def content(self):
+        return json.dumps(self._payload).encode()
+
 
 class DummyAsyncClient:
+    is_closed = False
+
     def __init__(self, *, payload, capture):
         self.payload = payload
         self.capture = capture
@@ -29,8 +41,20 @@ class DummyAsyncClient:
         return DummyResponse(self.payload)
 
 
-def test_llm_chat_uses_ollama_payload(monkeypatch):
-    from mcp_server import server as mcp_server
+@pytest.fixture
+def fresh_provider():
+    from mcp_server import llm, server as mcp_server
+
+    mcp_server._llm_provider.cache_clear()
+    llm.reset_provider_cache()
+    yield
+    mcp_server._llm_provider.cache_clear()
+    llm.reset_provider_cache()
+
+
+@pytest.mark.asyncio
+async def test_llm_chat_uses_ollama_payload(monkeypatch, fresh_provider):
+    from mcp_server import llm, server as mcp_server
 
     calls = []
     response = {"message": {"content": "enhanced"}}
@@ -38,13 +62,15 @@ def test_llm_chat_uses_ollama_payload(monkeypatch):
     monkeypatch.setenv("LLM_PROVIDER", "ollama")
     monkeypatch.setenv("OLLAMA_ENDPOINT", "http://localhost:11434")
     monkeypatch.setenv("OLLAMA_MODEL", "llama3")
+    monkeypatch.setenv("RAG_ENABLED", "false")
 
     def fake_async_client(**kwargs):
         return DummyAsyncClient(payload=response, capture=calls)
 
-    monkeypatch.setitem(mcp_server.__dict__, "httpx", SimpleNamespace(AsyncClient=fake_async_client))
+    # Providers build their pooled client in mcp_server.llm.
+    monkeypatch.setattr(llm.httpx, "AsyncClient", fake_async_client)
 
-    result = asyncio.run(mcp_server._llm_chat([{"role": "user", "content": "hi"}]))
+    result = await mcp_server._llm_chat([{"role": "user", "content": "hi"}])
 
     assert result == "enhanced"
     assert len(calls) == 1
@@ -52,3 +78,359 @@ def test_llm_chat_uses_ollama_payload(monkeypatch):
     assert sent["model"] == "llama3"
     assert sent["stream"] is False
     assert sent["messages"][0]["content"] == "hi"
+
+
+def test_provider_reuses_one_http_client(monkeypatch):
+    from mcp_server import llm
+
+    calls = []
+    created = []
+
+    class TrackingClient(DummyAsyncClient):
+        is_closed = False
+
+        async def aclose(self):
+            self.is_closed = True
+
+    def fake_async_client(**kwargs):
+        client = TrackingClient(payload={"message": {"content": "ok"}}, capture=calls)
+        created.append(client)
+        return client
+
+    provider = llm.OllamaProvider(llm.OllamaSettings(endpoint="http://localhost:11434", default_model="llama3"))
+    monkeypatch.setattr(llm, "httpx", SimpleNamespace(AsyncClient=fake_async_client))
+
+    async def scenario():
+        async with provider:
+            await provider.chat([{"role": "user", "content": "one"}])
+            await provider.chat([{"role": "user", "content": "two"}])
+
+    asyncio.run(scenario())
+
+    assert len(calls) == 2
+    assert len(created) == 1
+    assert created[0].is_closed
+
+
+def test_create_provider_reads_http_pool_limits():
+    from mcp_server import llm
+
+    provider = llm.create_provider(
+        {
+            "LLM_PROVIDER": "ollama",
+            "LLM_HTTP_MAX_CONNECTIONS": "500",
+            "LLM_HTTP_MAX_KEEPALIVE": "50",
+            "LLM_HTTP_KEEPALIVE_EXPIRY": "12.5",
+        }
+    )
+
+    assert provider._limits.max_connections == 500
+    assert provider._limits.max_keepalive_connections == 50
+    assert provider._limits.keepalive_expiry == 12.5
+
+
+def test_create_provider_rejects_bad_pool_limit():
+    from mcp_server import llm
+
+    with pytest.raises(llm.LLMError):
+        llm.create_provider({"LLM_PROVIDER": "ollama", "LLM_HTTP_MAX_CONNECTIONS": "lots"})
+
+
+def test_create_provider_memoises_dispatch_per_config():
+    from mcp_server import llm
+
+    llm.reset_provider_cache()
+    env = {"LLM_PROVIDER": "ollama", "OLLAMA_MODEL": "mistral", "UNRELATED": "x"}
+    first = llm.create_provider(env)
+    second = llm.create_provider({**env, "UNRELATED": "y"})
+
+    assert first is not second
+    assert first._settings is second._settings
+    assert llm._provider_factory.cache_info().hits == 1
+
+    llm.reset_provider_cache()
+    assert llm._provider_factory.cache_info().currsize == 0
+
+
+def test_warmup_heads_provider_base_url_and_ignores_errors(monkeypatch):
+    from mcp_server import llm
+
+    heads = []
+
+    class WarmupClient:
+        is_closed = False
+
+        async def head(self, url):
+            heads.append(url)
+            raise llm.httpx.ConnectError("offline")
+
+    provider = llm.OllamaProvider(llm.OllamaSettings(endpoint="http://ollama:11434", default_model="llama3"))
+    monkeypatch.setattr(provider, "_build_client", lambda: WarmupClient())
+
+    asyncio.run(provider.warmup())
+
+    assert heads == ["http://ollama:11434"]
+
+
+class DummyStream:
+    status_code = 200
+
+    def __init__(self, lines):
+        self._lines = lines
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+    def raise_for_status(self):
+        return None
+
+    async def aiter_lines(self):
+        for line in self._lines:
+            yield line
+
+
+class StreamingClient:
+    is_closed = False
+
+    def __init__(self, lines):
+        self.lines = lines
+        self.requests = []
+
+    def stream(self, method, url, headers=None, json=None):
+        self.requests.append(SimpleNamespace(method=method, url=url, json=json))
+        return DummyStream(self.lines)
+
+
+async def _collect(stream):
+    return [chunk async for chunk in stream]
+
+
+def test_openai_stream_chat_yields_sse_deltas(monkeypatch):
+    from mcp_server import llm
+
+    client = StreamingClient(
+        [
+            'data: {"choices":[{"delta":{"role":"assistant"}}]}',
+            "",
+            'data: {"choices":[{"delta":{"content":"Hel"}}]}',
+            'data: {"choices":[{"delta":{"content":"lo"}}]}',
+            "data: [DONE]",
+        ]
+    )
+    provider = llm.OpenAIProvider(llm.OpenAISettings(api_key="k", default_model="gpt-4o-mini"))
+    monkeypatch.setattr(provider, "_build_client", lambda: client)
+
+    chunks = asyncio.run(_collect(provider.stream_chat([{"role": "user", "content": "hi"}])))
+
+    assert chunks == ["Hel", "lo"]
+    assert client.requests[0].json["stream"] is True
+    assert client.requests[0].json["model"] == "gpt-4o-mini"
+
+
+def test_ollama_stream_chat_reads_ndjson(monkeypatch):
+    from mcp_server import llm
+
+    client = StreamingClient(
+        [
+            '{"message":{"content":"en"},"done":false}',
+            '{"message":{"content":"hanced"},"done":false}',
+            '{"message":{"content":""},"done":true}',
+        ]
+    )
+    provider = llm.OllamaProvider(llm.OllamaSettings(endpoint="http://localhost:11434", default_model="llama3"))
+    monkeypatch.setattr(provider, "_build_client", lambda: client)
+
+    chunks = asyncio.run(_collect(provider.stream_chat([{"role": "user", "content": "hi"}])))
+
+    assert chunks == ["en", "hanced"]
+    assert client.requests[0].url == "http://localhost:11434/api/chat"
+    assert client.requests[0].json["stream"] is True
+
+
+def test_stream_chat_retries_opening_and_respects_max_concurrency(monkeypatch):
+    import httpx
+
+    from mcp_server import llm
+
+    statuses = iter([429, 200, 200, 200])
+    active = 0
+    peak = 0
+
+    async def handler(request):
+        nonlocal active, peak
+        status = next(statuses)
+        if status != 200:
+            return httpx.Response(status, headers={"Retry-After": "0"})
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        return httpx.Response(200, text='{"message":{"content":"ok"},"done":true}\n')
+
+    provider = llm.create_provider({"LLM_PROVIDER": "ollama", "OLLAMA_MAX_CONCURRENCY": "1"})
+    monkeypatch.setattr(provider, "_build_client", lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+    async def scenario():
+        return await asyncio.gather(
+            *(_collect(provider.stream_chat([{"role": "user", "content": str(i)}])) for i in range(3))
+        )
+
+    assert asyncio.run(scenario()) == [["ok"], ["ok"], ["ok"]]
+    assert peak == 1
+
+
+def test_anthropic_payload_marks_leading_system_prompt_cacheable():
+    from mcp_server import llm
+
+    provider = llm.AnthropicProvider(llm.AnthropicSettings(api_key="k", default_model="claude"))
+    messages = [
+        {"role": "system", "content": "be brief"},
+        {"role": "user", "content": "hi"},
+        {"role": "tool", "content": "ignored"},
+        {"role": "system", "content": "be kind"},
+        {"role": "assistant", "content": "hello"},
+    ]
+
+    payload = provider._payload(messages, None)
+
+    assert payload["system"] == [
+        {"type": "text", "text": "be brief", "cache_control": {"type": "ephemeral"}},
+        {"type": "text", "text": "be kind"},
+    ]
+    assert payload["messages"] == [
+        {"role": "user", "content": "hi"},
+        {"role": "assistant", "content": "hello"},
+    ]
+    assert payload["model"] == "claude"
+
+
+def test_chat_retries_rate_limits_and_honours_retry_after(monkeypatch):
+    import httpx
+
+    from mcp_server import llm
+
+    statuses = iter([429, 503, 200])
+    seen = []
+
+    def handler(request):
+        status = next(statuses)
+        seen.append(status)
+        if status != 200:
+            return httpx.Response(status, headers={"Retry-After": "0"})
+        return httpx.Response(200, json={"message": {"content": "ok"}})
+
+    provider = llm.OllamaProvider(
+        llm.OllamaSettings(endpoint="http://ollama", default_model="llama3"),
+        retry=llm.RetryPolicy(max_retries=3, base_delay=5.0),
+    )
+    monkeypatch.setattr(provider, "_build_client", lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+    assert asyncio.run(provider.chat([{"role": "user", "content": "hi"}])) == "ok"
+    assert seen == [429, 503, 200]
+
+
+def test_chat_gives_up_after_max_retries(monkeypatch):
+    import httpx
+
+    from mcp_server import llm
+
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(429)
+
+    provider = llm.OllamaProvider(
+        llm.OllamaSettings(endpoint="http://ollama", default_model="llama3"),
+        retry=llm.RetryPolicy(max_retries=2, base_delay=0.0),
+    )
+    monkeypatch.setattr(provider, "_build_client", lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(provider.chat([{"role": "user", "content": "hi"}]))
+    assert len(calls) == 3
+
+
+def test_max_concurrency_bounds_in_flight_requests(monkeypatch):
+    import httpx
+
+    from mcp_server import llm
+
+    active = 0
+    peak = 0
+
+    async def handler(request):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        return httpx.Response(200, json={"message": {"content": "ok"}})
+
+    provider = llm.create_provider({"LLM_PROVIDER": "ollama", "OLLAMA_MAX_CONCURRENCY": "2"})
+    monkeypatch.setattr(provider, "_build_client", lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+    async def scenario():
+        await asyncio.gather(*(provider.chat([{"role": "user", "content": str(i)}]) for i in range(6)))
+
+    asyncio.run(scenario())
+    assert peak == 2
+
+
+def test_openai_batch_uploads_jsonl_and_reads_results(monkeypatch):
+    import httpx
+
+    from mcp_server import llm
+
+    requests = []
+    output = "\n".join(
+        [
+            json.dumps(
+                {
+                    "custom_id": "a",
+                    "response": {"status_code": 200, "body": {"choices": [{"message": {"content": " hi "}}]}},
+                }
+            ),
+            json.dumps({"custom_id": "b", "response": {"status_code": 400, "body": {"error": {"message": "bad"}}}}),
+        ]
+    )
+
+    def handler(request):
+        requests.append(request)
+        path = request.url.path
+        if path == "/v1/files":
+            return httpx.Response(200, json={"id": "file_in"})
+        if path == "/v1/batches":
+            return httpx.Response(200, json={"id": "batch_1", "status": "validating"})
+        if path == "/v1/batches/batch_1":
+            return httpx.Response(200, json={"id": "batch_1", "status": "completed", "output_file_id": "file_out"})
+        if path == "/v1/files/file_out/content":
+            return httpx.Response(200, content=output.encode())
+        return httpx.Response(404)
+
+    provider = llm.OpenAIProvider(llm.OpenAISettings(api_key="k", default_model="gpt-4o-mini"))
+    monkeypatch.setattr(provider, "_build_client", lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+    async def scenario():
+        batch_id = await provider.submit_batch(
+            {"a": [{"role": "user", "content": "one"}], "b": [{"role": "user", "content": "two"}]}
+        )
+        return batch_id, await provider.batch_status(batch_id)
+
+    batch_id, status = asyncio.run(scenario())
+
+    assert batch_id == "batch_1"
+    assert b'"custom_id":"a"' in requests[0].content and b"gpt-4o-mini" in requests[0].content
+    assert json.loads(requests[1].content)["input_file_id"] == "file_in"
+    assert status.done and status.replies == {"a": "hi"} and status.errors == {"b": "bad"}
+
+
+def test_batch_is_unsupported_by_default():
+    from mcp_server import llm
+
+    provider = llm.OllamaProvider(llm.OllamaSettings(endpoint="http://ollama", default_model="llama3"))
+    with pytest.raises(llm.LLMError):
+        asyncio.run(provider.submit_batch({"a": [{"role": "user", "content": "hi"}]}))
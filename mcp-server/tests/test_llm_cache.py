@@ -0,0 +1,128 @@
+import asyncio
+
+import pytest
+
+from mcp_server import llm
+from mcp_server.llm_cache import LLMCache, MemoryCacheBackend, build_cache
+
+
+class CountingProvider(llm.LLMProvider):
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    async def chat(self, messages, *, model=None):
+        self.calls += 1
+        return f"reply-{self.calls}"
+
+
+def test_memory_backend_evicts_least_recently_used():
+    backend = MemoryCacheBackend(max_entries=2)
+
+    async def scenario():
+        await backend.set("a", "1", None)
+        await backend.set("b", "2", None)
+        assert await backend.get("a") == "1"
+        await backend.set("c", "3", None)
+        return [await backend.get(key) for key in ("a", "b", "c")]
+
+    assert asyncio.run(scenario()) == ["1", None, "3"]
+
+
+def test_memory_backend_expires_entries(monkeypatch):
+    from mcp_server import llm_cache
+
+    now = [100.0]
+    monkeypatch.setattr(llm_cache.time, "monotonic", lambda: now[0])
+    backend = MemoryCacheBackend()
+
+    async def scenario():
+        await backend.set("k", "v", 10)
+        fresh = await backend.get("k")
+        now[0] += 11
+        return fresh, await backend.get("k")
+
+    assert asyncio.run(scenario()) == ("v", None)
+
+
+def test_cached_provider_reuses_identical_requests():
+    inner = CountingProvider()
+    provider = llm.CachedProvider(inner, LLMCache(MemoryCacheBackend()))
+    messages = [{"role": "user", "content": "hi"}]
+
+    async def scenario():
+        first = await provider.chat(messages)
+        second = await provider.chat(messages)
+        other_model = await provider.chat(messages, model="other")
+        return first, second, other_model
+
+    assert asyncio.run(scenario()) == ("reply-1", "reply-1", "reply-2")
+    assert inner.calls == 2
+
+
+def test_cached_provider_coalesces_concurrent_identical_requests():
+    class SlowProvider(CountingProvider):
+        async def chat(self, messages, *, model=None):
+            self.calls += 1
+            await asyncio.sleep(0.01)
+            return f"reply-{self.calls}"
+
+    inner = SlowProvider()
+    provider = llm.CachedProvider(inner, LLMCache(MemoryCacheBackend()))
+    messages = [{"role": "user", "content": "hi"}]
+
+    async def scenario():
+        return await asyncio.gather(*(provider.chat(messages) for _ in range(5)))
+
+    assert asyncio.run(scenario()) == ["reply-1"] * 5
+    assert inner.calls == 1
+    assert provider._inflight == {}
+
+
+def test_create_provider_wraps_with_cache_when_configured():
+    env = {"LLM_PROVIDER": "ollama", "LLM_CACHE_BACKEND": "memory"}
+
+    assert isinstance(llm.create_provider(env), llm.CachedProvider)
+    assert not isinstance(llm.create_provider({"LLM_PROVIDER": "ollama"}), llm.CachedProvider)
+    assert build_cache({}) is None
+
+
+def test_create_provider_rejects_unknown_cache_backend():
+    with pytest.raises(llm.LLMError):
+        llm.create_provider({"LLM_PROVIDER": "ollama", "LLM_CACHE_BACKEND": "memcached"})
+
+
+def test_coalescing_without_cache_shares_only_in_flight_requests():
+    class SlowProvider(CountingProvider):
+        async def chat(self, messages, *, model=None):
+            self.calls += 1
+            await asyncio.sleep(0.01)
+            return f"reply-{self.calls}"
+
+    inner = SlowProvider()
+    provider = llm.CachedProvider(inner, None)
+    messages = [{"role": "user", "content": "hi"}]
+
+    async def scenario():
+        burst = await asyncio.gather(*(provider.chat(messages) for _ in range(3)))
+        return burst, await provider.chat(messages)
+
+    assert asyncio.run(scenario()) == (["reply-1"] * 3, "reply-2")
+    assert isinstance(llm.create_provider({"LLM_PROVIDER": "ollama", "LLM_COALESCE": "true"}), llm.CachedProvider)
+
+
+def test_semantic_cache_matches_similar_queries_within_a_scope():
+    from mcp_server.llm_cache import SemanticCache
+
+    cache = SemanticCache(threshold=0.95, max_entries=2)
+    cache.store("scope-a", [1.0, 0.0, 0.0], "reply-a")
+
+    assert cache.lookup("scope-a", [0.99, 0.05, 0.0]) == "reply-a"
+    assert cache.lookup("scope-a", [0.0, 1.0, 0.0]) is None
+    assert cache.lookup("scope-b", [1.0, 0.0, 0.0]) is None
+    assert cache.lookup("scope-a", [1.0, 0.0]) is None
+
+    cache.store("scope-a", [0.0, 1.0, 0.0], "reply-b")
+    cache.store("scope-b", [0.0, 0.0, 1.0], "reply-c")
+    assert cache.lookup("scope-a", [1.0, 0.0, 0.0]) is None  # evicted as least recently used
+    assert cache.lookup("scope-a", [0.0, 1.0, 0.0]) == "reply-b"
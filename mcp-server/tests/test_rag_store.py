@@ -1,30 +1,47 @@
+import asyncio
+import json
 from pathlib import Path
+import sqlite3
 
+import numpy as np
 import pytest
 
 from mcp_server.rag_store import (
+    CachingEmbeddingBackend,
     CompositeRAGStore,
     EmbeddingBackend,
     InMemoryRAGStore,
     SQLiteRAGStore,
+    _top_k_indices,
 )
 
 
 class DummyEmbedder(EmbeddingBackend):
     async def embed(self, text: str):
-        # deterministic embedding based on character ordinals
-        return [float(len(text)), float(sum(ord(ch) for ch in text) % 1000)]
+        # deterministic embedding based on the byte values of the text
+        return [float(len(text)), float(sum(text.encode()) % 1000)]
+
+
+@pytest.fixture(scope="module")
+def embedder():
+    # Stateless, so one instance serves every test in the module.
+    return DummyEmbedder()
+
+
+@pytest.fixture
+def sqlite_store(tmp_path: Path, embedder):
+    return SQLiteRAGStore(tmp_path / "rag.db", embedder)
 
 
 @pytest.mark.asyncio
-async def test_upsert_and_query(tmp_path: Path):
-    embedder = DummyEmbedder()
-    store = SQLiteRAGStore(tmp_path / "rag.db", embedder)
+async def test_upsert_and_query(sqlite_store):
+    store = sqlite_store
 
     doc1 = await store.upsert(source="doc1", content="hello world")
     doc2 = await store.upsert(source="doc2", content="fast api relay")
 
-    results = await store.query(text="hello", limit=2)
+    # DummyEmbedder vectors are only 2-D, so query with doc1's exact text to get an unambiguous top hit.
+    results = await store.query(text="hello world", limit=2)
 
     assert [doc.id for doc in results] == [doc1, doc2]
     assert results[0].source == "doc1"
@@ -32,19 +49,16 @@ async def test_upsert_and_query(tmp_path: Path):
 
 
 @pytest.mark.asyncio
-async def test_query_limit(tmp_path: Path):
-    embedder = DummyEmbedder()
-    store = SQLiteRAGStore(tmp_path / "rag.db", embedder)
-    for idx in range(5):
-        await store.upsert(source=f"doc{idx}", content=f"content {idx}")
+async def test_query_limit(sqlite_store):
+    store = sqlite_store
+    await asyncio.gather(*(store.upsert(source=f"doc{idx}", content=f"content {idx}") for idx in range(5)))
 
     results = await store.query(text="content", limit=3)
     assert len(results) == 3
 
 
 @pytest.mark.asyncio
-async def test_composite_store_queries_all_sources(tmp_path: Path):
-    embedder = DummyEmbedder()
+async def test_composite_store_queries_all_sources(tmp_path: Path, embedder):
     store_a = SQLiteRAGStore(tmp_path / "a.db", embedder, name="alpha")
     store_b = InMemoryRAGStore(embedder, name="beta")
     composite = CompositeRAGStore([store_a, store_b], embedder)
@@ -60,3 +74,378 @@ async def test_composite_store_queries_all_sources(tmp_path: Path):
 
     alpha_only = await composite.query(text="content", limit=5, stores=["alpha"])
     assert {doc.store for doc in alpha_only} == {"alpha"}
+
+
+@pytest.mark.asyncio
+async def test_sqlite_query_sees_rows_written_after_cached_load(tmp_path: Path, embedder):
+    store = SQLiteRAGStore(tmp_path / "rag.db", embedder)
+    other_writer = SQLiteRAGStore(tmp_path / "rag.db", embedder)
+
+    await store.upsert(source="doc1", content="first")
+    assert len(await store.query(text="first", limit=5)) == 1
+
+    await other_writer.upsert(source="doc2", content="second")
+    results = await store.query(text="first", limit=5)
+
+    assert {doc.source for doc in results} == {"doc1", "doc2"}
+
+
+@pytest.mark.asyncio
+async def test_in_memory_query_scores_by_cosine_similarity(embedder):
+    store = InMemoryRAGStore(embedder)
+    await store.upsert(source="zero", content="")
+    same = await store.upsert(source="same", content="abc")
+
+    results = await store.query(text="abc", limit=2)
+
+    assert results[0].id == same
+    assert results[0].score == pytest.approx(1.0)
+    assert results[1].score == 0.0
+
+
+def test_top_k_indices_orders_best_first():
+    scores = np.array([0.1, 0.9, 0.5, 0.7, 0.2], dtype=np.float32)
+
+    assert _top_k_indices(scores, 3).tolist() == [1, 3, 2]
+    assert _top_k_indices(scores, 10).tolist() == [1, 3, 2, 4, 0]
+    assert _top_k_indices(scores, 0).tolist() == []
+
+
+@pytest.mark.asyncio
+async def test_sqlite_store_migrates_json_embeddings_to_blobs(tmp_path: Path):
+    db_path = tmp_path / "legacy.db"
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        """
+        CREATE TABLE rag_documents (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            source TEXT,
+            content TEXT NOT NULL,
+            embedding TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+    conn.execute(
+        "INSERT INTO rag_documents (id, source, content, embedding) VALUES (7, 'old', 'legacy', '[3.0, 4.0]')"
+    )
+    conn.commit()
+    conn.close()
+
+    store = SQLiteRAGStore(db_path, DummyEmbedder())
+    new_id = await store.upsert(source="new", content="fresh")
+    results = await store.query(text="", limit=5, embedding=[3.0, 4.0])
+
+    assert [doc.id for doc in results][0] == "7"
+    assert results[0].score == pytest.approx(1.0)
+    assert {doc.id for doc in results} == {"7", new_id}
+    row = store._conn.execute("SELECT embedding FROM rag_documents WHERE id = 7").fetchone()
+    assert np.frombuffer(row["embedding"], dtype=np.float32).tolist() == [3.0, 4.0]
+
+
+@pytest.mark.asyncio
+async def test_int8_precision_matches_float32_ranking(tmp_path: Path):
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(50, 16)).astype(np.float32)
+
+    class TableEmbedder(EmbeddingBackend):
+        async def embed(self, text: str):
+            return vectors[int(text)].tolist()
+
+    exact = InMemoryRAGStore(TableEmbedder(), name="exact")
+    quantized = SQLiteRAGStore(tmp_path / "q.db", TableEmbedder(), precision="int8")
+    for idx in range(len(vectors)):
+        await exact.upsert(source=str(idx), content=str(idx))
+        await quantized.upsert(source=str(idx), content=str(idx))
+
+    query = rng.normal(size=16).tolist()
+    exact_results = await exact.query(text="", embedding=query, limit=5)
+    quantized_results = await quantized.query(text="", embedding=query, limit=5)
+
+    assert [doc.source for doc in quantized_results][:3] == [doc.source for doc in exact_results][:3]
+    for got, want in zip(quantized_results, exact_results):
+        assert got.score == pytest.approx(want.score, abs=0.02)
+
+
+@pytest.mark.asyncio
+async def test_ann_index_agrees_with_brute_force(tmp_path: Path):
+    pytest.importorskip("hnswlib")
+    rng = np.random.default_rng(1)
+    vectors = rng.normal(size=(200, 8)).astype(np.float32)
+
+    class TableEmbedder(EmbeddingBackend):
+        async def embed(self, text: str):
+            return vectors[int(text)].tolist()
+
+    exact = InMemoryRAGStore(TableEmbedder(), name="exact")
+    approximate = SQLiteRAGStore(tmp_path / "ann.db", TableEmbedder(), ann_min_docs=50)
+    for idx in range(150):
+        await exact.upsert(source=str(idx), content=str(idx))
+        await approximate.upsert(source=str(idx), content=str(idx))
+    await approximate.query(text="0", limit=1)  # builds the graph
+    for idx in range(150, 200):
+        await exact.upsert(source=str(idx), content=str(idx))
+        await approximate.upsert(source=str(idx), content=str(idx))
+
+    query = rng.normal(size=8).tolist()
+    exact_results = await exact.query(text="", embedding=query, limit=5)
+    approximate_results = await approximate.query(text="", embedding=query, limit=5)
+
+    assert [doc.source for doc in approximate_results] == [doc.source for doc in exact_results]
+    assert approximate_results[0].score == pytest.approx(exact_results[0].score, abs=1e-4)
+    assert approximate._matrix_cache[2]._ann is not None
+
+
+@pytest.mark.asyncio
+async def test_ollama_embedder_reuses_one_client(monkeypatch):
+    from mcp_server import rag_store
+
+    created = []
+
+    class FakeResponse:
+        def __init__(self, payload):
+            self._payload = payload
+
+        def raise_for_status(self):
+            return None
+
+        def json(self):
+            return self._payload
+
+        @property
+        def content(self):
+            return json.dumps(self._payload).encode()
+
+    class FakeClient:
+        def __init__(self, **kwargs):
+            self.is_closed = False
+            self.urls = []
+            created.append(self)
+
+        async def post(self, url, json):
+            self.urls.append(url)
+            if url.endswith("/api/embed"):
+                return FakeResponse({"embeddings": [[1.0, 0.0] for _ in json["input"]]})
+            return FakeResponse({"embedding": [0.0, 1.0]})
+
+        async def aclose(self):
+            self.is_closed = True
+
+    monkeypatch.setattr(rag_store.httpx, "AsyncClient", FakeClient)
+    backend = rag_store.OllamaEmbeddingBackend(endpoint="http://ollama:11434/", model="nomic")
+
+    assert await backend.embed("one") == [0.0, 1.0]
+    assert await backend.embed_many(["two", "three"]) == [[1.0, 0.0], [1.0, 0.0]]
+    await backend.aclose()
+
+    assert len(created) == 1
+    assert created[0].urls == ["http://ollama:11434/api/embeddings", "http://ollama:11434/api/embed"]
+    assert created[0].is_closed
+
+
+@pytest.mark.asyncio
+async def test_composite_store_queries_stores_concurrently(embedder):
+    running = []
+    peak = []
+
+    class SlowStore(InMemoryRAGStore):
+        async def query(self, **kwargs):
+            running.append(self.name)
+            peak.append(len(running))
+            await asyncio.sleep(0.01)
+            running.remove(self.name)
+            return await super().query(**kwargs)
+
+    stores = [SlowStore(embedder, name=f"s{idx}") for idx in range(3)]
+    for store in stores:
+        await store.upsert(source=store.name, content="shared text")
+
+    results = await CompositeRAGStore(stores, embedder).query(text="shared text", limit=3)
+
+    assert max(peak) == 3
+    assert {doc.store for doc in results} == {"s0", "s1", "s2"}
+
+
+@pytest.mark.asyncio
+async def test_sqlite_upsert_many_inserts_batch_in_wal_mode(sqlite_store):
+    store = sqlite_store
+
+    doc_ids = await store.upsert_many([("a", "first"), ("b", "second"), (None, "third")])
+    results = await store.query(text="first", limit=5)
+
+    assert len(set(doc_ids)) == 3
+    assert {doc.id for doc in results} == set(doc_ids)
+    assert store._conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+@pytest.mark.asyncio
+async def test_sqlite_cache_stays_consistent_when_a_write_lands_mid_load(sqlite_store):
+    store = sqlite_store
+    for content in ("one", "two", "three"):
+        await store.upsert(source=content, content=content)
+    await store.query(text="one", limit=1)
+    await store.upsert(source="four", content="four")
+
+    original_fetch_rows = store._fetch_rows
+    interleaved = []
+
+    def fetch_rows_after_a_concurrent_insert(**kwargs):
+        if not interleaved:
+            # Another writer commits between the token query and the row fetch.
+            interleaved.append(store._insert_document("five", "five", [4.0, 1.0]))
+        return original_fetch_rows(**kwargs)
+
+    store._fetch_rows = fetch_rows_after_a_concurrent_insert
+    await store.query(text="one", limit=1)
+    del store._fetch_rows
+
+    rows, _ = await asyncio.to_thread(store._fetch_matrix)
+    assert [row["id"] for row in rows] == [1, 2, 3, 4, 5]
+
+
+@pytest.mark.asyncio
+async def test_aclose_closes_reader_connections_from_every_thread(tmp_path: Path, embedder):
+    store = SQLiteRAGStore(tmp_path / "rag.db", embedder)
+    composite = CompositeRAGStore([store], embedder)
+    await store.upsert(source="a", content="alpha")
+    # Queries run in worker threads, each opening its own reader connection.
+    await asyncio.gather(*(store.query(text="alpha", limit=1) for _ in range(8)))
+    readers = list(store._reader_conns)
+    assert readers
+
+    await composite.aclose()
+
+    for conn in [*readers, store._conn]:
+        with pytest.raises(sqlite3.ProgrammingError):
+            conn.execute("SELECT 1")
+    assert store._reader_conns == []
+
+
+def _sqlite_vec_loadable() -> bool:
+    try:
+        import sqlite_vec  # noqa: F401
+    except ImportError:
+        return False
+    return hasattr(sqlite3.connect(":memory:"), "enable_load_extension")
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(not _sqlite_vec_loadable(), reason="sqlite-vec extension cannot be loaded here")
+async def test_sqlite_vec_query_matches_in_memory_ranking(tmp_path: Path, embedder):
+    exact = InMemoryRAGStore(embedder)
+    vec_store = SQLiteRAGStore(tmp_path / "vec.db", embedder, use_sqlite_vec=True)
+    for content in ("alpha", "beta gamma", "delta epsilon zeta"):
+        await exact.upsert(source=content, content=content)
+        await vec_store.upsert(source=content, content=content)
+
+    exact_results = await exact.query(text="beta", limit=2)
+    vec_results = await vec_store.query(text="beta", limit=2)
+
+    assert [doc.source for doc in vec_results] == [doc.source for doc in exact_results]
+    assert vec_results[0].score == pytest.approx(exact_results[0].score, abs=1e-4)
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(not _sqlite_vec_loadable(), reason="sqlite-vec extension cannot be loaded here")
+async def test_sqlite_vec_reopen_resumes_from_mirrored_rows(tmp_path: Path, embedder, monkeypatch):
+    path = tmp_path / "vec.db"
+    first = SQLiteRAGStore(path, embedder, use_sqlite_vec=True)
+    await first.upsert_many([("a", "alpha"), ("b", "beta gamma")])
+    await first.aclose()
+
+    sync_from = []
+    original_sync = SQLiteRAGStore._sync_vec_table
+
+    def tracking_sync(self):
+        sync_from.append(self._vec_synced_id)
+        original_sync(self)
+
+    monkeypatch.setattr(SQLiteRAGStore, "_sync_vec_table", tracking_sync)
+    reopened = SQLiteRAGStore(path, embedder, use_sqlite_vec=True)
+    # Opening resumes after the mirrored rows instead of re-reading the whole table.
+    assert sync_from == [2]
+    await reopened.upsert(source="c", content="delta epsilon zeta")
+
+    mirrored = reopened._conn.execute("SELECT COUNT(*), MAX(rowid) FROM vec_documents").fetchone()
+    assert tuple(mirrored) == (3, 3)
+    results = await reopened.query(text="beta", limit=3)
+    assert {doc.source for doc in results} == {"a", "b", "c"}
+
+
+@pytest.mark.asyncio
+async def test_caching_embedder_skips_repeated_texts():
+    class CountingEmbedder(DummyEmbedder):
+        def __init__(self):
+            self.calls = []
+
+        async def embed(self, text: str):
+            self.calls.append(text)
+            return await super().embed(text)
+
+    inner = CountingEmbedder()
+    cached = CachingEmbeddingBackend(inner, max_entries=2)
+
+    hello = await cached.embed("hello")
+    assert await cached.embed("hello") == hello
+    assert inner.calls == ["hello"]
+    assert cached._entries["hello"].dtype == np.float32 and not cached._entries["hello"].flags.writeable
+
+    # Document batches go straight to the inner backend and leave the query cache alone.
+    await cached.embed_many(["hello", "world", "world"])
+    assert inner.calls == ["hello", "hello", "world", "world"]
+    assert list(cached._entries) == ["hello"]
+
+    await cached.embed("world")
+    await cached.embed("again")  # evicts "hello", the least recently used entry
+    await cached.embed("hello")
+    assert inner.calls[4:] == ["world", "again", "hello"]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_sqlite_queries_and_writes(sqlite_store):
+    store = sqlite_store
+    await store.upsert_many([(f"doc{idx}", f"content {idx}") for idx in range(20)])
+
+    results = await asyncio.gather(
+        *(store.query(text="content", limit=3) for _ in range(10)),
+        store.upsert(source="late", content="late content"),
+    )
+
+    assert all(len(batch) == 3 for batch in results[:10])
+    assert len(await store.query(text="content", limit=50)) == 21
+
+
+def test_int8_kernel_matches_numpy_reference():
+    from mcp_server import _rag_kernels
+
+    if not _rag_kernels.NUMBA_AVAILABLE:
+        pytest.skip("numba is not installed")
+    rng = np.random.default_rng(2)
+    matrix = rng.integers(-127, 128, size=(37, 12)).astype(np.int8)
+    scales = rng.random(37).astype(np.float32)
+    query = rng.normal(size=12).astype(np.float32)
+    out = np.empty(37, dtype=np.float32)
+
+    _rag_kernels.int8_dots(matrix, scales, query, out)
+
+    np.testing.assert_allclose(out, (matrix.astype(np.float32) @ query) * scales, rtol=1e-4, atol=1e-3)
+
+
+def test_simd_int8_kernel_tracks_numpy_reference():
+    from mcp_server import _rag_kernels
+
+    if not _rag_kernels.SIMSIMD_AVAILABLE:
+        pytest.skip("simsimd is not installed")
+    rng = np.random.default_rng(3)
+    matrix = rng.integers(-127, 128, size=(37, 12)).astype(np.int8)
+    scales = rng.random(37).astype(np.float32)
+    query = rng.normal(size=12).astype(np.float32)
+    out = np.empty(37, dtype=np.float32)
+
+    _rag_kernels.int8_dots_simd(matrix, scales, query, out)
+
+    expected = (matrix.astype(np.float32) @ query) * scales
+    # The query is quantised to int8 too: each element may be off by half a step times |matrix| <= 127.
+    step = float(np.abs(query).max()) / 127
+    np.testing.assert_allclose(out, expected, atol=0.5 * step * 127 * query.size)
+    assert np.corrcoef(out, expected)[0, 1] > 0.999
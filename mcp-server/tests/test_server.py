@@ -0,0 +1,657 @@
+import json
+
+import pytest
+
+from mcp_server.database import QueryNotWrappableError
+from mcp_server.rag_store import EmbeddingBackend, InMemoryRAGStore
+
+
+class DummyEmbedder(EmbeddingBackend):
+    async def embed(self, text: str):
+        return [float(len(text)), float(sum(text.encode()) % 1000)]
+
+
+@pytest.mark.asyncio
+async def test_rag_search_batch_returns_results_per_query(monkeypatch):
+    from mcp_server import server as mcp_server
+
+    store = InMemoryRAGStore(DummyEmbedder(), name="kb")
+    await store.upsert(source="doc", content="hello world")
+    monkeypatch.setattr(mcp_server, "_rag_store", lambda: store)
+
+    raw = await mcp_server.rag_search_batch(
+        queries=[{"query": "hello", "limit": 1}, {"query": "hello", "limit": 0}, {"limit": 2}]
+    )
+    first, second, third = json.loads(raw)
+
+    assert [doc["source"] for doc in first] == ["doc"]
+    assert first[0]["content"] == "hello world" and first[0]["store"] == "kb"
+    assert second == []
+    assert "error" in third
+
+
+@pytest.mark.asyncio
+async def test_rag_search_batch_embeds_all_queries_in_one_request(monkeypatch):
+    from mcp_server import server as mcp_server
+
+    class CountingEmbedder(DummyEmbedder):
+        def __init__(self):
+            self.single = []
+            self.batches = []
+
+        async def embed(self, text: str):
+            self.single.append(text)
+            return await super().embed(text)
+
+        async def embed_many(self, texts):
+            self.batches.append(list(texts))
+            return [await super(CountingEmbedder, self).embed(text) for text in texts]
+
+    embedder = CountingEmbedder()
+    store = InMemoryRAGStore(embedder, name="kb")
+    await store.upsert(source="doc", content="hello world")
+    monkeypatch.setattr(mcp_server, "_rag_store", lambda: store)
+    embedder.single.clear()
+
+    raw = await mcp_server.rag_search_batch(
+        queries=[{"query": "hello"}, {"query": "world", "limit": 1}, {"query": "hello", "limit": 1}]
+    )
+
+    assert [[doc["source"] for doc in result] for result in json.loads(raw)] == [["doc"], ["doc"], ["doc"]]
+    assert embedder.batches == [["hello", "world"]]
+    assert embedder.single == []
+
+
+@pytest.mark.asyncio
+async def test_batch_execute_runs_ops_and_isolates_failures(monkeypatch):
+    from mcp_server import server as mcp_server
+
+    store = InMemoryRAGStore(DummyEmbedder(), name="kb")
+    monkeypatch.setattr(mcp_server, "_rag_store", lambda: store)
+
+    raw = await mcp_server.batch_execute(
+        ops=[
+            {"tool": "rag_upsert", "args": {"content": "hello world", "source": "doc"}},
+            {"tool": "rag_import", "args": {"location": "/does/not/exist.txt"}},
+            {"tool": "drop_tables", "args": {}},
+        ],
+        max_concurrent=2,
+    )
+    upserted, missing, unsupported = json.loads(raw)
+
+    assert upserted["source"] == "doc" and upserted["store"] == "kb"
+    assert "File not found" in missing["error"]
+    assert "Unsupported batch tool" in unsupported["error"]
+
+
+@pytest.mark.asyncio
+async def test_batch_execute_embeds_upserts_per_store_in_one_batch(monkeypatch):
+    from mcp_server import server as mcp_server
+
+    class CountingEmbedder(DummyEmbedder):
+        def __init__(self):
+            self.batches = []
+
+        async def embed_many(self, texts):
+            self.batches.append(list(texts))
+            return [await self.embed(text) for text in texts]
+
+    embedder = CountingEmbedder()
+    store = InMemoryRAGStore(embedder, name="kb")
+    monkeypatch.setattr(mcp_server, "_rag_store", lambda: store)
+
+    raw = await mcp_server.batch_execute(
+        ops=[
+            {"tool": "rag_upsert", "args": {"content": "first", "source": "a"}},
+            {"tool": "rag_search", "args": {"query": "first"}},
+            {"tool": "rag_upsert", "args": {"content": "second", "source": "b"}},
+            {"tool": "rag_upsert", "args": {"content": "third", "bogus": True}},
+        ]
+    )
+    first, _, second, bogus = json.loads(raw)
+
+    assert embedder.batches == [["first", "second"]]
+    assert (first["source"], second["source"]) == ("a", "b")
+    assert first["store"] == second["store"] == "kb"
+    assert "error" in bogus
+    assert {doc.source for doc in await store.query(text="first", limit=5)} == {"a", "b"}
+
+
+@pytest.mark.asyncio
+async def test_health_reuses_shared_http_client(monkeypatch):
+    import httpx
+
+    from mcp_server import server as mcp_server
+
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, json={"status": "ok"})
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(mcp_server, "_get_http", lambda: client)
+
+    assert json.loads(await mcp_server.health()) == {"status": "ok"}
+    assert json.loads(await mcp_server.health()) == {"status": "ok"}
+    assert len(requests) == 2
+    assert not client.is_closed
+
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_get_http_returns_one_client_per_loop():
+    from mcp_server import server as mcp_server
+
+    first = mcp_server._get_http()
+    assert mcp_server._get_http() is first
+
+    await mcp_server._close_http()
+    assert first.is_closed
+    assert mcp_server._get_http() is not first
+    await mcp_server._close_http()
+
+
+@pytest.mark.asyncio
+async def test_enhance_recent_messages_per_message_fans_out(monkeypatch):
+    import asyncio
+
+    from mcp_server import server as mcp_server
+
+    rows = [{"id": 1, "content": "first", "created_at": "t1"}, {"id": 2, "content": "boom", "created_at": "t2"}]
+
+    class FakeDatabase:
+        async def fetch_all(self, sql, params=None):
+            return rows
+
+    active = 0
+    peak = 0
+
+    async def fake_llm_chat(messages, *, model=None):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        if messages[1]["content"] == "boom":
+            raise RuntimeError("provider failed")
+        return messages[1]["content"].upper()
+
+    monkeypatch.setattr(mcp_server, "_database", lambda: FakeDatabase())
+    monkeypatch.setattr(mcp_server, "_llm_chat", fake_llm_chat)
+    monkeypatch.setenv("LLM_MAX_CONCURRENCY", "2")
+
+    result = json.loads(await mcp_server.enhance_recent_messages(limit=2, per_message=True))
+
+    assert result["enhanced"] == [{"id": 1, "enhanced": "FIRST"}, {"id": 2, "error": "provider failed"}]
+    assert peak == 2
+
+
+@pytest.mark.asyncio
+async def test_run_executes_without_blocking_and_reports_failures():
+    import sys
+
+    from mcp_server import server as mcp_server
+
+    ok = json.loads(
+        await mcp_server._run([sys.executable, "-c", "import os; print(os.environ['EXTRA'])"], env={"EXTRA": "set"})
+    )
+    failed = json.loads(await mcp_server._run([sys.executable, "-c", "import sys; sys.exit('bad')"]))
+
+    assert ok == {"ok": True, "stdout": "set"}
+    assert failed["ok"] is False and failed["code"] == 1 and failed["stderr"] == "bad"
+
+
+@pytest.mark.asyncio
+async def test_db_query_returns_database_encoded_json_and_falls_back(monkeypatch):
+    from mcp_server import server as mcp_server
+
+    class FakeDatabase:
+        def __init__(self, wrap_error=None):
+            self.wrap_error = wrap_error
+            self.fetched_rows = False
+            self.read_only = []
+
+        async def fetch_json(self, sql, *, read_only=False):
+            self.read_only.append(read_only)
+            if self.wrap_error is not None:
+                raise self.wrap_error
+            return '[{"id":1}]'
+
+        async def fetch_all(self, sql, params=None, *, read_only=False):
+            self.read_only.append(read_only)
+            self.fetched_rows = True
+            return [{"id": 2}]
+
+    encoded = FakeDatabase()
+    monkeypatch.setattr(mcp_server, "_database", lambda: encoded)
+    assert await mcp_server.db_query("SELECT id FROM t") == '[{"id":1}]'
+    assert encoded.read_only == [True]
+
+    fallback = FakeDatabase(QueryNotWrappableError("cannot wrap"))
+    monkeypatch.setattr(mcp_server, "_database", lambda: fallback)
+    assert json.loads(await mcp_server.db_query("SELECT id FROM t")) == [{"id": 2}]
+    assert fallback.read_only == [True, True]
+
+    # Other failures surface without re-running the query.
+    failing = FakeDatabase(RuntimeError("permission denied for table t"))
+    monkeypatch.setattr(mcp_server, "_database", lambda: failing)
+    assert json.loads(await mcp_server.db_query("SELECT id FROM t")) == {"error": "permission denied for table t"}
+    assert not failing.fetched_rows
+
+    assert "error" in json.loads(await mcp_server.db_query("DELETE FROM t"))
+
+
+@pytest.mark.asyncio
+async def test_rag_import_reads_local_files_off_the_event_loop(monkeypatch, tmp_path):
+    import threading
+
+    from mcp_server import server as mcp_server
+
+    store = InMemoryRAGStore(DummyEmbedder(), name="kb")
+    monkeypatch.setattr(mcp_server, "_rag_store", lambda: store)
+    reader_threads = []
+    original = mcp_server._open_text_file
+
+    def tracking_open(path):
+        reader_threads.append(threading.current_thread())
+        return original(path)
+
+    monkeypatch.setattr(mcp_server, "_open_text_file", tracking_open)
+    doc = tmp_path / "notes.txt"
+    doc.write_text("offline notes", encoding="utf-8")
+
+    imported = json.loads(await mcp_server.rag_import(str(doc)))
+    missing = json.loads(await mcp_server.rag_import(str(tmp_path / "absent.txt")))
+
+    assert imported["source"] == str(doc)
+    assert reader_threads[0] is not threading.main_thread()
+    assert "File not found" in missing["error"]
+
+
+@pytest.mark.asyncio
+async def test_db_insert_echo_many_inserts_in_one_statement(monkeypatch):
+    from mcp_server import server as mcp_server
+
+    calls = []
+
+    class FakeDatabase:
+        async def execute_many(self, sql, rows, *, template=None, returning=False):
+            calls.append((sql, rows, template, returning))
+            return [{"id": idx} for idx in range(1, len(rows) + 1)]
+
+    monkeypatch.setattr(mcp_server, "_database", lambda: FakeDatabase())
+
+    result = json.loads(await mcp_server.db_insert_echo_many(["a", "b"]))
+
+    assert result == [{"id": 1, "content": "a"}, {"id": 2, "content": "b"}]
+    assert len(calls) == 1 and calls[0][1] == [("a",), ("b",)] and calls[0][3] is True
+
+
+@pytest.mark.asyncio
+async def test_enhance_message_and_store_uses_one_db_handle_around_the_llm_call(monkeypatch):
+    from mcp_server import server as mcp_server
+
+    events = []
+
+    class FakeDatabase:
+        async def fetch_one(self, sql, params=None):
+            events.append("select")
+            return {"id": params[0], "content": "printer offline"}
+
+        async def execute(self, sql, params=None, *, returning=False):
+            events.append("insert")
+            return {"id": 99}
+
+    handles = []
+
+    def fake_database():
+        handles.append(FakeDatabase())
+        return handles[-1]
+
+    async def fake_llm_chat(messages, *, model=None, **kwargs):
+        events.append("llm")
+        return "restart the spooler"
+
+    monkeypatch.setattr(mcp_server, "_database", fake_database)
+    monkeypatch.setattr(mcp_server, "_llm_chat", fake_llm_chat)
+    monkeypatch.setenv("RAG_ENABLED", "false")
+
+    result = json.loads(await mcp_server.enhance_message_and_store(7))
+
+    assert result["enhanced_id"] == 99
+    assert events == ["select", "llm", "insert"]
+    assert len(handles) == 1
+
+
+@pytest.mark.asyncio
+async def test_list_enhanced_for_message_can_skip_content(monkeypatch):
+    from mcp_server import server as mcp_server
+
+    queries = []
+
+    class FakeDatabase:
+        async def fetch_all(self, sql, params=None):
+            queries.append((" ".join(sql.split()), params))
+            return []
+
+    monkeypatch.setattr(mcp_server, "_database", lambda: FakeDatabase())
+
+    await mcp_server.list_enhanced_for_message(3, limit=5)
+    await mcp_server.list_enhanced_for_message(3, limit=5, include_content=False)
+
+    assert queries[0][0].startswith("SELECT id, source_message_id, enhanced_content, created_at FROM")
+    assert queries[1][0].startswith("SELECT id, source_message_id, created_at FROM")
+    assert queries[1][1] == (3, 5)
+
+
+@pytest.mark.asyncio
+async def test_enhance_text_streams_deltas_to_the_client(monkeypatch):
+    from mcp_server import server as mcp_server
+    from mcp_server.llm import LLMProvider
+
+    class StreamingProvider(LLMProvider):
+        async def chat(self, messages, *, model=None):
+            raise AssertionError("stream=True must not use the buffered call")
+
+        async def stream_chat(self, messages, *, model=None):
+            for delta in ["Restart ", "the ", "spooler. "]:
+                yield delta
+
+    class FakeContext:
+        def __init__(self):
+            self.logged = []
+
+        async def info(self, message):
+            self.logged.append(message)
+
+    ctx = FakeContext()
+    monkeypatch.setattr(mcp_server, "_llm_provider", lambda: StreamingProvider())
+    monkeypatch.setenv("RAG_ENABLED", "false")
+
+    result = json.loads(await mcp_server.enhance_text("printer offline", stream=True, ctx=ctx))
+
+    assert result["enhanced"] == "Restart the spooler."
+    assert ctx.logged == ["Restart ", "the ", "spooler. "]
+
+
+@pytest.mark.asyncio
+async def test_enhance_messages_many_reads_and_writes_in_one_round_trip_each(monkeypatch):
+    from mcp_server import server as mcp_server
+
+    calls = []
+
+    class FakeDatabase:
+        async def fetch_all(self, sql, params=None):
+            calls.append(("fetch_all", sql, params))
+            return [{"id": 1, "content": "first"}, {"id": 2, "content": "boom"}]
+
+        async def execute_many(self, sql, rows, *, template=None, returning=False, page_size=500):
+            calls.append(("execute_many", sql, rows))
+            return [{"id": 10 + source_id, "source_message_id": source_id} for source_id, _ in rows]
+
+    async def fake_llm_chat(messages, **kwargs):
+        if messages[-1]["content"] == "boom":
+            raise RuntimeError("provider failed")
+        return messages[-1]["content"].upper()
+
+    monkeypatch.setattr(mcp_server, "_database", lambda: FakeDatabase())
+    monkeypatch.setattr(mcp_server, "_llm_chat", fake_llm_chat)
+    monkeypatch.setenv("RAG_ENABLED", "false")
+
+    result = json.loads(await mcp_server.enhance_messages_many([1, 2, 2, 3]))
+
+    assert [call[0] for call in calls] == ["fetch_all", "execute_many"]
+    assert "ANY(%s)" in calls[0][1] and calls[0][2] == ([1, 2, 3],)
+    assert calls[1][2] == [(1, "FIRST")]
+    assert result["items"] == [
+        {"source_id": 1, "enhanced_id": 11, "enhanced_content": "FIRST"},
+        {"source_id": 2, "error": "provider failed"},
+    ]
+    assert result["missing"] == [3]
+
+
+@pytest.mark.asyncio
+async def test_enhance_messages_many_batch_api_submits_then_collects(monkeypatch):
+    from mcp_server import server as mcp_server
+    from mcp_server.llm import BatchStatus
+
+    stored = {}
+
+    class FakeDatabase:
+        async def fetch_all(self, sql, params=None):
+            if "echo_messages_enhanced" in sql:
+                return [
+                    {"id": row_id, "source_message_id": source_id}
+                    for (batch_id, source_id), (row_id, _) in stored.items()
+                    if batch_id == params[0]
+                ]
+            return [{"id": 7, "content": "slow"}]
+
+        async def execute_many(self, sql, rows, *, template=None, returning=False, page_size=500):
+            assert "ON CONFLICT" in sql and not returning
+            for batch_id, source_id, content in rows:
+                stored.setdefault((batch_id, source_id), (70 + len(stored), content))
+            return []
+
+    class BatchProvider:
+        def __init__(self):
+            self.submitted = None
+            self.status = "in_progress"
+
+        async def submit_batch(self, requests, *, model=None):
+            self.submitted = requests
+            return "batch_1"
+
+        async def batch_status(self, batch_id):
+            replies = {"echo-7": "done"} if self.status == "completed" else {}
+            return BatchStatus(batch_id=batch_id, status=self.status, replies=replies, errors={})
+
+    provider = BatchProvider()
+    monkeypatch.setattr(mcp_server, "_database", lambda: FakeDatabase())
+    monkeypatch.setattr(mcp_server, "_llm_provider", lambda: provider)
+    monkeypatch.setenv("RAG_ENABLED", "false")
+
+    submitted = json.loads(await mcp_server.enhance_messages_many([7], use_batch_api=True))
+    assert submitted == {"batch_id": "batch_1", "submitted": [7], "missing": []}
+    assert provider.submitted["echo-7"][-1] == {"role": "user", "content": "slow"}
+
+    pending = json.loads(await mcp_server.enhance_messages_batch_collect("batch_1"))
+    assert pending == {"batch_id": "batch_1", "status": "in_progress"}
+    assert stored == {}
+
+    provider.status = "completed"
+    collected = json.loads(await mcp_server.enhance_messages_batch_collect("batch_1"))
+    assert collected["items"] == [{"source_id": 7, "enhanced_id": 70, "enhanced_content": "done"}]
+    assert stored == {("batch_1", 7): (70, "done")}
+
+    # Polling a finished batch again returns the stored rows without inserting duplicates.
+    again = json.loads(await mcp_server.enhance_messages_batch_collect("batch_1"))
+    assert again["items"] == collected["items"]
+    assert len(stored) == 1
+
+
+@pytest.mark.asyncio
+async def test_llm_chat_reuses_replies_for_near_duplicate_prompts(monkeypatch):
+    from mcp_server import server as mcp_server
+    from mcp_server.llm import LLMProvider
+
+    class KeywordEmbedder(EmbeddingBackend):
+        async def embed(self, text):
+            return [1.0, 0.01 * len(text)] if "password" in text else [0.0, 1.0]
+
+    class CountingProvider(LLMProvider):
+        calls = 0
+
+        async def chat(self, messages, *, model=None):
+            self.calls += 1
+            return f"reply-{self.calls}"
+
+    provider = CountingProvider()
+    monkeypatch.setenv("LLM_SEMANTIC_CACHE_THRESHOLD", "0.99")
+    monkeypatch.setattr(mcp_server, "_llm_provider", lambda: provider)
+    monkeypatch.setattr(mcp_server, "_rag_store", lambda: InMemoryRAGStore(KeywordEmbedder()))
+
+    def ask(text, system="support"):
+        return mcp_server._llm_chat([{"role": "system", "content": system}, {"role": "user", "content": text}])
+
+    assert await ask("reset my password") == "reply-1"
+    assert await ask("reset my password!") == "reply-1"
+    assert await ask("billing question") == "reply-2"
+    assert await ask("reset my password", system="other") == "reply-3"
+    assert provider.calls == 3
+
+
+@pytest.mark.asyncio
+async def test_inject_rag_context_shares_identical_retrievals_until_upsert(monkeypatch):
+    import asyncio
+
+    from mcp_server import server as mcp_server
+
+    store = InMemoryRAGStore(DummyEmbedder())
+    await store.upsert(source="kb", content="restart the router")
+    queries = []
+    original_query = store.query
+
+    async def counting_query(**kwargs):
+        queries.append(kwargs)
+        await asyncio.sleep(0.01)
+        return await original_query(**kwargs)
+
+    monkeypatch.setattr(store, "query", counting_query)
+    monkeypatch.setattr(mcp_server, "_rag_store", lambda: store)
+
+    async def inject():
+        messages = [{"role": "system", "content": "s"}, {"role": "user", "content": "wifi down"}]
+        return await mcp_server._inject_rag_context("wifi down", messages)
+
+    burst = await asyncio.gather(*(inject() for _ in range(4)))
+    assert len(queries) == 1
+    assert all(info["matches"] == burst[0]["matches"] for info in burst)
+
+    # Results are only reused after the query finishes when RAG_RESULT_CACHE_TTL opts in.
+    await inject()
+    assert len(queries) == 2
+
+    monkeypatch.setenv("RAG_RESULT_CACHE_TTL", "60")
+    mcp_server._tool_settings.cache_clear()
+    await inject()
+    await inject()
+    assert len(queries) == 3
+
+    await mcp_server.rag_upsert("power cycle the modem", source="kb")
+    await inject()
+    assert len(queries) == 4
+
+
+@pytest.mark.asyncio
+async def test_rag_import_streams_long_text_into_overlapping_chunks(monkeypatch, tmp_path):
+    from mcp_server import server as mcp_server
+
+    store = InMemoryRAGStore(DummyEmbedder(), name="kb")
+    batches = []
+    original_upsert_many = store.upsert_many
+
+    async def tracking_upsert_many(documents, *, store=None):
+        batches.append(len(documents))
+        return await original_upsert_many(documents, store=store)
+
+    monkeypatch.setattr(store, "upsert_many", tracking_upsert_many)
+    monkeypatch.setattr(mcp_server, "_rag_store", lambda: store)
+    monkeypatch.setattr(mcp_server, "_IMPORT_READ_SIZE", 7)
+    monkeypatch.setenv("RAG_IMPORT_CHUNK_CHARS", "10")
+    monkeypatch.setenv("RAG_IMPORT_CHUNK_OVERLAP", "2")
+    doc = tmp_path / "manual.txt"
+    doc.write_text("abcdefghijklmnopqrstuvwxyz", encoding="utf-8")
+
+    imported = json.loads(await mcp_server.rag_import(str(doc)))
+
+    assert imported["chunks"] == 3 and len(imported["ids"]) == 3
+    assert imported["id"] == imported["ids"][0]
+    assert batches == [3]
+
+    monkeypatch.setattr(mcp_server, "_IMPORT_UPSERT_BATCH", 1)
+    batches.clear()
+    reimported = json.loads(await mcp_server.rag_import(str(doc), source="manual"))
+    assert batches == [1, 1, 1]
+    assert len(set(reimported["ids"])) == 3 and reimported["source"] == "manual"
+
+    async def blocks(*parts):
+        for part in parts:
+            yield part
+
+    chunks = [chunk async for chunk in mcp_server._text_chunks(blocks("abcdefg", "hijklmnopqrstuvwxyz"), 10, 2)]
+    assert chunks == ["abcdefghij", "ijklmnopqr", "qrstuvwxyz"]
+    assert [chunk async for chunk in mcp_server._text_chunks(blocks("short"), 10, 2)] == ["short"]
+
+
+@pytest.mark.asyncio
+async def test_rag_import_reports_chunks_stored_before_a_failed_batch(monkeypatch, tmp_path):
+    from mcp_server import server as mcp_server
+
+    store = InMemoryRAGStore(DummyEmbedder(), name="kb")
+    original = store.upsert_many
+    calls = 0
+    failing_calls = {2}
+
+    async def flaky_upsert_many(documents, *, store=None):
+        nonlocal calls
+        calls += 1
+        if calls in failing_calls:
+            raise RuntimeError("embedding backend unavailable")
+        return await original(documents, store=store)
+
+    monkeypatch.setattr(store, "upsert_many", flaky_upsert_many)
+    monkeypatch.setattr(mcp_server, "_rag_store", lambda: store)
+    monkeypatch.setattr(mcp_server, "_IMPORT_UPSERT_BATCH", 1)
+    monkeypatch.setenv("RAG_IMPORT_CHUNK_CHARS", "10")
+    monkeypatch.setenv("RAG_IMPORT_CHUNK_OVERLAP", "2")
+    monkeypatch.setenv("RAG_IMPORT_CONCURRENCY", "1")
+    doc = tmp_path / "manual.txt"
+    doc.write_text("abcdefghijklmnopqrstuvwxyz", encoding="utf-8")
+
+    failed = json.loads(await mcp_server.rag_import(str(doc)))
+
+    assert failed["error"] == "embedding backend unavailable"
+    assert failed["stored_ids"] == [doc_id for doc_id, *_ in store._docs]
+    assert len(failed["stored_ids"]) == 2  # chunks 1 and 3; chunk 2 failed
+
+    failing_calls = {4, 5, 6}  # every batch of the next import fails, so nothing is stored
+    assert json.loads(await mcp_server.rag_import(str(doc))) == {"error": "embedding backend unavailable"}
+
+
+@pytest.mark.asyncio
+async def test_enhance_text_and_store_writes_both_rows_in_one_statement(monkeypatch):
+    from mcp_server import server as mcp_server
+
+    statements = []
+
+    class FakeDatabase:
+        async def execute(self, sql, params=None, *, returning=False):
+            statements.append((sql, params))
+            if "echo_messages_enhanced" in sql:
+                return {"id": 9, "source_message_id": 4}
+            return {"id": 5}
+
+    replies = iter(["better text"])
+
+    async def fake_llm_chat(messages, **kwargs):
+        reply = next(replies, None)
+        if reply is None:
+            raise RuntimeError("provider down")
+        return reply
+
+    monkeypatch.setattr(mcp_server, "_maybe_database", lambda: FakeDatabase())
+    monkeypatch.setattr(mcp_server, "_llm_chat", fake_llm_chat)
+    monkeypatch.setenv("RAG_ENABLED", "false")
+
+    stored = json.loads(await mcp_server.enhance_text_and_store("fix it"))
+    assert (stored["message_id"], stored["enhanced_id"]) == (4, 9)
+    assert stored["processing"]["persisted"] is True
+    assert len(statements) == 1 and "WITH message AS" in statements[0][0]
+    assert statements[0][1][0] == "fix it" and json.loads(statements[0][1][1])["enhanced"] == "better text"
+
+    failed = json.loads(await mcp_server.enhance_text_and_store("fix it"))
+    assert failed["message_id"] == 5 and failed["error"] == "provider down"
+    assert "echo_messages_enhanced" not in statements[1][0]